@@ -0,0 +1,128 @@
+"""
+`assets`
+================================================================================
+
+Read-only bundle of the fonts, built by ``host/build_assets.py``.
+
+Loose files cost a filesystem lookup, a file handle and a fresh heap copy per
+load. The bundle is one file opened once at boot: a small header, a columnar
+index (name hash, offset, length, format) that is read straight into
+``array`` objects, then the asset data. Fetching an asset is one seek plus one
+``readinto`` into a shared buffer sized for the largest asset, and the
+``memoryview`` handed out for each entry is created on its first read and
+reused after that, so reading an entry allocates nothing. The weather icons
+stay loose files in ``jpg/``: the display driver's ``jpg()`` reads a file by
+name and has no call that decodes a JPEG from a buffer.
+
+Layout, all little-endian::
+
+    magic 'WAST', version u16, count u16, largest u32
+    hashes u32[count]   (sorted)
+    offsets u32[count]  (from the start of the file)
+    lengths u32[count]
+    formats u8[count]
+    data
+"""
+
+import struct
+from array import array
+
+BUNDLE_FILE = "assets.bin"
+
+MAGIC = b'WAST'
+VERSION = 1
+_HEADER = '<4sHHI'
+HEADER_SIZE = struct.calcsize(_HEADER)
+ENTRY_SIZE = 13  # hash, offset, length (u32 each) and format (u8)
+
+# Entry formats (1 was JPEG icons, which the driver cannot draw from a buffer)
+FONT = 2  # width, height, first, last (u8 each) then the glyph bitmap
+RAW = 3
+
+_FONT_HEADER = 4
+
+
+def name_hash(name):
+    """24-bit djb2 hash; small enough to stay a small int on the device"""
+    h = 5381
+    for c in name:
+        h = (h * 33 + ord(c)) & 0xFFFFFF
+    return h
+
+
+class Font:
+    """Bitmap font with the attributes the display driver's text() reads."""
+
+    def __init__(self, data):
+        self.WIDTH, self.HEIGHT, self.FIRST, self.LAST = data[0], data[1], data[2], data[3]
+        self.FONT = memoryview(data)[_FONT_HEADER:]
+
+
+class Bundle:
+    """An open asset bundle; see the module docstring for the layout."""
+
+    def __init__(self, path=BUNDLE_FILE):
+        self._file = open(path, 'rb')
+        magic, version, count, largest = struct.unpack(_HEADER, self._file.read(HEADER_SIZE))
+        if magic != MAGIC or version != VERSION:
+            self._file.close()
+            raise ValueError("not an asset bundle: " + path)
+        self.count = count
+        self.hashes = self._column('I', count)
+        self.offsets = self._column('I', count)
+        self.lengths = self._column('I', count)
+        self.formats = self._column('B', count)
+        self._buf = bytearray(largest)
+        self._views = [None] * count
+
+    def _column(self, typecode, count):
+        column = array(typecode, bytes(count * struct.calcsize(typecode)))
+        self._file.readinto(column)
+        return column
+
+    def find(self, name):
+        """Entry number of `name` (e.g. "bitmap/vga1_bold_16x32"), or -1"""
+        h = name_hash(name)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) >> 1
+            if self.hashes[mid] < h:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < self.count and self.hashes[lo] == h else -1
+
+    def read(self, entry):
+        """Data of an entry in the shared buffer; valid until the next read"""
+        view = self._views[entry]
+        if view is None:
+            view = self._views[entry] = memoryview(self._buf)[:self.lengths[entry]]
+        self._file.seek(self.offsets[entry])
+        self._file.readinto(view)
+        return view
+
+    def readinto(self, entry, buf):
+        """Copy an entry into a caller's buffer; returns its length"""
+        length = self.lengths[entry]
+        self._file.seek(self.offsets[entry])
+        return self._file.readinto(memoryview(buf)[:length])
+
+    def font(self, name):
+        """Load a font entry into its own buffer, for use with tft.text()"""
+        entry = self.find(name)
+        if entry < 0 or self.formats[entry] != FONT:
+            raise KeyError(name)
+        data = bytearray(self.lengths[entry])
+        self.readinto(entry, data)
+        return Font(data)
+
+    def close(self):
+        self._file.close()
+
+
+def load(path=BUNDLE_FILE):
+    """Open the bundle, or None (loose files are used) if there is none"""
+    try:
+        return Bundle(path)
+    except OSError:
+        return None
@@ -0,0 +1,150 @@
+"""
+`calibrate`
+================================================================================
+
+Boot-time tuning of the display's SPI clock and driver buffer size.
+
+How fast the panel can be clocked depends on the board revision and its
+wiring. The best ``buffer_size`` for the ``gc9a01`` driver depends on how much
+heap is left. ``run()`` benchmarks fills and blits for every pair of
+``BAUDS`` and ``BUFFER_SIZES`` that fits the heap, then keeps the fastest
+stable pair. A buffer that buys less than ``MARGIN`` over a smaller one is
+not worth its RAM, so the smallest buffer within that margin of the fastest
+pair wins.
+
+A pair is stable when the driver raises no error and, where the panel can
+report what it received, the test pattern arrives intact. The round GC9A01
+modules wire no MISO line, so on the board only errors count. The host
+stand-in reports a CRC of every blit it received.
+
+The result is saved under the ``calibration`` key of ``kvstore`` together
+with the display pins it was measured on. ``load()`` returns it on later
+boots. ``forget()`` requests a new calibration on the next boot.
+"""
+
+import gc
+import json
+import time
+import gc9a01
+import governor
+import kvstore
+import metrics
+
+KEY = "calibration"
+
+# Integer dividers of the 80 MHz APB clock; anything in between rounds down
+BAUDS = (80000000, 40000000, 26666667, 20000000)
+BUFFER_SIZES = (16 * 16 * 2, 32 * 32 * 2, 64 * 64 * 2, 240 * 32 * 2)
+
+ROUNDS = 3
+TILE = 40  # side of the blitted test pattern
+MARGIN = 1.05  # the fastest pair may be this much faster than the chosen one
+
+
+def pattern(size=TILE):
+    """RGB565 test pattern of size x size pixels with every byte value"""
+    buf = bytearray(size * size * 2)
+    for i in range(len(buf)):
+        buf[i] = (i * 7 + (i >> 8)) & 0xFF
+    return buf
+
+
+def load(pins):
+    """(baud, buffer_size) saved for these display pins, or None"""
+    try:
+        saved = json.loads(kvstore.get(KEY, b'{}'))
+    except ValueError:
+        return None
+    if saved.get('pins') != list(pins):
+        return None
+    return saved['spi_baud'], saved['lcd_buffer_size']
+
+
+def save(pins, baud, size, rate, verified):
+    kvstore.put(KEY, json.dumps({'pins': list(pins), 'spi_baud': baud, 'lcd_buffer_size': size,
+                                 'rate': rate, 'verified': verified}).encode())
+    kvstore.flush(force=True)
+
+
+def forget():
+    """Calibrate again on the next boot"""
+    kvstore.delete(KEY)
+    kvstore.flush(force=True)
+
+
+def verify(tft, buf):
+    """True or False if the panel received buf intact, None if it cannot tell"""
+    received = getattr(tft, 'received_crc', None)
+    if received is None:
+        return None
+    from binascii import crc32
+    return received == crc32(buf)
+
+
+def bench(tft, buf, rounds=ROUNDS):
+    """Pixels per second for full fills plus a screen of pattern tiles"""
+    width, height = tft.width(), tft.height()
+    start = time.ticks_us()
+    for _ in range(rounds):
+        tft.fill(gc9a01.BLACK)
+        for y in range(0, height - TILE + 1, TILE):
+            for x in range(0, width - TILE + 1, TILE):
+                tft.blit_buffer(buf, x, y, TILE, TILE)
+    us = time.ticks_diff(time.ticks_us(), start)
+    tiles = (width // TILE) * (height // TILE)
+    return rounds * (width * height + tiles * TILE * TILE) * 1000000 // max(us, 1)
+
+
+def measure(spi, make_tft, bauds=BAUDS, sizes=BUFFER_SIZES):
+    """Benchmark every pair that fits the heap; returns (baud, size, rate, ok) rows.
+
+    ``make_tft(buffer_size)`` builds a driver on ``spi`` without resetting
+    the panel; ``ok`` is True, False or None (see ``verify``).
+    """
+    buf = pattern()
+    rows = []
+    for baud in bauds:
+        spi.init(baudrate=baud)
+        for size in sizes:
+            gc.collect()
+            if size > gc.mem_free() // 4:
+                continue
+            try:
+                tft = make_tft(size)
+                rate = bench(tft, buf)
+                tft.blit_buffer(buf, 0, 0, TILE, TILE)
+                ok = verify(tft, buf)
+            except (OSError, MemoryError, ValueError) as e:
+                print("Calibration: %d Hz, %d bytes failed: %s" % (baud, size, e))
+                rate, ok = 0, False
+            rows.append((baud, size, rate, ok))
+            tft = None
+    return rows
+
+
+def choose(rows):
+    """The fastest stable (baud, size, rate, ok) row, preferring smaller buffers"""
+    stable = [row for row in rows if row[2] and row[3] is not False]
+    if not stable:
+        return None
+    fastest = max(row[2] for row in stable)
+    for row in sorted(stable, key=lambda row: (row[1], -row[2])):
+        if row[2] * MARGIN >= fastest:
+            return row
+
+
+def run(spi, make_tft, pins):
+    """Calibrate, save and return (baud, buffer_size); None if nothing worked"""
+    with governor.burst("calibrate"):
+        rows = measure(spi, make_tft)
+    for baud, size, rate, ok in rows:
+        print("  %3d MHz %6d B %9d px/s %s" % (baud // 1000000, size, rate,
+                                             {True: 'ok', False: 'FAIL', None: '-'}[ok]))
+    best = choose(rows)
+    if best is None:
+        return None
+    baud, size, rate, ok = best
+    save(pins, baud, size, rate, ok is True)
+    metrics.event("spi_calibrated", baud // 1000000)
+    print("Calibrated display: %d Hz, buffer %d bytes, %d px/s" % (baud, size, rate))
+    return baud, size
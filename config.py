@@ -0,0 +1,229 @@
+"""
+`config`
+================================================================================
+
+Device settings read from ``config.txt`` on flash.
+
+The file holds one ``key = value`` per line (``#`` starts a comment) and only
+needs the keys that differ from ``DEFAULTS``; each value is converted to the
+type of its default. ``location = name, lat, lon, timezone`` may be repeated
+to build the rotation list.
+
+Parsing happens once: the result is cached in ``config.json`` together with
+the size and mtime of ``config.txt``, and later boots load that with the
+built-in C JSON parser instead of re-parsing the text. ``reload()`` checks the
+stamp again so an edited file takes effect without a reboot.
+"""
+
+import os
+import json
+
+CONFIG_FILE = "config.txt"
+CACHE_FILE = "config.json"
+
+# Every setting and its default; the type of the default is the parse type
+DEFAULTS = (
+    # Wi-Fi credentials
+    ('wifi_ssid', "Your WIFI SSID"),
+    ('wifi_password', "WIFI Password"),
+    # API URLs
+    ('geolocation_url', "http://ip-api.com/json/"),
+    ('world_time_url', "https://worldtimeapi.org/api/timezone/{timezone}"),
+    ('world_time_ip_url', "https://worldtimeapi.org/api/ip"),
+    ('weather_url', "http://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}"
+                    "&current_weather=true&hourly=temperature_2m,relativehumidity_2m&forecast_days=2"),
+    ('proxy_url', ""),  # local aggregation proxy, e.g. http://192.168.1.10:8080
+    # Locations as (name, lat, lon, timezone); empty uses the IP-derived location
+    ('locations', []),
+    ('rotate_interval', 20),  # seconds each location is shown, 0 for swipe only
+    # Refresh cadence
+    ('refresh_interval', 60),
+    ('retry_interval', 10),
+    # Power management
+    ('dim_after', 30),  # seconds without a touch before the backlight dims
+    ('night_hours', (23, 7)),  # display sleeps from 23:00 until 07:00
+    ('cpu_idle_freq', 80000000),  # CPU clock while waiting (see governor)
+    ('cpu_burst_freq', 240000000),  # CPU clock while parsing and drawing
+    # Battery mode (see main.battery_cycle)
+    ('battery_mode', False),
+    ('battery_refresh', 900),
+    ('battery_awake_budget', 20),
+    ('battery_show', 5),
+    ('lease_max_age', 12 * 3600),
+    ('battery_save_interval', 3600),  # seconds between state copies to flash
+    # HTTP client
+    ('http_bufsize', 8192),
+    ('http_timeout', 10),
+    ('metrics_port', 0),  # serve /metrics and /state over HTTP on this port, e.g. 8080
+    # Display: SPI bus and GC9A01 pins
+    ('spi_baud', 80000000),
+    ('spi_sck', 10),
+    ('spi_mosi', 11),
+    ('lcd_rst', 14),
+    ('lcd_cs', 9),
+    ('lcd_dc', 8),
+    ('lcd_buffer_size', 32 * 32 * 2),
+    ('spi_autotune', True),  # calibrate spi_baud and lcd_buffer_size (see calibrate)
+    ('backlight_pin', 2),
+    # Touch: CST816 on I2C(0)
+    ('touch_scl', 7),
+    ('touch_sda', 6),
+    ('touch_rst', 13),
+    ('touch_irq_pin', 5),
+    ('touch_freq', 400000),
+)
+
+_TYPES = {}
+_SIZES = {}  # tuple settings -> number of parts
+for _name, _value in DEFAULTS:
+    _TYPES[_name] = type(_value)
+    if isinstance(_value, tuple):
+        _SIZES[_name] = len(_value)
+
+# Inclusive bounds for every part of these settings
+_RANGES = {'night_hours': (0, 23)}
+
+
+class Config:
+    """All settings as attributes; see DEFAULTS for the names."""
+
+    __slots__ = tuple(name for name, _ in DEFAULTS) + ('stamp',)
+
+    def __init__(self):
+        for name, value in DEFAULTS:
+            setattr(self, name, list(value) if isinstance(value, list) else value)
+        self.stamp = None
+
+    def values(self):
+        return {name: getattr(self, name) for name, _ in DEFAULTS}
+
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st[6], st[8]]  # size, mtime
+
+
+def _number(text):
+    return float(text) if '.' in text else int(text)
+
+
+def _location(value):
+    if isinstance(value, str):
+        value = [part.strip() for part in value.split(',')]
+    name, lat, lon = value[:3]
+    return (name, float(lat), float(lon), value[3] if len(value) > 3 else '')
+
+
+def _check(name, value):
+    """Raise ValueError unless a tuple setting has the right parts and range"""
+    if len(value) != _SIZES[name]:
+        raise ValueError("%s needs %d values" % (name, _SIZES[name]))
+    low, high = _RANGES.get(name, (None, None))
+    if low is not None and not all(low <= part <= high for part in value):
+        raise ValueError("%s values must be %d to %d" % (name, low, high))
+    return value
+
+
+def _convert(name, value):
+    """Coerce a text (or cached JSON) value to the type of its default"""
+    kind = _TYPES[name]
+    if kind is list:
+        return [_location(place) for place in value]
+    if not isinstance(value, str):
+        # Already typed (from the JSON cache); JSON has no tuples
+        return _check(name, tuple(value)) if kind is tuple else value
+    if kind is bool:
+        return value.lower() in ('1', 'true', 'yes', 'on')
+    if kind is int:
+        return int(value)
+    if kind is float:
+        return float(value)
+    if kind is tuple:
+        return _check(name, tuple(_number(part.strip()) for part in value.split(',')))
+    if len(value) > 1 and value[0] == value[-1] and value[0] in '"\'':
+        value = value[1:-1]
+    return value
+
+
+def parse(path, cfg):
+    """Read key = value lines from path into cfg"""
+    locations = []
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line[0] == '#':
+                continue
+            key, sep, value = line.partition('=')
+            key = key.strip()
+            value = value.strip()
+            try:
+                if key == 'location':
+                    locations.append(_location(value))
+                elif sep and key in _TYPES:
+                    setattr(cfg, key, _convert(key, value))
+                else:
+                    print("Config: ignoring line", number)
+            except (ValueError, IndexError) as e:
+                print("Config: bad value on line", number, e)
+    if locations:
+        cfg.locations = locations
+
+
+def _load_cache(stamp):
+    try:
+        with open(CACHE_FILE) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cached.get('stamp') != stamp:
+        return None
+    return cached.get('values')
+
+
+def _save_cache(cfg):
+    try:
+        with open(CACHE_FILE, "w") as f:
+            json.dump({'stamp': cfg.stamp, 'values': cfg.values()}, f)
+    except OSError as e:
+        print("Config cache save error:", e)
+
+
+def _read(cfg, stamp):
+    """Fill cfg from the cache if it matches stamp, else parse and recache"""
+    # Built aside and copied over once complete: the network worker reads
+    # cfg while a reload runs and must never see the defaults in between
+    fresh = Config()
+    fresh.stamp = stamp
+    if stamp is not None:
+        values = _load_cache(stamp)
+        if values is None:
+            parse(CONFIG_FILE, fresh)
+            _save_cache(fresh)
+        else:
+            for name in values:
+                if name in _TYPES:
+                    try:
+                        setattr(fresh, name, _convert(name, values[name]))
+                    except (ValueError, TypeError, IndexError):
+                        pass  # cached by older firmware; the default stays
+    for name in fresh.__slots__:
+        setattr(cfg, name, getattr(fresh, name))
+
+
+def load():
+    """Settings from config.txt, or the defaults if there is none"""
+    cfg = Config()
+    _read(cfg, _stamp(CONFIG_FILE))
+    return cfg
+
+
+def reload(cfg):
+    """Re-read config.txt into cfg in place if it changed; returns True if so"""
+    stamp = _stamp(CONFIG_FILE)
+    if stamp == cfg.stamp:
+        return False
+    _read(cfg, stamp)
+    return True
@@ -24,6 +24,15 @@ Implementation Notes
   https://circuitpython.org/downloads
 
 # * Adafruit's Bus Device library: https://github.com/adafruit/Adafruit_CircuitPython_BusDevice
+
+**Scan profiles:**
+
+``set_profile()`` trades touch latency for controller current. ``RESPONSIVE``
+scans at the full rate and never sleeps. ``BALANCED`` and ``LOW_POWER`` let the
+chip drop into low-power scanning after ``AutoSleepTime`` seconds without a
+touch; a touch there still wakes it and raises the IRQ. While it scans in low
+power the chip does not answer on I2C: reads then return 0 (no touch), and a
+configuration write resets the chip to wake it and writes the settings again.
 """
 
 import time
@@ -78,6 +87,39 @@ _CST816_Point_Mode = const(1)
 _CST816_Gesture_Mode = const(2)
 _CST816_ALL_Mode = const(3)
 
+# Public names for set_mode()
+POINT_MODE = const(1)
+GESTURE_MODE = const(2)
+ALL_MODE = const(3)
+
+# Public names for set_profile()
+RESPONSIVE = const(0)
+BALANCED = const(1)
+LOW_POWER = const(2)
+
+PROFILE_NAMES = ("responsive", "balanced", "low_power")
+
+# Register values of each profile:
+# NorScanPer       normal scan period, 10 ms units (1-30)
+# AutoSleepTime    seconds without a touch before low-power scanning
+# LpScanFreq       low-power scan rate, smaller is more sensitive (1-255)
+# LpScanWin        low-power scan range, bigger is more sensitive (0-3)
+# LpScanTH         low-power wake threshold, smaller is more sensitive
+# LpAutoWakeTime   low-power recalibration period, minutes (1-5)
+# DisAutoSleep     non-zero keeps the chip out of low-power scanning
+_PROFILE_REGS = (_CST816_NorScanPer, _CST816_AutoSleepTime, _CST816_LpScanFreq, _CST816_LpScanWin,
+                 _CST816_LpScanTH, _CST816_LpAutoWakeTime, _CST816_DisAutoSleep)
+_PROFILES = (
+    (1, 2, 7, 3, 48, 5, 1),    # responsive: the reset defaults, never sleeps
+    (1, 5, 7, 3, 48, 5, 0),    # balanced
+    (3, 1, 15, 2, 40, 5, 0),   # low_power
+)
+
+# Public names for get_gesture()
+GESTURE_LEFT = const(3)
+GESTURE_RIGHT = const(4)
+GESTURE_CLICK = const(5)
+
 # Gestures
 _CST816_Gesture_None = const(0)
 _CST816_Gesture_Up = const(1)
@@ -92,8 +134,10 @@ _CST816_Gesture_Long_Press = const(12)
 class CST816:
     """Driver for the CST816 Touchscreen connected over I2C."""
 
-    def __init__(self):
-        self.i2c_device = I2C(0, scl=Pin(7), sda=Pin(6), freq=400000)
+    def __init__(self, i2c=None, rst=13, wait=True):
+        if i2c is None:
+            i2c = I2C(0, scl=Pin(7), sda=Pin(6), freq=400000)
+        self.i2c_device = i2c
         self.prev_x = 0
         self.prev_y = 0
         self.prev_touch = False
@@ -102,32 +146,77 @@ class CST816:
         self.x_dist = 0
         self.y_dist = 0
         self.mode = 0
+        self.profile = RESPONSIVE
+        self.bus_errors = 0
+        self.transactions = 0  # I2C transfers attempted
                 
-        self.rst=Pin(13,Pin.OUT)
+        self.rst=Pin(rst,Pin.OUT)
 
-        self.reset()
-        self.stop_sleep()
+        self.reset(wait)
+        if wait:
+            self.stop_sleep()
 
     def _i2c_write(self, reg, value):
         """Write to I2C"""
+        self.transactions += 1
         self.i2c_device.writeto(_CST816_ADDR,bytes([reg, value]))
 
     def _i2c_read(self, reg):
-        """Read from I2C"""
+        """Read from I2C; 0 while the chip sleeps and does not answer"""
         data = bytearray(1)
-        self.i2c_device.readfrom_mem_into(_CST816_ADDR,int(reg), data)
+        self.transactions += 1
+        try:
+            self.i2c_device.readfrom_mem_into(_CST816_ADDR,int(reg), data)
+        except OSError:
+            self.bus_errors += 1
+            return 0
         return data[0]
 
+    def _mode_writes(self, mode):
+        if mode == _CST816_Point_Mode:
+            return [(_CST816_IrqCtl, 0x41)]
+        if mode == _CST816_Gesture_Mode:
+            return [(_CST816_IrqCtl, 0x11), (_CST816_MotionMask, 0x01)]
+        return [(_CST816_IrqCtl, 0x71)]
+
+    def _profile_writes(self, profile):
+        return list(zip(_PROFILE_REGS, _PROFILES[profile]))
+
+    def _configure(self, writes):
+        """Write (register, value) pairs, waking the chip if it sleeps"""
+        try:
+            for reg, value in writes:
+                self._i2c_write(reg, value)
+        except OSError:
+            # Low-power scanning ignores the bus; a reset wakes the chip but
+            # restores its defaults, so the current settings go first
+            self.bus_errors += 1
+            self.reset()
+            settings = self._profile_writes(self.profile)
+            if self.mode:
+                settings += self._mode_writes(self.mode)
+            for reg, value in settings + writes:
+                self._i2c_write(reg, value)
+
     def who_am_i(self):
         """Check the Chip ID"""
         return bool(self._i2c_read(_CST816_ChipID) == 0xB5)
 
-    def reset(self):
-        """Make the Chip Reset"""
+    def reset(self, wait=True):
+        """Make the Chip Reset; with wait=False call ready() before using it"""
         self.rst(0)
         time.sleep_ms(1)
         self.rst(1)
-        time.sleep_ms(50)
+        self._ready_at = time.ticks_add(time.ticks_ms(), 50)
+        if wait:
+            time.sleep_ms(50)
+
+    def ready(self):
+        """Finish a reset(wait=False): wait out the 50 ms start-up, stop sleep"""
+        left = time.ticks_diff(self._ready_at, time.ticks_ms())
+        if left > 0:
+            time.sleep_ms(left)
+        self.stop_sleep()
 
     def read_revision(self):
         """Read Firmware Version"""
@@ -144,18 +233,20 @@ class CST816:
     def stop_sleep(self):
         """Make the Chip Stop Sleeping"""
         self._i2c_write(_CST816_DisAutoSleep, 0x01)
+        self.profile = RESPONSIVE
 
     def set_mode(self, mode):
         """Set the Behaviour Mode"""
-        if mode == _CST816_Point_Mode:
-            self._i2c_write(_CST816_IrqCtl, 0x41)
-        elif mode == _CST816_Gesture_Mode:
-            self._i2c_write(_CST816_IrqCtl, 0x11)
-            self._i2c_write(_CST816_MotionMask, 0x01)
-        else:
-            self._i2c_write(_CST816_IrqCtl, 0x71)
+        self._configure(self._mode_writes(mode))
         self.mode = mode
 
+    def set_profile(self, profile):
+        """Program a scan profile (RESPONSIVE, BALANCED or LOW_POWER)"""
+        if profile == self.profile:
+            return
+        self._configure(self._profile_writes(profile))
+        self.profile = profile
+
     def get_point(self):
         """Get the Pointer Position"""
         x_point_h = self._i2c_read(_CST816_XposH)
@@ -0,0 +1,88 @@
+"""
+`dnscache`
+================================================================================
+
+Resolver cache for the handful of API hosts the display talks to.
+
+``getaddrinfo`` results are kept in RAM with a TTL and stored under the
+``dns`` key of ``kvstore`` whenever an address changes, so lookups are skipped
+on warm refreshes and right after boot. When the DNS server cannot be reached the last-known
+address is served instead of failing the request.
+"""
+
+import socket
+import time
+import kvstore
+import metrics
+
+TTL = 3600  # Seconds an address is trusted before it is looked up again
+KEY = "dns"
+
+_cache = {}  # (host, port) -> [ip, port, expires]
+_loaded = False
+
+
+def _synced():
+    # Before the RTC is synced time.time() restarts from the epoch on boot
+    return time.localtime()[0] >= 2024
+
+
+def _load():
+    global _loaded
+    _loaded = True
+    now = time.time()
+    for line in kvstore.get(KEY, b'').decode().splitlines():
+        parts = line.split()
+        if len(parts) != 5:
+            continue
+        host, port, ip, addr_port, expires = parts
+        expires = int(expires)
+        if not _synced():
+            # Stored expiry times are meaningless until the clock is set
+            expires = now + TTL
+        _cache[(host, int(port))] = [ip, int(addr_port), expires]
+
+
+def _save():
+    lines = [f"{host} {port} {ip} {addr_port} {int(expires)}\n"
+             for (host, port), (ip, addr_port, expires) in _cache.items()]
+    kvstore.put(KEY, "".join(lines).encode())
+
+
+def resolve(host, port):
+    """Return a connectable address for host:port, using the cache if fresh"""
+    if not _loaded:
+        _load()
+    key = (host, port)
+    entry = _cache.get(key)
+    now = time.time()
+    if entry and now < entry[2]:
+        metrics.incr("dns_hits")
+        return (entry[0], entry[1])
+
+    try:
+        addr = socket.getaddrinfo(host, port, socket.AF_INET, socket.SOCK_STREAM)[0][-1]
+    except OSError as e:
+        if entry:
+            # DNS unreachable: fall back to the last-known address
+            print("DNS error, using cached address:", e)
+            metrics.incr("dns_stale")
+            return (entry[0], entry[1])
+        raise
+    metrics.incr("dns_lookups")
+
+    if not isinstance(addr, tuple):
+        # Older ports return a packed sockaddr that cannot be cached as text
+        return addr
+    changed = not entry or entry[0] != addr[0] or entry[1] != addr[1]
+    _cache[key] = [addr[0], addr[1], now + TTL]
+    if changed:
+        _save()
+    return addr
+
+
+def invalidate(host, port):
+    """Force a fresh lookup next time, keeping the address as a fallback"""
+    entry = _cache.get((host, port))
+    if entry:
+        entry[2] = 0
@@ -0,0 +1,188 @@
+"""
+`exporter`
+================================================================================
+
+Pull-mode metrics and state over HTTP on the local network.
+
+``Server`` listens on a non-blocking socket and never waits on one: each
+``poll()`` accepts a pending connection, reads what has arrived and sends
+as much of a response as the socket takes, then returns. The main thread
+calls it between the slices of its idle wait (see ``power.PowerManager``),
+so a slow or stalled client cannot hold up rendering or touch handling.
+While the display sleeps the CPU is in light sleep and nothing is served.
+
+* ``/metrics`` is in the Prometheus text format: every ``metrics`` counter
+  as ``weather_<name>_total``, every histogram as ``weather_<name>_ms``
+  with cumulative buckets, plus uptime, ``gc.mem_free`` and the gauges and
+  counters registered with ``add()``.
+* ``/state`` is JSON from the ``state`` callable, the cached weather.
+"""
+
+import errno
+import gc
+import json
+import socket
+import time
+import metrics
+
+PREFIX = "weather_"
+
+MAX_CLIENTS = 2
+MAX_REQUEST = 1024  # longest request head read
+TIMEOUT_MS = 5000  # idle clients are dropped after this
+RECV_SIZE = 256
+
+_AGAIN = (errno.EAGAIN, getattr(errno, 'EWOULDBLOCK', errno.EAGAIN))
+
+
+class _Client:
+    def __init__(self, sock):
+        self.sock = sock
+        self.request = b''
+        self.response = None  # memoryview of what is left to send
+        self.seen = time.ticks_ms()
+
+
+class Server:
+    """Non-blocking HTTP server for /metrics and /state, stepped by poll()."""
+
+    def __init__(self, port, state=None):
+        self.port = port
+        self.state = state
+        self.extra = []  # (name, kind, fn)
+        self.requests = 0
+        self.sock = None
+        self.clients = []
+        self.uptime_ms = 0
+        self._ticks = time.ticks_ms()
+
+    def add(self, name, fn, kind='gauge'):
+        """Export fn() as `name`, a 'gauge' or 'counter'; None values are skipped"""
+        self.extra.append((name, kind, fn))
+
+    def start(self):
+        addr = socket.getaddrinfo('0.0.0.0', self.port)[0][-1]
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(addr)
+        sock.listen(MAX_CLIENTS)
+        sock.setblocking(False)
+        self.sock = sock
+        print("Metrics on port", self.port)
+
+    def stop(self):
+        for client in self.clients:
+            client.sock.close()
+        self.clients = []
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+
+    def _tick(self):
+        # Accumulated, so the figure survives the ticks_ms() wrap-around
+        now = time.ticks_ms()
+        self.uptime_ms += time.ticks_diff(now, self._ticks)
+        self._ticks = now
+        return now
+
+    def poll(self):
+        """Do whatever socket work is ready without blocking"""
+        now = self._tick()
+        if self.sock is None:
+            return
+        try:
+            sock, _ = self.sock.accept()
+        except OSError:
+            sock = None  # nothing pending
+        if sock:
+            if len(self.clients) < MAX_CLIENTS:
+                sock.setblocking(False)
+                self.clients.append(_Client(sock))
+            else:
+                sock.close()
+        for client in self.clients[:]:
+            try:
+                done = self._step(client)
+            except OSError as e:
+                if e.args[0] not in _AGAIN:
+                    done = True
+                else:
+                    done = time.ticks_diff(now, client.seen) > TIMEOUT_MS
+            if done:
+                client.sock.close()
+                self.clients.remove(client)
+
+    def _step(self, client):
+        # Returns True once the client is finished with
+        if client.response is None:
+            while True:
+                data = client.sock.recv(RECV_SIZE)
+                if not data:
+                    return True
+                client.request += data
+                client.seen = time.ticks_ms()
+                if b'\r\n\r\n' in client.request or len(client.request) >= MAX_REQUEST:
+                    break
+            client.response = memoryview(self._respond(client.request))
+        while client.response:
+            sent = client.sock.send(client.response)
+            if not sent:
+                break
+            client.response = client.response[sent:]
+            client.seen = time.ticks_ms()
+        return not client.response
+
+    def _respond(self, request):
+        self.requests += 1
+        line = request.split(b'\r\n', 1)[0].split()
+        path = line[1].split(b'?', 1)[0] if len(line) > 1 else b''
+        if len(line) < 2 or line[0] != b'GET':
+            return _response(405, b"Only GET\n", "text/plain")
+        if path == b'/metrics':
+            return _response(200, self.metrics_text().encode(), "text/plain; version=0.0.4")
+        if path == b'/state':
+            state = self.state() if self.state else None
+            return _response(200, json.dumps(state).encode(), "application/json")
+        return _response(404, b"Try /metrics or /state\n", "text/plain")
+
+    def metrics_text(self):
+        """Everything exported, in the Prometheus text format"""
+        self._tick()
+        out = []
+        _sample(out, "uptime_seconds", "gauge", self.uptime_ms // 1000)
+        _sample(out, "mem_free_bytes", "gauge", gc.mem_free())
+        _sample(out, "http_served_total", "counter", self.requests)
+        for name, kind, fn in self.extra:
+            try:
+                value = fn()
+            except Exception as e:
+                print("Metrics error:", name, e)
+                continue
+            if value is not None:
+                _sample(out, name, kind, value)
+        # Copies: the worker thread records while this runs
+        for name, value in sorted(metrics.counters.items()):
+            _sample(out, name + "_total", "counter", value)
+        for name, hist in sorted(metrics.histograms.items()):
+            hist = list(hist)
+            name = PREFIX + name + "_ms"
+            out.append("# TYPE %s histogram\n" % name)
+            total = 0
+            for bound, n in zip(metrics.BUCKETS, hist[3:]):
+                total += n
+                out.append('%s_bucket{le="%d"} %d\n' % (name, bound, total))
+            out.append('%s_bucket{le="+Inf"} %d\n' % (name, hist[0]))
+            out.append("%s_sum %d\n%s_count %d\n" % (name, hist[1], name, hist[0]))
+        return "".join(out)
+
+
+def _sample(out, name, kind, value):
+    name = PREFIX + name
+    out.append("# TYPE %s %s\n%s %s\n" % (name, kind, name, value))
+
+
+def _response(status, body, content_type):
+    reason = {200: "OK", 404: "Not Found", 405: "Method Not Allowed"}[status]
+    head = "HTTP/1.0 %d %s\r\nContent-Type: %s\r\nContent-Length: %d\r\nConnection: close\r\n\r\n" % (
+        status, reason, content_type, len(body))
+    return head.encode() + body
@@ -0,0 +1,76 @@
+"""
+`governor`
+================================================================================
+
+CPU frequency governor: the lowest clock while idle, the highest for bursts.
+
+Most of the app's time is spent waiting for a touch, a timer or a socket,
+which costs nothing in cycles but draws current in proportion to the clock.
+``start()`` drops ``machine.freq()`` to the idle clock and ``burst()`` wraps
+parsing, decoding and drawing so they run at the top clock and finish
+sooner. Bursts nest and may overlap across threads; the clock goes up when
+the first one starts and back down when the last one ends. Every change is
+recorded with ``metrics.event("cpu_freq", mhz)`` and each named burst's
+duration is observed as ``burst_<name>``.
+"""
+
+import time
+import _thread
+import machine
+import metrics
+
+IDLE_FREQ = 80000000  # the lowest clock Wi-Fi keeps working at
+BURST_FREQ = 240000000
+
+_lock = _thread.allocate_lock()
+_depth = 0
+_idle = _burst = 0  # 0 while the governor is stopped
+
+
+def _set(hz):
+    machine.freq(hz)
+    metrics.event("cpu_freq", hz // 1000000)
+    metrics.incr("cpu_freq_changes")
+
+
+def start(idle=IDLE_FREQ, burst=BURST_FREQ):
+    """Run at `idle` Hz from now on, and at `burst` Hz inside bursts"""
+    global _idle, _burst
+    with _lock:
+        _idle, _burst = idle, burst
+        _set(burst if _depth else idle)
+
+
+def stop(freq=None):
+    """Leave the clock alone from now on (at `freq` Hz if given)"""
+    global _idle, _burst
+    with _lock:
+        _idle = _burst = 0
+        if freq:
+            _set(freq)
+
+
+class burst:
+    """Context manager that runs its block at the burst clock."""
+
+    def __init__(self, name=None):
+        self.name = name
+
+    def __enter__(self):
+        global _depth
+        with _lock:
+            _depth += 1
+            if _depth == 1 and _burst:
+                _set(_burst)
+        self.start = time.ticks_ms()
+        return self
+
+    def __exit__(self, *exc):
+        global _depth
+        if self.name:
+            metrics.observe("burst_" + self.name, time.ticks_diff(time.ticks_ms(), self.start))
+        with _lock:
+            _depth -= 1
+            if _depth == 0 and _idle:
+                _set(_idle)
+        return False
@@ -0,0 +1 @@
+"""Host-side (CPython) tools and stand-ins for the weather display."""
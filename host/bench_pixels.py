@@ -0,0 +1,139 @@
+"""
+Micro-benchmark of the ``pixels`` variants.
+
+Expands every glyph of ``vga1_bold_16x32`` with each variant of
+``expand_glyph``, and runs ``expand_palette``, ``rle_decode`` and ``fill``
+over the same number of pixels and ``line`` over the polylines of a
+sparkline tile, including lines with end points off the tile, then prints
+pixels per second and the speed-up over plain Python. It also checks that
+every variant produced the same bytes, and that no line wrote past its tile.
+It runs on the host, where only the Python and (no-op) native variants
+exist, and on the board, which needs ``pixels`` and the font (or
+``assets.bin``) on its filesystem::
+
+    python -m host.bench_pixels
+    mpremote run host/bench_pixels.py
+"""
+
+import time
+
+try:
+    from host import hostenv
+    hostenv.install()
+except ImportError:
+    pass  # on the board
+
+import pixels
+
+ROUNDS = 3
+ORDER = ('python', 'native', 'viper')  # the first is the baseline
+GUARD = b'\xA5' * 16  # after the line tile; must be intact after every variant
+
+
+def load_font():
+    try:
+        import assets
+        bundle = assets.load()
+        if bundle:
+            return bundle.font("bitmap/vga1_bold_16x32")
+    except ImportError:
+        pass
+    from bitmap import vga1_bold_16x32 as font
+    return font
+
+
+def workloads(font):
+    """name -> (list of argument tuples, pixels per round, output buffer)"""
+    glyph = pixels.GlyphBuffer(font)
+    source = memoryview(font.FONT)
+    glyph_args = []
+    for index in range(font.LAST - font.FIRST + 1):
+        offset = index * glyph.stride
+        glyph_args.append((source[offset:offset + glyph.stride], glyph.buf, glyph.pixels,
+                           pixels.colors(0xFFFF, 0x0000)))
+    total = len(glyph_args) * glyph.pixels
+
+    indices = bytearray(i & 0xFF for i in range(glyph.pixels))
+    palette = bytearray(512)
+    for i in range(256):
+        palette[2 * i] = i
+        palette[2 * i + 1] = 255 - i
+    palette_buf = bytearray(glyph.pixels * 2)
+    palette_args = [(indices, palette_buf, glyph.pixels, palette)] * len(glyph_args)
+
+    runs = bytearray(glyph.pixels // 8 * 3)
+    for i in range(0, len(runs), 3):
+        runs[i] = 8
+        runs[i + 1] = i & 0xFF
+        runs[i + 2] = 0x55
+    rle_buf = bytearray(glyph.pixels * 2)
+    rle_args = [(runs, rle_buf, len(runs), len(rle_buf))] * len(glyph_args)
+
+    fill_buf = bytearray(glyph.pixels * 2)
+    fill_args = [(fill_buf, glyph.pixels, 0x1234)] * len(glyph_args)
+
+    # Zig-zag hourly series across a 100 x 28 chart tile, as sparkline draws
+    tile_w, tile_h = 100, 28
+    line_buf = bytearray(tile_w * tile_h * 2 + len(GUARD))
+    line_buf[-len(GUARD):] = GUARD
+    line_args = []
+    line_pixels = 0
+    for i in range(23):
+        x0, x1 = i * 99 // 23, (i + 1) * 99 // 23
+        y0, y1 = (i * 7) % tile_h, ((i + 1) * 7) % tile_h
+        line_args.append((line_buf, tile_w, pixels.ends(x0, y0, x1, y1, tile_w, tile_h), 0xFFE0))
+        line_pixels += max(abs(x1 - x0), abs(y1 - y0)) + 1
+    # Points off the tile, clamped by ends(); unclamped they would write past
+    # line_buf (a raw pointer store in the viper variant)
+    for x0, y0, x1, y1 in ((-5, 10, 40, -24), (90, 26, 130, 300), (0, -1, 99, 28)):
+        packed = pixels.ends(x0, y0, x1, y1, tile_w, tile_h)
+        line_args.append((line_buf, tile_w, packed, 0x07E0))
+        line_pixels += max(abs((packed >> 8 & 0xFF) - (packed >> 24)),
+                           abs((packed & 0xFF) - (packed >> 16 & 0xFF))) + 1
+    line_args *= 20
+
+    return {
+        'expand_glyph': (glyph_args, total, glyph.buf),
+        'expand_palette': (palette_args, total, palette_buf),
+        'rle_decode': (rle_args, total, rle_buf),
+        'fill': (fill_args, total, fill_buf),
+        'line': (line_args, line_pixels * 20, line_buf),
+    }
+
+
+def bench(fn, args, rounds=ROUNDS):
+    """Microseconds to call fn over all the argument tuples `rounds` times"""
+    start = time.ticks_us()
+    for _ in range(rounds):
+        for a in args:
+            fn(*a)
+    return time.ticks_diff(time.ticks_us(), start)
+
+
+def main():
+    font = load_font()
+    loads = workloads(font)
+    for name in ('expand_glyph', 'expand_palette', 'rle_decode', 'fill', 'line'):
+        args, total, out = loads[name]
+        print(name)
+        base = None
+        reference = None
+        for variant in ORDER:
+            fn = pixels.VARIANTS[name].get(variant)
+            if fn is None:
+                continue
+            us = bench(fn, args)
+            rate = total * ROUNDS * 1000000 // max(us, 1)
+            if base is None:
+                base = rate
+            # Every variant must leave the same bytes behind
+            same = reference is None or bytes(out) == reference
+            reference = bytes(out)
+            overrun = name == 'line' and bytes(out[-len(GUARD):]) != GUARD
+            print("  %-7s %10d px/s  x%.1f%s%s" % (variant, rate, rate / max(base, 1),
+                                                   '' if same else '  MISMATCH',
+                                                   '  OVERRUN' if overrun else ''))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Load-test benchmark for the aggregation proxy.
+
+Starts a fake upstream (ip-api and Open-Meteo look-alikes that count their
+requests), the proxy pointed at it, and a fleet of simulated displays that
+poll the proxy over keep-alive connections with ``If-None-Match``, like the
+devices do. Reports device and upstream request counts, how many polls were
+answered ``304 Not Modified``, bytes sent to the devices and proxy latency::
+
+    python -m host.bench_proxy --devices 200 --locations 3 --rounds 5
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from host.proxy import WeatherProxy
+
+
+def _open_meteo(lat, lon):
+    hours = ['2025-01-01T%02d:00' % h for h in range(24)] + ['2025-01-02T%02d:00' % h for h in range(24)]
+    return {
+        'latitude': lat, 'longitude': lon, 'timezone': 'Europe/London', 'utc_offset_seconds': 0,
+        'current_weather': {'temperature': 7.4, 'weathercode': 3, 'time': '2025-01-01T10:00'},
+        'hourly': {'time': hours,
+                   'temperature_2m': [round(5 + h * 0.2, 1) for h in range(48)],
+                   'relativehumidity_2m': [60 + h % 30 for h in range(48)]},
+    }
+
+
+class FakeUpstream:
+    """Counts requests per API and answers with canned JSON."""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.counts = {'geo': 0, 'weather': 0}
+
+    async def handle(self, reader, writer):
+        request = await reader.readuntil(b'\r\n\r\n')
+        target = request.split(b' ', 2)[1].decode()
+        await asyncio.sleep(self.delay)  # upstream round trip
+        if target.startswith('/json'):
+            self.counts['geo'] += 1
+            body = {'lat': 51.5074, 'lon': -0.1278, 'city': 'London', 'timezone': 'Europe/London'}
+        else:
+            self.counts['weather'] += 1
+            body = _open_meteo(0, 0)
+        data = json.dumps(body).encode()
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: %d\r\nConnection: close\r\n\r\n' % len(data) + data)
+        await writer.drain()
+        writer.close()
+
+
+def _header(head, name):
+    for line in head.split(b'\r\n')[1:]:
+        key, _, value = line.partition(b':')
+        if key.strip().lower() == name:
+            return value.strip()
+    return None
+
+
+async def _device(port, location, rounds, interval, latencies, received):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    query = '' if location is None else '?lat=%.4f&lon=%.4f' % location
+    etag = None
+    await asyncio.sleep(random.random() * interval)
+    for _ in range(rounds):
+        start = time.perf_counter()
+        request = f"GET /v1/weather.bin{query} HTTP/1.1\r\nHost: proxy\r\n"
+        if etag:
+            request += f"If-None-Match: {etag}\r\n"
+        writer.write((request + "\r\n").encode())
+        await writer.drain()
+        head = await reader.readuntil(b'\r\n\r\n')
+        length = int(_header(head, b'content-length') or 0)
+        await reader.readexactly(length)
+        etag = (_header(head, b'etag') or b'').decode() or etag
+        received[0] += len(head) + length
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(interval)
+    writer.close()
+
+
+async def run(devices, locations, rounds, interval, ttl, delay):
+    upstream = FakeUpstream(delay)
+    up_server = await asyncio.start_server(upstream.handle, '127.0.0.1', 0)
+    up_port = up_server.sockets[0].getsockname()[1]
+
+    proxy = WeatherProxy(
+        ttl=ttl,
+        weather_url=f"http://127.0.0.1:{up_port}/v1/forecast?latitude={{lat}}&longitude={{lon}}",
+        geo_url=f"http://127.0.0.1:{up_port}/json/",
+    )
+    server = await proxy.serve('127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+
+    places = [None] + [(51.5 + i * 0.3, -0.12 + i * 0.3) for i in range(locations - 1)]
+    latencies = []
+    received = [0]
+    start = time.perf_counter()
+    await asyncio.gather(*(_device(port, places[i % len(places)], rounds, interval, latencies, received)
+                           for i in range(devices)))
+    wall = time.perf_counter() - start
+    server.close()
+    up_server.close()
+
+    latencies.sort()
+    direct = devices * rounds + devices * 2  # weather per poll + geo and time at boot
+    print(f"Devices: {devices}, locations: {len(places)}, rounds: {rounds}")
+    print(f"Device requests:   {proxy.requests}")
+    print(f"Upstream requests: {sum(upstream.counts.values())} {upstream.counts}")
+    print(f"Without the proxy: {direct}")
+    print(f"Not modified:      {proxy.not_modified} ({received[0]} bytes to devices)")
+    print("Latency ms: p50 %.1f  p95 %.1f  max %.1f" % tuple(
+        1000 * latencies[int(q * (len(latencies) - 1))] for q in (0.5, 0.95, 1.0)))
+    print(f"Throughput: {proxy.requests / wall:.0f} req/s over {wall:.1f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--devices', type=int, default=100)
+    parser.add_argument('--locations', type=int, default=3)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between polls per device')
+    parser.add_argument('--ttl', type=float, default=2.0, help='proxy weather TTL in seconds')
+    parser.add_argument('--delay', type=float, default=0.05, help='fake upstream latency in seconds')
+    args = parser.parse_args()
+    asyncio.run(run(args.devices, args.locations, args.rounds, args.interval, args.ttl, args.delay))
+
+
+if __name__ == "__main__":
+    main()
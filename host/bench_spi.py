@@ -0,0 +1,41 @@
+"""
+Display calibration on the stand-in panel.
+
+Runs ``calibrate.measure`` against the ``gc9a01`` stand-in with transfer times
+modelled on a virtual clock, on a board whose wiring carries at most
+``--max-baud`` cleanly, then prints every candidate and the pair
+``calibrate.choose`` keeps. Nothing is saved::
+
+    python -m host.bench_spi
+    python -m host.bench_spi --max-baud 40000000
+"""
+
+import argparse
+
+from host import hostenv
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--max-baud', type=int, default=80000000,
+                        help='fastest SPI clock the simulated wiring carries cleanly')
+    args = parser.parse_args()
+
+    hostenv.install(hostenv.Clock())
+    import machine
+    import gc9a01
+    import calibrate
+
+    machine.SPI.max_baud = args.max_baud
+    gc9a01.GC9A01.timed = True
+    spi = machine.SPI(2)
+    rows = calibrate.measure(spi, lambda size: gc9a01.GC9A01(spi, 240, 240, buffer_size=size))
+    best = calibrate.choose(rows)
+    for row in rows:
+        baud, size, rate, ok = row
+        print("%s %3d MHz %6d B %9d px/s %s" % ('*' if row is best else ' ', baud // 1000000,
+                                              size, rate, 'ok' if ok else 'CORRUPT'))
+
+
+if __name__ == "__main__":
+    main()
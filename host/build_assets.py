@@ -0,0 +1,97 @@
+"""
+Pack ``bitmap/`` into the ``assets.bin`` bundle the device reads.
+
+The Python font modules are stored as their glyph bitmap behind a four-byte
+size header under their module path (``bitmap/vga1_bold_16x32``), and the
+``.bin`` ROM fonts as raw data. The icons in ``jpg/`` are not bundled, since
+the display driver only draws JPEGs from files. The build fails if two names
+hash alike::
+
+    python -m host.build_assets -o assets.bin
+"""
+
+import argparse
+import os
+import struct
+import sys
+
+from host import hostenv
+
+hostenv.install()
+import assets  # noqa: E402
+
+ROOT = hostenv.ROOT
+
+
+def _font(path):
+    """Size header and glyph bitmap of a font module"""
+    namespace = {}
+    with open(path) as f:
+        exec(f.read(), namespace)
+    header = bytes((namespace['WIDTH'], namespace['HEIGHT'], namespace['FIRST'], namespace['LAST']))
+    return header + bytes(namespace['FONT'])
+
+
+def collect(root=ROOT):
+    """(name, format, data) for every asset, in directory order"""
+    entries = []
+    for name in sorted(os.listdir(os.path.join(root, 'bitmap'))):
+        path = os.path.join(root, 'bitmap', name)
+        if name.endswith('.py'):
+            entries.append(('bitmap/' + name[:-3], assets.FONT, _font(path)))
+        elif name.endswith('.bin'):
+            with open(path, 'rb') as f:
+                entries.append(('bitmap/' + name, assets.RAW, f.read()))
+    return entries
+
+
+def pack(entries):
+    """The bundle for a list of (name, format, data)"""
+    by_hash = {}
+    for name, fmt, data in entries:
+        h = assets.name_hash(name)
+        if h in by_hash:
+            raise ValueError("hash collision: %s and %s" % (by_hash[h][0], name))
+        by_hash[h] = (name, fmt, data)
+    hashes = sorted(by_hash)
+    count = len(hashes)
+    offset = assets.HEADER_SIZE + count * assets.ENTRY_SIZE
+    offsets, lengths, formats, blobs = [], [], [], []
+    for h in hashes:
+        _, fmt, data = by_hash[h]
+        offsets.append(offset)
+        lengths.append(len(data))
+        formats.append(fmt)
+        blobs.append(data)
+        offset += len(data)
+    return b''.join([
+        struct.pack(assets._HEADER, assets.MAGIC, assets.VERSION, count, max(lengths, default=0)),
+        struct.pack('<%dI' % count, *hashes),
+        struct.pack('<%dI' % count, *offsets),
+        struct.pack('<%dI' % count, *lengths),
+        bytes(formats),
+    ] + blobs)
+
+
+def build(out, root=ROOT):
+    entries = collect(root)
+    try:
+        bundle = pack(entries)
+    except ValueError as e:
+        sys.exit("build_assets: %s" % e)
+    with open(out, 'wb') as f:
+        f.write(bundle)
+    loose = sum(len(data) for _, _, data in entries)
+    print("%s: %d assets, %d bytes (%d bytes of data)" % (out, len(entries), len(bundle), loose))
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-o', '--out', default=os.path.join(ROOT, assets.BUNDLE_FILE), help='bundle path')
+    args = parser.parse_args()
+    build(args.out)
+
+
+if __name__ == "__main__":
+    main()
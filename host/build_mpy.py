@@ -0,0 +1,95 @@
+"""
+Precompile the app into ``.mpy`` files for a faster boot.
+
+MicroPython compiles every imported ``.py`` on the device at each boot, which
+for this app costs more than drawing the first frame. This tool runs
+``mpy-cross`` over the top-level modules into a deploy directory.
+``main.py`` itself is compiled as ``app.mpy`` next to a two-line ``main.py``
+stub, since the board only runs ``main.py`` from source. The fonts go into
+the ``assets.bin`` bundle (see ``host/build_assets.py``) and the icons are
+copied as they are::
+
+    pip install mpy-cross
+    python -m host.build_mpy --out build
+    mpremote fs cp -r build/* :
+
+MicroPython prefers a ``.py`` over an ``.mpy`` of the same name, so remove
+old ``.py`` copies of the modules from the board when switching to the
+build.
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+
+from host import build_assets, build_wmo
+from host.hostenv import ROOT
+
+ASSETS = ('config.txt', 'jpg')
+
+STUB = "import app\napp.main()\n"
+
+
+def _mpy_cross():
+    """Command prefix that runs mpy-cross, from PATH or the pip package"""
+    exe = shutil.which('mpy-cross')
+    if exe:
+        return [exe]
+    try:
+        import mpy_cross  # noqa: F401
+    except ImportError:
+        sys.exit("mpy-cross not found; install it with: pip install mpy-cross")
+    return [sys.executable, '-m', 'mpy_cross']
+
+
+def modules():
+    """(source, target) pairs relative to ROOT for everything the board imports"""
+    pairs = []
+    for name in sorted(os.listdir(ROOT)):
+        if name.endswith('.py') and name != 'main.py':
+            pairs.append((name, name[:-3] + '.mpy'))
+    pairs.append(('main.py', 'app.mpy'))
+    return pairs
+
+
+def build(out, march='xtensawin', opt=2):
+    build_wmo.check()
+    cross = _mpy_cross()
+    total_src = total_mpy = 0
+    for source, target in modules():
+        dest = os.path.join(out, target)
+        os.makedirs(os.path.dirname(dest) or out, exist_ok=True)
+        subprocess.run(cross + ['-march=' + march, '-O%d' % opt, '-s', os.path.basename(source),
+                                '-o', dest, os.path.join(ROOT, source)], check=True)
+        src_size = os.path.getsize(os.path.join(ROOT, source))
+        mpy_size = os.path.getsize(dest)
+        total_src += src_size
+        total_mpy += mpy_size
+        print("%-32s %7d -> %6d" % (target, src_size, mpy_size))
+
+    with open(os.path.join(out, 'main.py'), 'w') as f:
+        f.write(STUB)
+    for asset in ASSETS:
+        src = os.path.join(ROOT, asset)
+        dest = os.path.join(out, asset)
+        if os.path.isdir(src):
+            shutil.copytree(src, dest, dirs_exist_ok=True)
+        elif os.path.exists(src):
+            shutil.copy2(src, dest)
+    build_assets.build(os.path.join(out, 'assets.bin'))
+    print("%-32s %7d -> %6d bytes" % ('total', total_src, total_mpy))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--out', default='build', help='deploy directory')
+    parser.add_argument('--march', default='xtensawin', help='native code target (ESP32-S3: xtensawin)')
+    parser.add_argument('-O', dest='opt', type=int, default=2, help='mpy-cross optimisation level')
+    args = parser.parse_args()
+    build(args.out, args.march, args.opt)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Generate ``wmo.py``, the weather-code lookup tables, from the registry below.
+
+``REGISTRY`` is the one place that says what each WMO weather code is called
+and which icon in ``jpg/`` shows it. The generator turns it into constant
+``bytes`` tables indexed by code, so the device looks a code up without
+building a dict. It refuses to write the tables if an icon is missing, and
+``--check`` fails if ``wmo.py`` is out of date (``build_mpy`` runs it)::
+
+    python -m host.build_wmo
+    python -m host.build_wmo --check
+"""
+
+import argparse
+import os
+import sys
+
+from host.hostenv import ROOT
+
+OUTPUT = os.path.join(ROOT, 'wmo.py')
+CODES = 100
+
+# WMO code: (condition, icon file in jpg/)
+REGISTRY = {
+    0: ("Clear sky", "clear_sky.jpg"),
+    1: ("Mainly clear", "mainly_clear.jpg"),
+    2: ("Partly cloudy", "partly_cloudy.jpg"),
+    3: ("Overcast", "overcast.jpg"),
+    45: ("Fog", "fog.jpg"),
+    48: ("Rime fog", "fog.jpg"),
+    51: ("Light drizzle", "light_drizzle.jpg"),
+    53: ("Moderate drizzle", "moderate_drizzle.jpg"),
+    55: ("Dense drizzle", "dense_drizzle.jpg"),
+    56: ("Freezing drizzle", "freezing_drizzle.jpg"),
+    57: ("Dense freezing drizzle", "freezing_drizzle.jpg"),
+    61: ("Slight rain", "light_rain.jpg"),
+    63: ("Moderate rain", "light_rain.jpg"),
+    65: ("Heavy rain", "light_rain.jpg"),
+    66: ("Freezing rain", "freezing_rain.jpg"),
+    67: ("Heavy freezing rain", "freezing_rain.jpg"),
+    71: ("Slight snow", "light_snow.jpg"),
+    73: ("Moderate snow", "moderate_snow.jpg"),
+    75: ("Heavy snow", "heavy_snow.jpg"),
+    77: ("Snow grains", "snow_grains.jpg"),
+    80: ("Slight showers", "light_rain.jpg"),
+    81: ("Moderate showers", "light_rain.jpg"),
+    82: ("Violent showers", "light_rain.jpg"),
+    85: ("Snow showers", "light_snow.jpg"),
+    86: ("Heavy snow showers", "heavy_snow.jpg"),
+    95: ("Thunderstorm", "thunderstorm.jpg"),
+    96: ("Thunderstorm w/hail", "thunderstorm_hail.jpg"),
+    99: ("Severe thunderstorm", "thunderstorm_heavyhail.jpg"),
+}
+
+UNKNOWN = "Unknown"
+NO_ICON = 255
+
+TEMPLATE = '''"""
+`wmo`
+================================================================================
+
+WMO weather code tables, generated by ``host/build_wmo.py``; edit the
+registry there, not this file.
+
+``CONDITION[code]`` indexes ``CONDITIONS`` and ``ICON[code]`` indexes
+``ICONS`` (``NO_ICON`` if the code has none), for codes below ``CODES``.
+Lookups index constant ``bytes`` and tuples, so they allocate nothing.
+"""
+
+CODES = {codes}
+NO_ICON = {no_icon}
+
+CONDITIONS = (
+{conditions})
+
+ICONS = (
+{icons})
+
+CONDITION = {condition!r}
+
+ICON = {icon!r}
+'''
+
+
+def missing_icons(root=ROOT):
+    """Icon files the registry names that are not in jpg/"""
+    present = set(os.listdir(os.path.join(root, 'jpg')))
+    return sorted({icon for _, icon in REGISTRY.values() if icon not in present})
+
+
+def generate():
+    """Source of wmo.py for REGISTRY"""
+    conditions = [UNKNOWN]
+    icons = []
+    condition = bytearray(CODES)
+    icon = bytearray([NO_ICON] * CODES)
+    for code in sorted(REGISTRY):
+        name, path = REGISTRY[code]
+        if name not in conditions:
+            conditions.append(name)
+        path = 'jpg/' + path
+        if path not in icons:
+            icons.append(path)
+        condition[code] = conditions.index(name)
+        icon[code] = icons.index(path)
+    return TEMPLATE.format(
+        codes=CODES, no_icon=NO_ICON,
+        conditions=''.join('    %r,\n' % name for name in conditions),
+        icons=''.join('    %r,\n' % path for path in icons),
+        condition=bytes(condition), icon=bytes(icon))
+
+
+def check():
+    """Exit with an error if an icon is missing or wmo.py is out of date"""
+    missing = missing_icons()
+    if missing:
+        sys.exit("build_wmo: missing icons in jpg/: " + ", ".join(missing))
+    with open(OUTPUT) as f:
+        if f.read() != generate():
+            sys.exit("build_wmo: wmo.py is out of date; run python -m host.build_wmo")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--check', action='store_true', help='fail if wmo.py is out of date')
+    args = parser.parse_args()
+    if args.check:
+        check()
+        return
+    missing = missing_icons()
+    if missing:
+        sys.exit("build_wmo: missing icons in jpg/: " + ", ".join(missing))
+    with open(OUTPUT, 'w') as f:
+        f.write(generate())
+    print("wmo.py: %d codes, %d icons" % (len(REGISTRY), len(set(i for _, i in REGISTRY.values()))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,448 @@
+"""
+Simulated I2C bus and CST816 register map, driven by touch traces.
+
+``Chip`` models the parts of the CST816 the driver touches:
+
+* the touch registers: gesture ID, finger count, and the X/Y high and low
+  nibbles with the event flag;
+* the configuration registers, with their reset defaults;
+* the IRQ line, pulsed as ``IrqCtl`` asks;
+* the reset pin;
+* automatic low-power scanning, during which the chip ignores the bus.
+
+``Bus`` stands in for ``machine.I2C``. It counts transactions, bytes and the
+time they would take at the bus clock.
+
+A trace is a list of ``(seconds, event, x, y)`` tuples, where the event is
+``down``, ``move`` or ``up``. It is scripted in ``TRACES`` or recorded one
+event per line in a text file::
+
+    0.00 down 120 120
+    0.12 up 120 120
+
+``main()`` reports the I2C traffic of each driver read, and plays every
+trace through ``main.handle_touch`` in point and gesture mode. For each it
+prints the outcome, the latency from the finger going down to the outcome,
+and the I2C traffic. It also shows the touch controller current and tap
+latency of each scan profile after an idle spell. ``--check`` exits non-zero
+when an outcome differs from ``EXPECTED``::
+
+    python -m host.cst816_sim
+    python -m host.cst816_sim --trace touches.txt --check
+
+Scan timings and currents are rough assumptions for comparing profiles, not
+datasheet figures: a scan every ``NorScanPer`` x 10 ms at 0.2 + 1.3 /
+``NorScanPer`` mA, and in low power one every ``LpScanFreq`` x 10 ms at about
+0.02 + 0.35 x (``LpScanWin`` + 1) / ``LpScanFreq`` mA. A change is noticed a
+full scan period later, so latencies are worst cases.
+"""
+
+import argparse
+import contextlib
+import io
+import sys
+
+from host import hostenv
+
+ADDR = 0x15
+CHIP_ID = 0xB5
+ENODEV = 19
+
+# Register addresses, as in cst816.py
+GESTURE_ID = 0x01
+FINGER_NUM = 0x02
+XPOS_H = 0x03
+XPOS_L = 0x04
+YPOS_H = 0x05
+YPOS_L = 0x06
+CHIP_ID_REG = 0xA7
+FW_VERSION = 0xA9
+NOR_SCAN_PER = 0xEE
+LP_AUTO_WAKE_TIME = 0xF4
+LP_SCAN_TH = 0xF5
+LP_SCAN_WIN = 0xF6
+LP_SCAN_FREQ = 0xF7
+AUTO_SLEEP_TIME = 0xF9
+IRQ_CTL = 0xFA
+LONG_PRESS_TIME = 0xFC
+DIS_AUTO_SLEEP = 0xFE
+
+DEFAULTS = {
+    CHIP_ID_REG: CHIP_ID, FW_VERSION: 0x02, NOR_SCAN_PER: 1, LP_AUTO_WAKE_TIME: 5,
+    LP_SCAN_TH: 48, LP_SCAN_WIN: 3, LP_SCAN_FREQ: 7, AUTO_SLEEP_TIME: 2, IRQ_CTL: 0x60,
+    LONG_PRESS_TIME: 100, DIS_AUTO_SLEEP: 0,
+}
+
+# IrqCtl bits
+EN_TOUCH = 0x40  # pulse every scan while touched
+EN_CHANGE = 0x20  # pulse when a finger lands or lifts
+EN_MOTION = 0x10  # pulse when a gesture is recognized
+
+# Gesture IDs
+CLICK = 0x05
+LEFT = 0x03
+RIGHT = 0x04
+UP = 0x01
+DOWN = 0x02
+LONG_PRESS = 0x0C
+
+SWIPE = 40  # pixels of travel that make a swipe rather than a click
+BOOT = 0.05  # seconds from reset release until the chip answers
+
+TRACES = {
+    'tap': [(0.0, 'down', 120, 120), (0.12, 'up', 121, 119)],
+    'swipe_left': [(0.0, 'down', 180, 120), (0.05, 'move', 140, 121),
+                   (0.10, 'move', 90, 122), (0.15, 'up', 60, 122)],
+    'swipe_right': [(0.0, 'down', 60, 120), (0.05, 'move', 100, 119),
+                    (0.10, 'move', 150, 118), (0.15, 'up', 180, 118)],
+    'long_press': [(0.0, 'down', 120, 120), (1.5, 'up', 120, 120)],
+}
+
+# Outcome of each trace through handle_touch: 'toggle', 'next', 'prev' or None
+EXPECTED = {
+    ('tap', 'point'): 'toggle', ('swipe_left', 'point'): 'toggle',
+    ('swipe_right', 'point'): 'toggle', ('long_press', 'point'): 'toggle',
+    ('tap', 'gesture'): 'toggle', ('swipe_left', 'gesture'): 'next',
+    ('swipe_right', 'gesture'): 'prev', ('long_press', 'gesture'): None,
+}
+
+
+def load_trace(path):
+    """Read a recorded trace: one 'seconds event x y' line per event"""
+    trace = []
+    with open(path) as f:
+        for line in f:
+            parts = line.split('#')[0].split()
+            if parts:
+                trace.append((float(parts[0]), parts[1], int(parts[2]), int(parts[3])))
+    return trace
+
+
+class Chip:
+    """CST816 register map, IRQ line and scan timing on the virtual clock.
+
+    `irq_pin` is the Pin to pulse, or the id of the pin the app sets an IRQ
+    handler on.
+    """
+
+    def __init__(self, clock, irq_pin, rst_id=13):
+        import machine
+        self.clock = clock
+        self.irq = irq_pin
+        self.meter = machine.meter
+        self.regs = bytearray(256)
+        self.irq_log = []  # clock times of IRQ pulses
+        self.finger = False
+        self._reset()
+        machine.Pin.listeners[rst_id] = self._on_rst
+
+    def _reset(self):
+        self.regs[:] = bytes(256)
+        for reg, value in DEFAULTS.items():
+            self.regs[reg] = value
+        self.finger = False
+        self.in_reset = False
+        self.boot_until = self.clock.now + BOOT
+        self.idle_since = self.clock.now
+        self._update_power()
+
+    def _on_rst(self, level):
+        if not level:
+            self.in_reset = True
+        elif self.in_reset:
+            self._reset()
+
+    # Power and scan timing
+
+    def asleep(self):
+        """True while the chip scans in low power and ignores the bus"""
+        return (not self.finger and not self.regs[DIS_AUTO_SLEEP]
+                and self.clock.now - self.idle_since >= self.regs[AUTO_SLEEP_TIME])
+
+    def scan_period(self):
+        if self.asleep():
+            return max(self.regs[LP_SCAN_FREQ], 1) * 0.01
+        return max(self.regs[NOR_SCAN_PER], 1) * 0.01
+
+    def current_ma(self):
+        if self.asleep():
+            return 0.02 + 0.35 * (self.regs[LP_SCAN_WIN] + 1) / max(self.regs[LP_SCAN_FREQ], 1)
+        return 0.2 + 1.3 / max(self.regs[NOR_SCAN_PER], 1)
+
+    def _update_power(self):
+        self.meter.set(touch_ma=self.current_ma())
+        if not self.regs[DIS_AUTO_SLEEP] and not self.finger:
+            # Re-evaluate when the auto-sleep timer runs out
+            self.clock.at(self.idle_since + self.regs[AUTO_SLEEP_TIME] + 1e-6,
+                          lambda: self.meter.set(touch_ma=self.current_ma()))
+
+    # Bus side
+
+    def _check_bus(self):
+        if self.in_reset or self.clock.now < self.boot_until or self.asleep():
+            raise OSError(ENODEV)
+
+    def write(self, reg, data):
+        self._check_bus()
+        for i, value in enumerate(data):
+            self.regs[(reg + i) & 0xFF] = value
+        self.idle_since = self.clock.now
+        self._update_power()
+
+    def read(self, reg, n):
+        self._check_bus()
+        return bytes(self.regs[(reg + i) & 0xFF] for i in range(n))
+
+    # Touch side
+
+    def _pulse(self):
+        """Pulse the IRQ line; True if that woke the CPU"""
+        from machine import Pin
+        self.irq_log.append(self.clock.now)
+        pin = Pin.irqs.get(self.irq) if isinstance(self.irq, int) else self.irq
+        return bool(pin and pin.pulse(0))
+
+    def _set_point(self, x, y, flag):
+        self.regs[XPOS_H] = (flag << 6) | ((x >> 8) & 0x0F)
+        self.regs[XPOS_L] = x & 0xFF
+        self.regs[YPOS_H] = (y >> 8) & 0x0F
+        self.regs[YPOS_L] = y & 0xFF
+
+    def play(self, trace, start=None):
+        """Schedule a trace's events, offset from `start` (default now)"""
+        start = self.clock.now if start is None else start
+        for offset, event, x, y in trace:
+            self.clock.at(start + offset, lambda e=event, x=x, y=y: self._event(e, x, y))
+
+    def _event(self, event, x, y):
+        # The chip notices a change at its next scan, at worst a period later
+        self.clock.at(self.clock.now + self.scan_period(), lambda: self._detect(event, x, y))
+
+    def _detect(self, event, x, y):
+        """Apply a touch event at a scan; True if its IRQ woke the CPU"""
+        ctl = self.regs[IRQ_CTL]
+        woke = False
+        if event == 'down':
+            self.finger = True
+            self.down_at = self.clock.now
+            self.origin = (x, y)
+            self.regs[GESTURE_ID] = 0
+            self.regs[FINGER_NUM] = 1
+            self._set_point(x, y, 0)
+            self._update_power()
+            if ctl & (EN_CHANGE | EN_TOUCH):
+                woke = self._pulse()
+            if ctl & EN_TOUCH:
+                self.clock.at(self.clock.now + self.scan_period(), self._repeat)
+            self.clock.at(self.down_at + self.regs[LONG_PRESS_TIME] * 0.01, self._long_press)
+        elif event == 'move' and self.finger:
+            self._set_point(x, y, 2)
+        elif event == 'up' and self.finger:
+            self.finger = False
+            self.idle_since = self.clock.now
+            self.regs[FINGER_NUM] = 0
+            self._set_point(x, y, 1)
+            gesture = self._gesture(x, y)
+            if gesture:
+                self.regs[GESTURE_ID] = gesture
+            self._update_power()
+            if ctl & EN_CHANGE or (ctl & EN_MOTION and gesture):
+                woke = self._pulse()
+        return woke
+
+    def _repeat(self):
+        if self.finger and self.regs[IRQ_CTL] & EN_TOUCH:
+            self.clock.at(self.clock.now + self.scan_period(), self._repeat)
+            return self._pulse()
+        return False
+
+    def _long_press(self):
+        if self.finger and self.clock.now - self.down_at >= self.regs[LONG_PRESS_TIME] * 0.01 - 1e-9:
+            self.regs[GESTURE_ID] = LONG_PRESS
+            if self.regs[IRQ_CTL] & EN_MOTION:
+                return self._pulse()
+        return False
+
+    def _gesture(self, x, y):
+        if self.regs[GESTURE_ID] == LONG_PRESS:
+            return 0
+        dx, dy = x - self.origin[0], y - self.origin[1]
+        if max(abs(dx), abs(dy)) < SWIPE:
+            return CLICK
+        if abs(dx) >= abs(dy):
+            return LEFT if dx < 0 else RIGHT
+        return UP if dy < 0 else DOWN
+
+
+class Bus:
+    """``machine.I2C`` with a simulated CST816 at 0x15 and traffic counters."""
+
+    def __init__(self, chip, freq=400000):
+        self.chip = chip
+        self.freq = freq
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.transactions = 0
+        self.bytes = 0
+        self.errors = 0
+        self.seconds = 0.0
+
+    def _count(self, nbytes):
+        # Every byte is 8 bits plus ACK; starts and stops are ignored
+        self.transactions += 1
+        self.bytes += nbytes
+        self.seconds += nbytes * 9 / self.freq
+
+    def _device(self, addr):
+        if addr != ADDR:
+            self.errors += 1
+            raise OSError(ENODEV)
+        return self.chip
+
+    def writeto(self, addr, buf, stop=True):
+        self._count(1 + len(buf))
+        try:
+            self._device(addr).write(buf[0], bytes(buf[1:]))
+        except OSError:
+            self.errors += 1
+            raise
+        return len(buf)
+
+    def writeto_mem(self, addr, memaddr, buf, addrsize=8):
+        self.writeto(addr, bytes([memaddr]) + bytes(buf))
+
+    def readfrom_mem_into(self, addr, memaddr, buf, addrsize=8):
+        self._count(3 + len(buf))
+        try:
+            buf[:] = self._device(addr).read(memaddr, len(buf))
+        except OSError:
+            self.errors += 1
+            raise
+
+    def readfrom_mem(self, addr, memaddr, n, addrsize=8):
+        buf = bytearray(n)
+        self.readfrom_mem_into(addr, memaddr, buf, addrsize)
+        return bytes(buf)
+
+
+def setup(clock, freq=400000):
+    """(chip, bus, driver, irq pin) with the driver reset and ready"""
+    import cst816
+    from machine import Pin
+    irq = Pin(5, Pin.IN, Pin.PULL_UP)
+    chip = Chip(clock, irq)
+    bus = Bus(chip, freq)
+    touch = cst816.CST816(bus, 13, wait=True)
+    return chip, bus, touch, irq
+
+
+def bench_reads(clock, rounds=100):
+    """(name, transactions, bytes, microseconds) per call of each driver read"""
+    chip, bus, touch, _ = setup(clock)
+    chip.play([(0.0, 'down', 120, 120)])
+    clock.advance(0.05)
+    rows = []
+    for name in ('get_touch', 'get_gesture', 'get_point', 'get_distance'):
+        bus.reset_counters()
+        for _ in range(rounds):
+            getattr(touch, name)()
+        rows.append((name, bus.transactions / rounds, bus.bytes / rounds,
+                     bus.seconds * 1000000 / rounds))
+    return rows
+
+
+def play_handle(clock, app, trace, mode):
+    """Play a trace through app.handle_touch; (outcome, latency ms, transactions, bytes)"""
+    import cst816
+    import gc9a01
+    import machine
+    chip, bus, touch, irq = setup(clock)
+    touch.set_mode(cst816.POINT_MODE if mode == 'point' else cst816.ALL_MODE)
+    app.touch = touch
+    app.temperature_unit = "C"
+    tft = gc9a01.GC9A01(machine.SPI(2), 240, 240)
+    result = []
+    start = clock.now + 0.5
+
+    def on_irq(pin):
+        if result:
+            return
+        unit = app.temperature_unit
+        before = bus.seconds
+        with contextlib.redirect_stdout(io.StringIO()):
+            step = app.handle_touch(tft)
+        outcome = {1: 'next', -1: 'prev'}.get(step)
+        if app.temperature_unit != unit:
+            outcome = 'toggle'
+        if outcome:
+            result.append((outcome, (clock.now + bus.seconds - before - start) * 1000))
+    irq.irq(on_irq, machine.Pin.IRQ_FALLING)
+    bus.reset_counters()
+    chip.play(trace, start)
+    clock.advance(trace[-1][0] + 1.5)
+    outcome, latency = result[0] if result else (None, 0.0)
+    return outcome, latency, bus.transactions, bus.bytes
+
+
+def profile_taps(clock, idle=10.0):
+    """(profile, asleep, touch mA while idle, tap-to-IRQ ms) for each scan profile"""
+    import cst816
+    rows = []
+    for profile, name in enumerate(cst816.PROFILE_NAMES):
+        chip, bus, touch, _ = setup(clock)
+        touch.set_mode(cst816.POINT_MODE)
+        touch.set_profile(profile)
+        clock.advance(idle)
+        asleep = chip.asleep()
+        current = chip.current_ma()
+        chip.irq_log.clear()
+        tap_at = clock.now
+        chip.play(TRACES['tap'])
+        clock.advance(1.0)
+        latency = (chip.irq_log[0] - tap_at) * 1000 if chip.irq_log else float('nan')
+        rows.append((name, asleep, current, latency))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--trace', action='append', default=[],
+                        help='recorded trace file to play as well (repeatable)')
+    parser.add_argument('--check', action='store_true',
+                        help='exit non-zero if an outcome differs from EXPECTED')
+    args = parser.parse_args()
+
+    clock = hostenv.install(hostenv.Clock(hostenv.DEFAULT_EPOCH + 12 * 3600))
+    import main as app
+
+    print("I2C traffic per driver call at 400 kHz:")
+    for name, transactions, nbytes, us in bench_reads(clock):
+        print("  %-13s %4.1f transactions %5.1f bytes %6.0f us" % (name, transactions, nbytes, us))
+
+    traces = dict(TRACES)
+    for path in args.trace:
+        traces[path] = load_trace(path)
+    failures = 0
+    print("handle_touch per trace:")
+    for mode in ('point', 'gesture'):
+        for name, trace in traces.items():
+            outcome, latency, transactions, nbytes = play_handle(clock, app, trace, mode)
+            expected = EXPECTED.get((name, mode), outcome)
+            mark = '' if outcome == expected else '  expected %s' % expected
+            failures += outcome != expected
+            print("  %-7s %-12s %-7s %6.1f ms %3d transactions %4d bytes%s"
+                  % (mode, name, outcome, latency, transactions, nbytes, mark))
+
+    print("Scan profiles after 10 s idle:")
+    for name, asleep, current, latency in profile_taps(clock):
+        print("  %-10s %-8s %5.2f mA  tap to IRQ %5.1f ms"
+              % (name, 'lp-scan' if asleep else 'scanning', current, latency))
+
+    if args.check and failures:
+        print("%d outcome(s) differ from EXPECTED" % failures)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Fault-injecting HTTP stand-in for the APIs the device calls.
+
+Serves ip-api, worldtimeapi and Open-Meteo look-alikes on localhost and
+breaks them on purpose: a share of requests answered with an error status,
+slow answers, connections dropped without a response, and outage windows on
+the virtual clock during which every request fails. ``main()`` runs the app
+against it for a virtual stretch of time, optionally with the Wi-Fi link
+dropping too, and reports how often the device called out during the outage,
+when the circuit breakers opened and closed and which age badges it showed::
+
+    python -m host.faulty_http --minutes 60 --outage 10:40 --wifi-drop 15:25
+    python -m host.faulty_http --fail-rate 0.2 --drop-rate 0.05 --delay 0.2
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from host import hostenv
+from host.bench_proxy import _open_meteo
+
+
+class FaultyUpstream:
+    """Canned geo, time and weather answers with injected faults.
+
+    Outage windows are (start, end) seconds after the clock's start; every
+    request in one is dropped. Outside them a request is dropped with
+    probability `drop_rate`, else fails with `status` with probability
+    `fail_rate`, else is answered after `delay` real seconds.
+    """
+
+    def __init__(self, clock, fail_rate=0.0, drop_rate=0.0, delay=0.0, status=503,
+                 outages=(), seed=1):
+        self.clock = clock
+        self.fail_rate = fail_rate
+        self.drop_rate = drop_rate
+        self.delay = delay
+        self.status = status
+        self.outages = list(outages)
+        self.random = random.Random(seed)
+        self.log = []  # (seconds since start, api, outcome)
+        self.sent = {}  # api -> response body bytes
+        self.generated = 0  # weather answers so far, for generationtime_ms
+        self._lock = threading.Lock()
+        self.server = None
+
+    def offset(self):
+        return self.clock.now - self.clock.start
+
+    def in_outage(self):
+        now = self.offset()
+        return any(start <= now < end for start, end in self.outages)
+
+    def outcome(self):
+        """'drop', 'fail' or 'ok' for the next request"""
+        with self._lock:
+            if self.in_outage() or self.random.random() < self.drop_rate:
+                return 'drop'
+            if self.random.random() < self.fail_rate:
+                return 'fail'
+            return 'ok'
+
+    def record(self, api, outcome):
+        with self._lock:
+            self.log.append((self.offset(), api, outcome))
+
+    def body(self, api, query):
+        if api == 'geo':
+            return {'lat': 51.5074, 'lon': -0.1278, 'city': 'London', 'timezone': 'Europe/London'}
+        if api == 'time':
+            stamp = hostenv._real['gmtime'](self.clock.now)
+            return {'datetime': '%04d-%02d-%02dT%02d:%02d:%02d.000000+00:00' % stamp[:6],
+                    'timezone': 'Europe/London', 'unixtime': int(self.clock.now)}
+        lats = query.get('latitude', ['51.5'])[0].split(',')
+        lons = query.get('longitude', ['-0.12'])[0].split(',')
+        results = [_open_meteo(float(lat), float(lon)) for lat, lon in zip(lats, lons)]
+        for result in results:
+            stamp_generation(self, result)
+        return results if len(results) > 1 else results[0]
+
+    def start(self):
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes; without this the
+            # body waits for the client's delayed ACK (~40 ms per request)
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                if parts.path.startswith('/json'):
+                    api = 'geo'
+                elif parts.path.startswith('/api/'):
+                    api = 'time'
+                else:
+                    api = 'weather'
+                outcome = upstream.outcome()
+                upstream.record(api, outcome)
+                if outcome == 'drop':
+                    self.close_connection = True
+                    return
+                if upstream.delay:
+                    hostenv._real['sleep'](upstream.delay)
+                if outcome == 'fail':
+                    status, data = upstream.status, b'{}'
+                else:
+                    status = 200
+                    data = json.dumps(upstream.body(api, parse_qs(parts.query))).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                with upstream._lock:
+                    upstream.sent[api] = upstream.sent.get(api, 0) + len(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server.server_port
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def stamp_generation(upstream, result):
+    """Set a fresh generationtime_ms, which Open-Meteo changes on every answer"""
+    with upstream._lock:
+        upstream.generated += 1
+        count = upstream.generated
+    result['generationtime_ms'] = round(0.02 + count % 97 * 0.003, 3)
+
+
+class StopRun(BaseException):
+    """Ends the scenario; not caught by the app's `except Exception`."""
+
+
+def _window(text):
+    start, _, end = text.partition(':')
+    return float(start) * 60, float(end) * 60
+
+
+def use_upstream(cfg, base):
+    """Point the app's API URLs at a stand-in upstream served at `base`"""
+    cfg.geolocation_url = base + '/json/'
+    cfg.world_time_url = base + '/api/timezone/{timezone}'
+    cfg.world_time_ip_url = base + '/api/ip'
+    cfg.weather_url = (base + '/v1/forecast?latitude={lat}&longitude={lon}'
+                       '&current_weather=true&hourly=temperature_2m,relativehumidity_2m')
+    cfg.proxy_url = ''
+    cfg.http_timeout = 2
+
+
+def run(minutes, outage=None, wifi_drop=None, fail_rate=0.0, drop_rate=0.0, delay=0.0,
+        status=503, verbose=False):
+    """Run main.main() against a FaultyUpstream; returns (upstream, events, badges)"""
+    # Midday, so the overnight display sleep does not pause refreshes
+    clock = hostenv.Clock(hostenv.DEFAULT_EPOCH + 12 * 3600)
+    hostenv.install(clock)
+    upstream = FaultyUpstream(clock, fail_rate, drop_rate, delay, status,
+                              [outage] if outage else ())
+    port = upstream.start()
+    base = 'http://127.0.0.1:%d' % port
+
+    import main
+    import metrics
+    import network
+
+    use_upstream(main.cfg, base)
+
+    events = []
+    record_event = metrics.event
+
+    def event(name, value=None):
+        if name != 'cpu_freq':  # the governor's clock changes are not network events
+            events.append((clock.now - clock.start, name, value))
+        record_event(name, value)
+    metrics.event = event
+
+    badges = []
+    display = main.display_weather_data
+
+    def spy(tft, weather, previous=None):
+        label = weather.get('age') if weather else None
+        if not badges or badges[-1][1] != label:
+            badges.append((clock.now - clock.start, label))
+        return display(tft, weather, previous)
+    main.display_weather_data = spy
+
+    if wifi_drop:
+        def drop():
+            network.WLAN.reachable = False
+            network.WLAN._connected = False
+            events.append((clock.now - clock.start, 'wifi_down', None))
+
+        def restore():
+            network.WLAN.reachable = True
+            events.append((clock.now - clock.start, 'wifi_up', None))
+        clock.at(clock.start + wifi_drop[0], drop)
+        clock.at(clock.start + wifi_drop[1], restore)
+
+    def stop():
+        raise StopRun
+    clock.at(clock.start + minutes * 60, stop)
+
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    try:
+        with output:
+            main.main()
+    except StopRun:
+        pass
+    finally:
+        upstream.stop()
+    return upstream, events, badges
+
+
+def _per_minute(log, minutes):
+    counts = [0] * minutes
+    for offset, _, _ in log:
+        index = int(offset // 60)
+        if index < minutes:
+            counts[index] += 1
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--minutes', type=int, default=60, help='virtual minutes to run')
+    parser.add_argument('--outage', type=_window, default=_window('10:40'),
+                        help='upstream outage window, START:END in minutes')
+    parser.add_argument('--wifi-drop', type=_window, help='Wi-Fi down window, START:END in minutes')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='share of requests failing')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='share of connections dropped')
+    parser.add_argument('--delay', type=float, default=0.0, help='real seconds before each answer')
+    parser.add_argument('--status', type=int, default=503, help='status of failed requests')
+    parser.add_argument('--verbose', action='store_true', help='show the app console')
+    args = parser.parse_args()
+
+    upstream, events, badges = run(args.minutes, args.outage, args.wifi_drop, args.fail_rate,
+                                   args.drop_rate, args.delay, args.status, args.verbose)
+
+    counts = _per_minute(upstream.log, args.minutes)
+    print("Requests per minute:", " ".join(str(n) for n in counts))
+    outcomes = {}
+    for _, api, outcome in upstream.log:
+        outcomes[api, outcome] = outcomes.get((api, outcome), 0) + 1
+    for (api, outcome), n in sorted(outcomes.items()):
+        print("  %-8s %-5s %d" % (api, outcome, n))
+    if args.outage:
+        start, end = int(args.outage[0] // 60), int(args.outage[1] // 60)
+        during = counts[start:end] or [0]
+        print("During the outage: %d requests over %d min, max %d/min"
+              % (sum(during), len(during), max(during)))
+    print("Events:")
+    for offset, name, value in events:
+        print("  %6.0fs %-14s %s" % (offset, name, '' if value is None else value))
+    print("Age badges:", ", ".join("%ds %s" % (offset, label or '-') for offset, label in badges))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Run the device modules under CPython.
+
+``install()`` puts the repository root and the MicroPython stand-ins in
+``host/sim`` on ``sys.path`` and adds the MicroPython-only helpers
+(``ticks_ms``, ``sleep_ms``, ...) to the CPython ``time`` module and
+``mem_free`` to ``gc``. Passing a
+``Clock`` swaps wall time for a virtual clock so long stretches of operation
+run in moments, and swaps ``_thread`` for the cooperative scheduler in
+``host/simthread.py`` so threads take turns on that clock. Each call also
+points ``kvstore`` at an empty log in a temporary directory, so a run
+neither depends on the last one nor writes ``kv.log`` where it was started.
+"""
+
+import _thread
+import gc
+import heapq
+import os
+import sys
+import tempfile
+import threading  # noqa: F401  (binds the real _thread before install() swaps it)
+import time
+
+HOST = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HOST)
+SIM = os.path.join(HOST, 'sim')
+
+# 2025-01-01T00:00:00Z, a synced-looking start time for virtual runs
+DEFAULT_EPOCH = 1735689600
+
+# What gc.mem_free() reports: the heap left on an ESP32-S3 with 2 MB of PSRAM
+HEAP_FREE = 1800000
+
+
+class Clock:
+    """Virtual clock; sleeping advances it and fires scheduled callbacks."""
+
+    def __init__(self, start=DEFAULT_EPOCH):
+        self.start = start
+        self.now = float(start)
+        self._queue = []
+        self._seq = 0
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now - self.start
+
+    def at(self, when, callback):
+        """Run callback() once the clock reaches `when` (epoch seconds)"""
+        self._seq += 1
+        heapq.heappush(self._queue, (when, self._seq, callback))
+
+    def after(self, delay, callback):
+        self.at(self.now + delay, callback)
+
+    def advance(self, seconds, interruptible=False):
+        """Move time forward, firing due callbacks in order.
+
+        With `interruptible` the advance stops right after the first callback
+        that returns True, which is how stand-in wake sources end a sleep early.
+        Returns the number of seconds actually advanced.
+        """
+        target = self.now + max(seconds, 0)
+        begin = self.now
+        while self._queue and self._queue[0][0] <= target:
+            when, _, callback = heapq.heappop(self._queue)
+            self.now = max(self.now, when)
+            if callback() and interruptible:
+                return self.now - begin
+        self.now = target
+        return self.now - begin
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+
+class _WallClock:
+    """Real time, used when install() is called without a virtual clock."""
+
+    def time(self):
+        return time.time()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def advance(self, seconds, interruptible=False):
+        time.sleep(max(seconds, 0))
+        return seconds
+
+    def sleep(self, seconds):
+        time.sleep(max(seconds, 0))
+
+
+clock = _WallClock()
+_real = {}
+_kvdir = None  # temporary home of the kvstore log
+
+
+def install(virtual=None):
+    """Make the device modules importable and runnable under CPython"""
+    global clock
+    for path in (SIM, ROOT):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+    if not _real:
+        _real.update(time=time.time, sleep=time.sleep, localtime=time.localtime,
+                     gmtime=time.gmtime)
+    clock = virtual or _WallClock()
+    if virtual:
+        from host import simthread
+        scheduler = simthread.Scheduler(virtual)
+        virtual.sleep = scheduler.sleep
+        sys.modules['_thread'] = scheduler
+    else:
+        sys.modules['_thread'] = _thread
+
+    time.ticks_ms = lambda: int(clock.monotonic() * 1000) & 0x3FFFFFFF
+    time.ticks_us = lambda: int(clock.monotonic() * 1000000) & 0x3FFFFFFF
+    time.ticks_add = lambda ticks, delta: (ticks + delta) & 0x3FFFFFFF
+    time.ticks_diff = _ticks_diff
+    time.sleep_ms = lambda ms: clock.sleep(ms / 1000)
+    time.sleep_us = lambda us: clock.sleep(us / 1000000)
+    gc.mem_free = lambda: HEAP_FREE
+
+    global _kvdir
+    import kvstore
+    _kvdir = tempfile.TemporaryDirectory(prefix='kvstore-')  # removed at exit
+    kvstore.STORE_FILE = os.path.join(_kvdir.name, 'kv.log')
+    kvstore._store = None
+
+    if virtual:
+        time.time = virtual.time
+        time.sleep = virtual.sleep
+        time.localtime = lambda secs=None: _real['localtime'](virtual.now if secs is None else secs)
+        time.gmtime = lambda secs=None: _real['gmtime'](virtual.now if secs is None else secs)
+    else:
+        time.time = _real['time']
+        time.sleep = _real['sleep']
+        time.localtime = _real['localtime']
+        time.gmtime = _real['gmtime']
+    return clock
+
+
+def _ticks_diff(end, start):
+    diff = (end - start) & 0x3FFFFFFF
+    return diff - 0x40000000 if diff & 0x20000000 else diff
@@ -0,0 +1,94 @@
+"""
+Estimate average current draw of the power manager over a simulated day.
+
+Runs ``power.PowerManager`` against the stand-ins in ``host/sim`` on a
+virtual clock, with a handful of touches spread over the day, and compares
+the metered average current with an always-on baseline. It also compares
+the charge drawn per refresh cycle at a fixed CPU clock with the ``governor``
+(idle clock while waiting, burst clock while parsing and drawing)::
+
+    python -m host.power_report
+"""
+
+from host import hostenv
+
+DAY = 24 * 3600
+REFRESH = 60
+# Seconds after midnight at which someone taps the screen
+TOUCHES = (2 * 3600, 7.5 * 3600, 8 * 3600, 12.25 * 3600, 18 * 3600, 18.1 * 3600, 22 * 3600)
+
+# One refresh cycle: waiting on the socket (independent of the clock), then
+# parsing and drawing, assumed to take 120 ms at the default 160 MHz
+NETWORK_WAIT = 0.4
+BURST_CYCLES = 160000000 * 0.12
+FIXED_FREQ = 160000000
+
+
+def simulate(managed):
+    clock = hostenv.Clock()
+    hostenv.install(clock)
+    import machine
+    import gc9a01
+    import power
+    from machine import Pin, SPI
+
+    machine.meter.reset()
+    tft = gc9a01.GC9A01(SPI(2), 240, 240)
+    irq = Pin(5, Pin.IN, Pin.PULL_UP)
+    pm = power.PowerManager(tft, Pin(2, Pin.OUT), irq,
+                            dim_after=30 if managed else DAY * 2,
+                            night=(23, 7) if managed else (0, 0))
+    for offset in TOUCHES:
+        clock.at(clock.start + offset, irq.pulse)
+
+    end = clock.start + DAY
+    while clock.now < end:
+        if pm.poll_touch():
+            pm.activity()
+        pm.update()
+        deadline = clock.now + REFRESH
+        if pm.state == power.ACTIVE:
+            deadline = min(deadline, pm.last_activity + pm.dim_after)
+        pm.wait(int(max(deadline - clock.now, 0.1) * 1000))
+    return machine.meter.average_ma(), pm.report()
+
+
+def refresh_cost(governed, cycles=20):
+    """(mA*s per refresh cycle, burst ms) at a fixed clock or governed"""
+    clock = hostenv.Clock()
+    hostenv.install(clock)
+    import machine
+    import governor
+
+    machine.freq(FIXED_FREQ)
+    machine.meter.reset()
+    if governed:
+        governor.start()
+    for _ in range(cycles):
+        clock.advance(NETWORK_WAIT)
+        with governor.burst():
+            burst_s = BURST_CYCLES / machine.freq()
+            clock.advance(burst_s)
+        clock.advance(REFRESH - NETWORK_WAIT - burst_s)
+    governor.stop(FIXED_FREQ)
+    machine.meter.settle()
+    return machine.meter.charge / cycles, burst_s * 1000
+
+
+def main():
+    baseline, _ = simulate(managed=False)
+    managed, residency = simulate(managed=True)
+    print("Always on:      %6.2f mA" % baseline)
+    print("Power managed:  %6.2f mA (%.0f%% lower)" % (managed, 100 * (1 - managed / baseline)))
+    for state, ms in residency.items():
+        print("  %-7s %5.1f h" % (state, ms / 3600000))
+    fixed, fixed_ms = refresh_cost(governed=False)
+    governed, governed_ms = refresh_cost(governed=True)
+    print("Per %d s refresh at %d MHz: %6.0f mA*s, parse+draw %3.0f ms"
+          % (REFRESH, FIXED_FREQ // 1000000, fixed, fixed_ms))
+    print("Per %d s refresh governed:  %6.0f mA*s, parse+draw %3.0f ms (%.0f%% less charge)"
+          % (REFRESH, governed, governed_ms, 100 * (1 - governed / fixed)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+Local aggregation proxy for a fleet of weather displays.
+
+Every display polling ip-api, worldtimeapi and Open-Meteo on its own
+multiplies upstream traffic by the number of devices. This asyncio service
+fetches once per location per TTL, coalesces concurrent misses into a single
+upstream request and serves the devices a small pre-digested payload (the
+``model.digest`` fields plus the time), so upstream requests scale with
+locations instead of devices::
+
+    python -m host.proxy --port 8080 --ttl 300
+
+Set ``proxy_url = http://<host>:8080`` in the device ``config.txt`` to use it.
+
+Endpoints:
+
+``GET /v1/weather[?lat=..&lon=..&city=..]``
+    Current conditions, humidity, hourly chart series and time for the given
+    location, or for the proxy's own IP geolocation when no coordinates are
+    given (all displays in a building share the same public IP anyway).
+``GET /v1/weather.bin[?...]``
+    The same payload as a ``wire`` record, which is what the displays fetch.
+``GET /v1/stats``
+    Request counters.
+
+Weather responses carry an ``ETag`` computed from the digest (not the clock),
+so a display polling with ``If-None-Match`` gets a bodiless ``304 Not
+Modified`` until the upstream data actually changes.
+"""
+
+import argparse
+import asyncio
+import json
+import ssl
+import time
+import zlib
+from urllib.parse import urlsplit, parse_qs
+
+from host import hostenv
+
+hostenv.install()
+import model  # noqa: E402  (needs the repository root on sys.path)
+import wire  # noqa: E402
+
+GEOLOCATION_URL = "http://ip-api.com/json/"
+WEATHER_URL = ("http://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}"
+               "&current_weather=true&hourly=temperature_2m,relativehumidity_2m"
+               "&forecast_days=2&timezone=auto")
+
+REASONS = {200: 'OK', 304: 'Not Modified', 404: 'Not Found', 502: 'Bad Gateway'}
+
+
+async def http_get(url, timeout=10):
+    """Minimal asyncio HTTP GET returning (status, body bytes)"""
+    parts = urlsplit(url)
+    tls = parts.scheme == 'https'
+    port = parts.port or (443 if tls else 80)
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(parts.hostname, port, ssl=ssl.create_default_context() if tls else None),
+        timeout)
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {parts.hostname}\r\n"
+                     f"Connection: close\r\nAccept-Encoding: identity\r\n\r\n".encode())
+        raw = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    head, _, body = raw.partition(b'\r\n\r\n')
+    lines = head.split(b'\r\n')
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(b':')
+        headers[name.strip().lower()] = value.strip().lower()
+    if headers.get(b'transfer-encoding') == b'chunked':
+        body = _dechunk(body)
+    return status, body
+
+
+def _dechunk(data):
+    out = bytearray()
+    pos = 0
+    while True:
+        end = data.index(b'\r\n', pos)
+        size = int(data[pos:end].split(b';')[0], 16)
+        if size == 0:
+            return bytes(out)
+        out += data[end + 2:end + 2 + size]
+        pos = end + 4 + size
+
+
+class TTLCache:
+    """TTL cache with single-flight fetching of missing keys."""
+
+    def __init__(self):
+        self.entries = {}  # key -> (expires, value)
+        self.inflight = {}  # key -> Future
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key, ttl, fetch):
+        entry = self.entries.get(key)
+        now = time.monotonic()
+        if entry and now < entry[0]:
+            self.hits += 1
+            return entry[1]
+        pending = self.inflight.get(key)
+        if pending:
+            # Someone is already fetching this key; share their result
+            self.hits += 1
+            return await asyncio.shield(pending)
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        try:
+            value = await fetch()
+            self.entries[key] = (time.monotonic() + ttl, value)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception retrieved when nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            del self.inflight[key]
+
+
+class WeatherProxy:
+    """Fetches upstream once per location per TTL and serves digests."""
+
+    def __init__(self, ttl=300, geo_ttl=3600, weather_url=WEATHER_URL,
+                 geo_url=GEOLOCATION_URL):
+        self.ttl = ttl
+        self.geo_ttl = geo_ttl
+        self.weather_url = weather_url
+        self.geo_url = geo_url
+        self.cache = TTLCache()
+        self.upstream = 0
+        self.requests = 0
+        self.not_modified = 0
+
+    async def _fetch_json(self, url):
+        self.upstream += 1
+        status, body = await http_get(url)
+        if status != 200:
+            raise OSError(f"upstream {status} for {url}")
+        return json.loads(body)
+
+    async def geolocation(self):
+        return await self.cache.get('geo', self.geo_ttl, lambda: self._fetch_json(self.geo_url))
+
+    async def weather(self, lat, lon, city=None):
+        """Digest for a location; cached per location rounded to ~1 km"""
+        if lat is None or lon is None:
+            geo = await self.geolocation()
+            lat, lon, city = geo['lat'], geo['lon'], city or geo.get('city')
+        lat = round(float(lat), 2)
+        lon = round(float(lon), 2)
+
+        async def fetch():
+            data = await self._fetch_json(self.weather_url.format(lat=lat, lon=lon))
+            digest = model.digest(data, {'city': city or 'Unknown'})
+            digest.update(lat=lat, lon=lon, timezone=data.get('timezone', 'GMT'),
+                          utc_offset=data.get('utc_offset_seconds', 0))
+            return digest
+
+        return await self.cache.get(('wx', lat, lon), self.ttl, fetch)
+
+    async def payload(self, query):
+        digest = await self.weather(query.get('lat'), query.get('lon'), query.get('city'))
+        # The time is added per request so cached entries never serve a stale clock
+        return dict(digest, epoch=int(time.time()))
+
+    @staticmethod
+    def etag(path, payload):
+        """Validator over the weather fields only, so the clock does not change it"""
+        fields = {k: v for k, v in payload.items() if k != 'epoch'}
+        data = path.encode() + json.dumps(fields, sort_keys=True).encode()
+        return '"%08x"' % zlib.crc32(data)
+
+    def stats(self):
+        return {
+            'device_requests': self.requests,
+            'upstream_requests': self.upstream,
+            'not_modified': self.not_modified,
+            'cache_hits': self.cache.hits,
+            'cache_misses': self.cache.misses,
+            'locations': sum(1 for key in self.cache.entries if key != 'geo'),
+        }
+
+    async def respond(self, path, query, headers=None):
+        """Return (status, content type, body, etag) for one request"""
+        if path in ('/v1/weather', '/v1/weather.bin'):
+            payload = await self.payload(query)
+            etag = self.etag(path, payload)
+            if headers and headers.get('if-none-match') == etag:
+                self.not_modified += 1
+                return 304, None, b'', etag
+            if path == '/v1/weather':
+                return 200, 'application/json', json.dumps(payload, separators=(',', ':')).encode(), etag
+            return (200, 'application/octet-stream',
+                    wire.encode(payload, payload['epoch'], payload['utc_offset']), etag)
+        if path == '/v1/stats':
+            return 200, 'application/json', json.dumps(self.stats()).encode(), None
+        return 404, 'text/plain', b'not found', None
+
+    async def handle(self, reader, writer):
+        """Serve keep-alive HTTP/1.1 requests on one device connection"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    _, target, _ = request_line.decode('latin-1').split(' ', 2)
+                except ValueError:
+                    break
+                url = urlsplit(target)
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                self.requests += 1
+                try:
+                    status, ctype, body, etag = await self.respond(url.path, query, headers)
+                except Exception as e:
+                    status, ctype, body, etag = 502, 'text/plain', str(e).encode(), None
+                close = headers.get('connection', '').lower() == 'close'
+                head = f"HTTP/1.1 {status} {REASONS.get(status, 'Error')}\r\n"
+                if ctype:
+                    head += f"Content-Type: {ctype}\r\n"
+                if etag:
+                    head += f"ETag: {etag}\r\n"
+                if status != 304:
+                    head += f"Content-Length: {len(body)}\r\n"
+                head += f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n"
+                writer.write(head.encode() + body)
+                await writer.drain()
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='0.0.0.0', port=8080):
+        return await asyncio.start_server(self.handle, host, port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--ttl', type=int, default=300, help='weather cache TTL in seconds')
+    parser.add_argument('--geo-ttl', type=int, default=3600, help='geolocation cache TTL in seconds')
+    args = parser.parse_args()
+
+    async def run():
+        proxy = WeatherProxy(ttl=args.ttl, geo_ttl=args.geo_ttl)
+        server = await proxy.serve(args.host, args.port)
+        print(f"Weather proxy listening on {args.host}:{args.port}")
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""
+Replay a day of operation on the virtual clock in seconds.
+
+Runs ``main.main()`` on a virtual clock from midnight. The app's threads take
+turns on the ``host/simthread.py`` scheduler, so a run is repeatable. The API
+answers come from a cassette of recorded responses. Touch traces are played
+through the simulated CST816 in ``host/cst816_sim.py``, so refresh cadence,
+backoff, dimming, overnight sleep and the expiry of the unit message all run
+as they would on the board. At the end it reports:
+
+* requests and response bytes per API;
+* renders and display driver calls, and the SPI bytes they cost;
+* touches handled and power state changes;
+* ``gc.collect`` calls, and the peak Python heap of the run.
+
+The metrics exporter runs without a socket; ``--metrics`` writes what its
+``/metrics`` page would have shown at the end of the run.
+
+``gc.collect`` is counted rather than run, since a full CPython collection
+on every loop pass would dominate the run. The heap peak is measured with
+``tracemalloc`` and includes the local stand-in server.
+
+A cassette is a JSON object mapping ``geo`` and ``weather`` to lists of
+recorded response bodies. They are served in order and wrap around. Weather
+entries may be single forecasts or lists for multi-location requests. Time
+answers are always generated from the virtual clock, since a recorded one
+would set the RTC to the recording's time. Weather answers get a fresh
+``generationtime_ms`` each time, as Open-Meteo's do, so an unchanged forecast
+is never an identical body. Without a cassette, synthetic
+answers are served; ``--save-cassette`` writes them out as a starting point.
+Oslo's synthetic forecast stays between 20.1 and 20.2 degrees all day, a
+range the sparkline has to scale without leaving its tile::
+
+    python -m host.replay
+    python -m host.replay --cassette day.json --places 3 --touches touches.txt
+
+``--check`` exits non-zero if any error was logged or any weather refresh
+failed, which with ``--places 5`` or more covers multi-location requests that
+have to be split to fit the receive buffer::
+
+    python -m host.replay --coarse --places 6 --check
+
+A touches file holds one ``hours trace`` line per touch. The trace is a name
+from ``cst816_sim.TRACES`` or a recorded trace file.
+
+Most of a replay's run time goes to the polling slices of the UI wait and
+the worker's idle sleep, and a day takes about half a minute. ``--coarse``
+stretches both slices to a second, which makes the replay about four times
+faster; a touch is then handled up to a second late.
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import sys
+import time
+import tracemalloc
+
+from host import hostenv
+from host import cst816_sim
+from host.faulty_http import FaultyUpstream, stamp_generation, use_upstream
+
+DAY_HOURS = 24
+
+# (hours after midnight, trace) of the default day
+TOUCHES = (
+    (2, 'tap'), (7.5, 'tap'), (8, 'swipe_left'), (12.25, 'tap'),
+    (18, 'swipe_right'), (18.1, 'tap'), (22, 'long_press'),
+)
+
+PLACES = (
+    ("London", 51.5, -0.12, "Europe/London"),
+    ("Paris", 48.85, 2.35, "Europe/Paris"),
+    ("Oslo", 59.9, 10.7, "Europe/Oslo"),
+    ("Madrid", 40.42, -3.7, "Europe/Madrid"),
+    ("Rome", 41.9, 12.5, "Europe/Rome"),
+    ("Vienna", 48.21, 16.37, "Europe/Vienna"),
+)
+
+
+# Latitude whose synthetic hourly temperatures are nearly flat
+FLAT_LAT = 59.9
+
+
+class StopReplay(BaseException):
+    """Ends the replay; not caught by the app's `except Exception`."""
+
+
+class ReplayUpstream(FaultyUpstream):
+    """Serves recorded geo and weather bodies in order; time from the clock."""
+
+    def __init__(self, clock, cassette=None):
+        super().__init__(clock)
+        self.cassette = cassette or {}
+        self._next = {}
+
+    def body(self, api, query):
+        recorded = self.cassette.get(api)
+        if api == 'time' or not recorded:
+            body = super().body(api, query)
+            if api == 'weather':
+                for result in body if isinstance(body, list) else [body]:
+                    if result['latitude'] == FLAT_LAT:
+                        result['hourly']['temperature_2m'] = [round(20.1 + h % 2 / 10, 1) for h in range(48)]
+            return body
+        with self._lock:
+            index = self._next.get(api, 0)
+            self._next[api] = index + 1
+        entry = recorded[index % len(recorded)]
+        if api != 'weather':
+            return entry
+        wanted = len(query.get('latitude', [''])[0].split(','))
+        if isinstance(entry, list):
+            entries = entry if len(entry) == wanted else [entry[0]] * wanted
+        else:
+            entries = [entry] * wanted
+        # Replayed as live answers would come, never byte for byte the same
+        entries = [dict(e) for e in entries]
+        for e in entries:
+            stamp_generation(self, e)
+        return entries if wanted > 1 else entries[0]
+
+
+def synthetic_cassette(clock):
+    upstream = FaultyUpstream(clock)
+    return {'geo': [upstream.body('geo', {})],
+            'weather': [upstream.body('weather', {})]}
+
+
+def load_touches(path):
+    touches = []
+    with open(path) as f:
+        for line in f:
+            parts = line.split('#')[0].split()
+            if parts:
+                touches.append((float(parts[0]), parts[1]))
+    return touches
+
+
+class _Tee(io.StringIO):
+    """Keeps the console for counting while also showing it."""
+
+    def write(self, text):
+        sys.__stdout__.write(text)
+        return super().write(text)
+
+
+def _trace(name):
+    return cst816_sim.TRACES.get(name) or cst816_sim.load_trace(name)
+
+
+COARSE_SLICE_MS = 1000
+
+
+def run(hours=DAY_HOURS, cassette=None, touches=TOUCHES, places=0, verbose=False, coarse=False):
+    """Replay `hours` from midnight; returns a dict of the report figures"""
+    clock = hostenv.Clock(hostenv.DEFAULT_EPOCH)
+    hostenv.install(clock)
+    upstream = ReplayUpstream(clock, cassette)
+    base = 'http://127.0.0.1:%d' % upstream.start()
+
+    import exporter
+    import gc9a01
+    import main
+    import machine
+    import metrics
+    import power
+    import worker
+
+    slices = power._WAIT_SLICE_MS, worker._SLICE_MS
+    if coarse:
+        power._WAIT_SLICE_MS = worker._SLICE_MS = COARSE_SLICE_MS
+
+    machine.meter.reset()
+    refreshes = {name: metrics.counters.get('refresh_' + name, 0)
+                 for name in ('updated', 'unchanged', 'failed')}
+    use_upstream(main.cfg, base)
+    main.cfg.spi_autotune = False  # the stand-in panel has nothing to tune
+    main.cfg.metrics_port = 8080  # opted in; ReplayServer opens no socket
+    if places:
+        main.cfg.locations = list(PLACES[:places])
+
+    # Touch controller on a simulated bus; it pulses the app's IRQ pin
+    chip = cst816_sim.Chip(clock, main.cfg.touch_irq_pin, main.cfg.touch_rst)
+    main.I2C = lambda id, scl=None, sda=None, freq=400000: cst816_sim.Bus(chip, freq)
+    for hour, name in touches:
+        chip.play(_trace(name), clock.start + hour * 3600)
+
+    displays = []
+    driver = gc9a01.GC9A01
+
+    class CountedGC9A01(driver):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            displays.append(self)
+    gc9a01.GC9A01 = CountedGC9A01
+
+    servers = []
+    server_class = exporter.Server
+
+    class ReplayServer(server_class):
+        def start(self):
+            servers.append(self)  # no socket; the page is rendered directly
+    exporter.Server = ReplayServer
+
+    renders = {'full': 0, 'partial': 0}
+    display = main.display_weather_data
+
+    def spy(tft, weather, previous=None):
+        renders['partial' if previous else 'full'] += 1
+        return display(tft, weather, previous)
+    main.display_weather_data = spy
+
+    collects = [0]
+    collect = gc.collect
+
+    def count_collect(generation=2):
+        collects[0] += 1
+        return 0
+    gc.collect = count_collect
+
+    def stop():
+        raise StopReplay
+    clock.at(clock.start + hours * 3600, stop)
+
+    console = _Tee() if verbose else io.StringIO()
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(console):
+            main.main()
+    except StopReplay:
+        pass
+    finally:
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        gc.collect = collect
+        gc9a01.GC9A01 = driver
+        exporter.Server = server_class
+        power._WAIT_SLICE_MS, worker._SLICE_MS = slices
+        upstream.stop()
+
+    calls = {}
+    for tft in displays:
+        for name, n in tft.calls.items():
+            calls[name] = calls.get(name, 0) + n
+    lines = console.getvalue().splitlines()
+    requests = {}
+    for _, api, _ in upstream.log:
+        requests[api] = requests.get(api, 0) + 1
+    return {
+        'hours': hours, 'seconds': elapsed,
+        'requests': requests, 'bytes': dict(upstream.sent),
+        'renders': renders, 'calls': calls,
+        'spi_bytes': sum(tft.spi_bytes for tft in displays),
+        'refreshes': {name: metrics.counters.get('refresh_' + name, 0) - n
+                      for name, n in refreshes.items()},
+        'touches': len(touches), 'irqs': len(chip.irq_log),
+        'unit_changes': sum(line.startswith("Changed unit") for line in lines),
+        'power_changes': sum(line.startswith("Power state") for line in lines),
+        'errors': sum(line.endswith(" error:") or " error: " in line for line in lines),
+        'collects': collects[0], 'peak_heap': peak,
+        'charge_mah': machine.meter.charge_mah(),
+        'metrics': servers[0].metrics_text() if servers else '',
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--hours', type=float, default=DAY_HOURS, help='virtual hours to replay')
+    parser.add_argument('--cassette', help='JSON file of recorded geo and weather responses')
+    parser.add_argument('--save-cassette', help='write the synthetic cassette here and exit')
+    parser.add_argument('--touches', help='file of "hours trace" lines (default: TOUCHES)')
+    parser.add_argument('--places', type=int, default=0, choices=range(len(PLACES) + 1),
+                        help='rotate through this many built-in locations')
+    parser.add_argument('--coarse', action='store_true',
+                        help='poll in 1 s slices: ~4x faster, touches handled up to 1 s late')
+    parser.add_argument('--check', action='store_true',
+                        help='exit non-zero on logged errors or failed refreshes')
+    parser.add_argument('--metrics', help='write the final /metrics page here')
+    parser.add_argument('--verbose', action='store_true', help='show the app console')
+    args = parser.parse_args()
+
+    if args.save_cassette:
+        with open(args.save_cassette, 'w') as f:
+            json.dump(synthetic_cassette(hostenv.Clock()), f, indent=1)
+        return
+    cassette = None
+    if args.cassette:
+        with open(args.cassette) as f:
+            cassette = json.load(f)
+    touches = load_touches(args.touches) if args.touches else TOUCHES
+
+    report = run(args.hours, cassette, touches, args.places, args.verbose, args.coarse)
+    print("Replayed %.1f h in %.1f s" % (report['hours'], report['seconds']))
+    print("Requests:")
+    for api in sorted(report['requests']):
+        print("  %-8s %5d  %8d bytes" % (api, report['requests'][api], report['bytes'].get(api, 0)))
+    refreshes = report['refreshes']
+    print("Refreshes: %d updated, %d unchanged, %d failed"
+          % (refreshes['updated'], refreshes['unchanged'], refreshes['failed']))
+    renders = report['renders']
+    print("Renders: %d full, %d partial; %d KB over SPI"
+          % (renders['full'], renders['partial'], report['spi_bytes'] // 1024))
+    for name in sorted(report['calls']):
+        print("  %-12s %6d" % (name, report['calls'][name]))
+    print("Touches: %d traces, %d IRQs, %d unit changes" % (report['touches'], report['irqs'],
+                                                          report['unit_changes']))
+    print("Power state changes: %d" % report['power_changes'])
+    print("Errors logged: %d" % report['errors'])
+    print("gc.collect calls: %d" % report['collects'])
+    print("Peak Python heap: %d KB" % (report['peak_heap'] // 1024))
+    print("Estimated charge: %.1f mAh" % report['charge_mah'])
+    if args.metrics:
+        with open(args.metrics, 'w') as f:
+            f.write(report['metrics'])
+    if args.check and (report['errors'] or refreshes['failed'] or not refreshes['updated']):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+"""Stand-in for the MicroPython ``esp32`` module."""
+
+import machine
+
+WAKEUP_ALL_LOW = False
+WAKEUP_ANY_HIGH = True
+
+
+def wake_on_ext0(pin, level=WAKEUP_ALL_LOW):
+    machine._wake_pins[:] = [pin] if pin is not None else []
+
+
+def wake_on_ext1(pins, level=WAKEUP_ALL_LOW):
+    pass
+
+
+def gpio_deep_sleep_hold(enable):
+    pass
@@ -0,0 +1,119 @@
+"""
+Stand-in for the ``gc9a01`` C display driver.
+
+Nothing is drawn; every call is counted together with the number of bytes the
+real driver would push over SPI, so renders can be compared on the host.
+
+With ``timed`` set, each call also advances the clock by the time the transfer
+would take at the bus clock, plus a per-chunk overhead for fills, which the
+real driver sends ``buffer_size`` bytes at a time. ``received_crc`` is the CRC
+of the last blit as the panel received it, which lets ``calibrate`` detect a
+bus clocked faster than ``machine.SPI.max_baud``.
+"""
+
+from binascii import crc32
+
+from host import hostenv
+import machine
+
+BLACK = 0x0000
+BLUE = 0x001F
+RED = 0xF800
+GREEN = 0x07E0
+CYAN = 0x07FF
+MAGENTA = 0xF81F
+YELLOW = 0xFFE0
+WHITE = 0xFFFF
+
+FAST = 0
+SLOW = 1
+
+# CASET + RASET + RAMWR command and parameter bytes for one window
+_WINDOW_BYTES = 11
+
+# Seconds to set up one SPI transaction and refill the driver's fill buffer
+_CHUNK_OVERHEAD = 0.000025
+
+
+def color565(red, green=0, blue=0):
+    if isinstance(red, (tuple, list)):
+        red, green, blue = red[:3]
+    return (red & 0xF8) << 8 | (green & 0xFC) << 3 | blue >> 3
+
+
+class GC9A01:
+    timed = False  # advance the clock by the modelled transfer time
+
+    def __init__(self, spi, width, height, reset=None, cs=None, dc=None,
+                 backlight=None, rotation=0, buffer_size=0):
+        self.spi = spi
+        self._width = width
+        self._height = height
+        self.buffer_size = buffer_size
+        self.calls = {}
+        self.spi_bytes = 0
+        self.sleeping = False
+        self.received_crc = None
+        if backlight is not None:
+            backlight.value(1)
+
+    def _count(self, name, pixels=0, windows=1, chunked=False):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        sent = pixels * 2 + windows * _WINDOW_BYTES
+        self.spi_bytes += sent
+        self.spi.bytes_written += sent
+        if self.timed:
+            chunks = windows
+            if chunked and self.buffer_size:
+                chunks += -(-pixels * 2 // self.buffer_size)
+            hostenv.clock.advance(sent * 8 / self.spi.baudrate + chunks * _CHUNK_OVERHEAD)
+
+    def init(self):
+        self._count('init', windows=0)
+        self.sleeping = False
+        machine.meter.set(panel_sleep=False)
+
+    def width(self):
+        return self._width
+
+    def height(self):
+        return self._height
+
+    def sleep_mode(self, value):
+        self._count('sleep_mode', windows=0)
+        self.sleeping = bool(value)
+        machine.meter.set(panel_sleep=self.sleeping)
+
+    def fill(self, color):
+        self._count('fill', self._width * self._height, chunked=True)
+
+    def fill_rect(self, x, y, w, h, color):
+        self._count('fill_rect', w * h, chunked=True)
+
+    def hline(self, x, y, length, color):
+        self._count('hline', length)
+
+    def vline(self, x, y, length, color):
+        self._count('vline', length)
+
+    def pixel(self, x, y, color):
+        self._count('pixel', 1)
+
+    def blit_buffer(self, buf, x, y, w, h):
+        if len(buf) < w * h * 2:
+            raise ValueError('buffer too small')
+        self._count('blit_buffer', w * h)
+        data = bytes(buf[:w * h * 2])
+        if self.spi.corrupts():
+            data = bytes([data[0] ^ 0x01]) + data[1:]
+        self.received_crc = crc32(data)
+
+    def text(self, font, string, x, y, fg=WHITE, bg=BLACK):
+        self._count('text', len(string) * font.WIDTH * font.HEIGHT, len(string))
+
+    def jpg(self, filename, x, y, method=FAST):
+        # The driver reads a file name only (mp_obj_str_get_str)
+        if not isinstance(filename, str):
+            raise TypeError("can't convert '%s' object to str implicitly" % type(filename).__name__)
+        open(filename, 'rb').close()
+        self._count('jpg', 75 * 75)
@@ -0,0 +1,311 @@
+"""
+Stand-in for the MicroPython ``machine`` module.
+
+Besides the peripheral classes the app touches, this module keeps a
+``meter`` that integrates an estimated supply current from what the
+peripherals are doing (CPU clock and sleep mode, backlight PWM duty, panel
+sleep, touch controller mode). The figures are rough datasheet estimates for
+the ESP32-S3-Touch-LCD-1.28; they are meant for comparing configurations, not
+for predicting battery life to the minute.
+"""
+
+from host import hostenv
+
+PWRON_RESET = 1
+HARD_RESET = 2
+WDT_RESET = 3
+DEEPSLEEP_RESET = 4
+SOFT_RESET = 5
+
+PIN_WAKE = 2
+EXT0_WAKE = 2
+EXT1_WAKE = 3
+TIMER_WAKE = 4
+TOUCHPAD_WAKE = 5
+ULP_WAKE = 6
+
+SLEEP = 2
+DEEPSLEEP = 4
+
+
+class _Meter:
+    """Integrates estimated current over (virtual) time."""
+
+    BACKLIGHT_PIN = 2
+    CPU_SLEEP_MA = {'light': 1.2, 'deep': 0.02}
+    BACKLIGHT_MA = 20.0
+    PANEL_MA = 4.0
+    PANEL_SLEEP_MA = 0.05
+    TOUCH_MA = 1.5
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.cpu = 'run'
+        self.freq = 160000000
+        self.backlight = 1.0
+        self.panel_sleep = False
+        self.touch_ma = self.TOUCH_MA
+        self.charge = 0.0  # mA*s
+        self.elapsed = 0.0
+        self.residency = {}
+        self._last = hostenv.clock.monotonic()
+
+    def current_ma(self):
+        if self.cpu == 'run':
+            cpu = 12 + 0.12 * self.freq / 1000000
+        else:
+            cpu = self.CPU_SLEEP_MA[self.cpu]
+        panel = self.PANEL_SLEEP_MA if self.panel_sleep else self.PANEL_MA
+        return cpu + panel + self.BACKLIGHT_MA * self.backlight + self.touch_ma
+
+    def settle(self):
+        """Account for the time spent in the current state"""
+        now = hostenv.clock.monotonic()
+        dt = now - self._last
+        if dt > 0:
+            self.charge += self.current_ma() * dt
+            self.elapsed += dt
+            self.residency[self.cpu] = self.residency.get(self.cpu, 0) + dt
+        self._last = now
+
+    def set(self, **state):
+        self.settle()
+        for key, value in state.items():
+            setattr(self, key, value)
+
+    def average_ma(self):
+        self.settle()
+        return self.charge / self.elapsed if self.elapsed else self.current_ma()
+
+    def charge_mah(self):
+        self.settle()
+        return self.charge / 3600
+
+
+meter = _Meter()
+
+_freq = 160000000
+_reset_cause = PWRON_RESET
+_wake_reason = 0
+_wake_pins = []
+
+
+class Pin:
+    IN = 1
+    OUT = 3
+    OPEN_DRAIN = 7
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 2
+    IRQ_RISING = 1
+    WAKE_LOW = 4
+    WAKE_HIGH = 5
+
+    # Stand-in devices watching a pin the app drives: pin id -> callback(level)
+    listeners = {}
+    # Pins the app handles IRQs on, for stand-in devices that raise them: id -> Pin
+    irqs = {}
+
+    def __init__(self, id, mode=-1, pull=-1, value=None, hold=False):
+        self.id = id
+        self.mode = mode
+        self._value = 1 if pull == Pin.PULL_UP else 0
+        if value is not None:
+            self._value = value
+        self._handler = None
+        self._trigger = 0
+
+    def init(self, mode=-1, pull=-1, value=None, hold=False):
+        if value is not None:
+            self._value = value
+
+    def value(self, value=None):
+        if value is None:
+            return self._value
+        self._value = value
+        listener = Pin.listeners.get(self.id)
+        if listener:
+            listener(value)
+
+    def __call__(self, value=None):
+        return self.value(value)
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, wake=None):
+        self._handler = handler
+        self._trigger = trigger
+        Pin.irqs[self.id] = self
+
+    def drive(self, level):
+        """Simulate an external signal on the pin; returns True if it wakes the CPU"""
+        global _wake_reason
+        old = self._value
+        self._value = level
+        edge = Pin.IRQ_FALLING if old and not level else Pin.IRQ_RISING if level and not old else 0
+        if self._handler and edge & self._trigger:
+            self._handler(self)
+        if self in _wake_pins and not level and meter.cpu != 'run':
+            _wake_reason = EXT0_WAKE
+            return True
+        return False
+
+    def pulse(self, level=0):
+        """Drive the pin to `level` and straight back, like a touch IRQ pulse"""
+        woke = self.drive(level)
+        self.drive(1 - level)
+        return woke
+
+
+class PWM:
+    def __init__(self, pin, freq=5000, duty_u16=None, duty=None):
+        self.pin = pin
+        self._freq = freq
+        self._duty = 0
+        if duty_u16 is not None:
+            self.duty_u16(duty_u16)
+
+    def freq(self, value=None):
+        if value is None:
+            return self._freq
+        self._freq = value
+
+    def duty_u16(self, value=None):
+        if value is None:
+            return self._duty
+        self._duty = value
+        if self.pin.id == meter.BACKLIGHT_PIN:
+            meter.set(backlight=value / 65535)
+
+    def deinit(self):
+        if self.pin.id == meter.BACKLIGHT_PIN:
+            meter.set(backlight=0.0)
+
+
+class SPI:
+    # Fastest clock the simulated wiring carries cleanly; faster transfers
+    # arrive corrupted (see gc9a01.GC9A01.received_crc)
+    max_baud = 80000000
+
+    def __init__(self, id, baudrate=1000000, polarity=0, phase=0, sck=None, mosi=None, miso=None):
+        self.id = id
+        self.baudrate = baudrate
+        self.bytes_written = 0
+
+    def init(self, baudrate=None, **kwargs):
+        if baudrate:
+            self.baudrate = baudrate
+
+    def write(self, buf):
+        self.bytes_written += len(buf)
+
+    def corrupts(self):
+        return self.baudrate > self.max_baud
+
+    def deinit(self):
+        pass
+
+
+class I2C:
+    """Bus with no devices attached; reads return zeros."""
+
+    def __init__(self, id, scl=None, sda=None, freq=400000):
+        self.id = id
+        self.freq = freq
+
+    def writeto(self, addr, buf, stop=True):
+        return len(buf)
+
+    def readfrom_mem_into(self, addr, memaddr, buf, addrsize=8):
+        for i in range(len(buf)):
+            buf[i] = 0
+
+    def readfrom_into(self, addr, buf, stop=True):
+        for i in range(len(buf)):
+            buf[i] = 0
+
+
+class RTC:
+    _memory = b''
+    _offset = 0
+
+    def datetime(self, dt=None):
+        import time
+        if dt is None:
+            t = time.gmtime(time.time() + RTC._offset)
+            return (t[0], t[1], t[2], t[6], t[3], t[4], t[5], 0)
+        import calendar
+        year, month, day, _, hour, minute, second, _ = dt
+        target = calendar.timegm((year, month, day, hour, minute, second, 0, 0, 0))
+        RTC._offset = target - time.time()
+
+    def memory(self, data=None):
+        if data is None:
+            return RTC._memory
+        if len(data) > 2048:
+            raise ValueError('buffer too long')
+        RTC._memory = bytes(data)
+
+
+class WDT:
+    def __init__(self, id=0, timeout=5000):
+        self.timeout = timeout
+
+    def feed(self):
+        pass
+
+
+class DeepSleep(BaseException):
+    """Raised by deepsleep() so a host run can restart the app like a reset."""
+
+    def __init__(self, ms):
+        super().__init__(ms)
+        self.ms = ms
+
+
+def freq(hz=None):
+    global _freq
+    if hz is None:
+        return _freq
+    _freq = hz
+    meter.set(freq=hz)
+
+
+def idle():
+    hostenv.clock.sleep(0.001)
+
+
+def lightsleep(ms=None):
+    global _wake_reason
+    _wake_reason = TIMER_WAKE
+    meter.set(cpu='light')
+    hostenv.clock.advance((ms if ms is not None else 86400000) / 1000, interruptible=True)
+    meter.set(cpu='run')
+
+
+def deepsleep(ms=None):
+    global _reset_cause, _wake_reason
+    _reset_cause = DEEPSLEEP_RESET
+    _wake_reason = TIMER_WAKE
+    meter.set(cpu='deep')
+    hostenv.clock.advance((ms if ms is not None else 86400000) / 1000, interruptible=True)
+    meter.set(cpu='run')
+    raise DeepSleep(ms)
+
+
+def reset_cause():
+    return _reset_cause
+
+
+def wake_reason():
+    return _wake_reason
+
+
+def unique_id():
+    return b'\x00\x00\x00\x00\x00\x01'
@@ -0,0 +1,25 @@
+"""Stand-in for the MicroPython ``micropython`` module."""
+
+
+def const(value):
+    return value
+
+
+def native(func):
+    return func
+
+
+def viper(func):
+    return func
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def mem_info(verbose=False):
+    pass
+
+
+def schedule(func, arg):
+    func(arg)
@@ -0,0 +1,49 @@
+"""Stand-in for the MicroPython ``network`` module; association is instant."""
+
+STA_IF = 0
+AP_IF = 1
+
+STAT_IDLE = 1000
+STAT_CONNECTING = 1001
+STAT_GOT_IP = 1010
+
+
+class WLAN:
+    _connected = False
+    _active = False
+    reachable = True
+
+    def __init__(self, interface=STA_IF):
+        self.interface = interface
+        self._ifconfig = ('192.168.1.50', '255.255.255.0', '192.168.1.1', '192.168.1.1')
+
+    def active(self, value=None):
+        if value is None:
+            return WLAN._active
+        WLAN._active = bool(value)
+        if not value:
+            WLAN._connected = False
+
+    def connect(self, ssid=None, key=None, bssid=None):
+        WLAN._connected = WLAN._active and WLAN.reachable
+
+    def disconnect(self):
+        WLAN._connected = False
+
+    def isconnected(self):
+        return WLAN._connected
+
+    def status(self, param=None):
+        if param == 'rssi':
+            return -58
+        return STAT_GOT_IP if WLAN._connected else STAT_IDLE
+
+    def ifconfig(self, config=None):
+        if config is None:
+            return self._ifconfig
+        self._ifconfig = tuple(config)
+
+    def config(self, *args, **kwargs):
+        if args:
+            return {'mac': b'\x00\x00\x00\x00\x00\x01', 'channel': 6,
+                    'ssid': 'host', 'bssid': b'\x00\x00\x00\x00\x00\x02'}.get(args[0])
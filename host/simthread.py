@@ -0,0 +1,162 @@
+"""
+Deterministic ``_thread`` for runs on the virtual clock.
+
+Real threads would race the virtual clock: while one thread sleeps another
+could advance time under it. ``Scheduler`` stands in for the ``_thread``
+module instead. Every thread it starts is a real OS thread, but only the one
+holding the baton runs; each waits on a gate lock of its own until handed it. A thread hands the baton on when it sleeps or
+blocks on a lock. The scheduler then wakes the next ready thread, or moves
+the clock to the earliest sleeper's wake time and wakes that one. Runs are
+therefore repeatable, and ``machine.lightsleep`` (which advances the clock
+without giving up the baton) freezes every thread, as on the chip.
+
+``hostenv.install(clock)`` puts a scheduler in ``sys.modules['_thread']``;
+names it does not define come from the real module.
+"""
+
+import _thread
+import heapq
+import threading
+import traceback
+from collections import deque
+
+MAIN = 0
+
+
+class _Lock:
+    """Lock whose waiters give up the baton instead of blocking the OS thread."""
+
+    def __init__(self, scheduler):
+        self._scheduler = scheduler
+        self._locked = False
+        self._waiters = deque()
+
+    def acquire(self, waitflag=1, timeout=-1):
+        while self._locked:
+            if not waitflag:
+                return False
+            self._waiters.append(self._scheduler.get_ident())
+            self._scheduler.block()
+        self._locked = True
+        return True
+
+    def release(self):
+        if not self._locked:
+            raise RuntimeError("release unlocked lock")
+        self._locked = False
+        if self._waiters:
+            self._scheduler.ready.append(self._waiters.popleft())
+
+    def locked(self):
+        return self._locked
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class Scheduler:
+    """The ``_thread`` API on cooperative threads driven by a virtual clock."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.ready = deque()
+        self.sleepers = []  # (wake time, sequence, thread id)
+        self.current = MAIN
+        self.alive = 1
+        self.pending = None  # exception to raise in the main thread
+        self._seq = 0
+        self._next_id = MAIN + 1
+        self._gates = {MAIN: self._closed_gate()}
+        self._local = threading.local()
+
+    @staticmethod
+    def _closed_gate():
+        gate = threading.Lock()
+        gate.acquire()
+        return gate
+
+    def __getattr__(self, name):
+        return getattr(_thread, name)
+
+    # _thread API
+
+    def get_ident(self):
+        return getattr(self._local, 'ident', MAIN)
+
+    def allocate_lock(self):
+        return _Lock(self)
+
+    def stack_size(self, size=0):
+        return 0
+
+    def start_new_thread(self, fn, args, kwargs=None):
+        ident = self._next_id
+        self._next_id += 1
+        self.alive += 1
+        self.ready.append(ident)
+        self._gates[ident] = self._closed_gate()
+        threading.Thread(target=self._bootstrap, args=(ident, fn, args, kwargs or {}),
+                         daemon=True).start()
+        return ident
+
+    # Scheduling
+
+    def sleep(self, seconds):
+        """time.sleep for every thread: give up the baton until the wake time"""
+        wake = self.clock.now + max(seconds, 0)
+        if self.alive == 1 or (not self.ready and (not self.sleepers or self.sleepers[0][0] > wake)):
+            # Nobody else would run first: skip the hand-over
+            self.clock.advance(seconds)
+            return
+        self._seq += 1
+        heapq.heappush(self.sleepers, (wake, self._seq, self.get_ident()))
+        self._switch()
+
+    def block(self):
+        """Give up the baton until another thread puts this one back in `ready`"""
+        self._switch()
+
+    def _pick(self):
+        if self.ready:
+            return self.ready.popleft()
+        if not self.sleepers:
+            raise RuntimeError("simthread: every thread is blocked")
+        when, _, ident = heapq.heappop(self.sleepers)
+        try:
+            self.clock.advance(when - self.clock.now)
+        except BaseException as e:
+            # A clock callback ended the run; the main thread re-raises it
+            self.pending = e
+            return MAIN
+        return ident
+
+    def _hand_to(self, ident):
+        self.current = ident
+        self._gates[ident].release()
+
+    def _switch(self):
+        me = self.get_ident()
+        nxt = self._pick()
+        if nxt != me:
+            self._hand_to(nxt)
+            self._gates[me].acquire()
+        if me == MAIN and self.pending is not None:
+            e, self.pending = self.pending, None
+            raise e
+
+    def _bootstrap(self, ident, fn, args, kwargs):
+        self._local.ident = ident
+        self._gates[ident].acquire()
+        try:
+            fn(*args, **kwargs)
+        except Exception:
+            print("Unhandled exception in thread started by", fn)
+            traceback.print_exc()
+        except BaseException as e:
+            self.pending = e
+        self.alive -= 1
+        del self._gates[ident]
+        self._hand_to(MAIN if self.pending is not None else self._pick())
@@ -0,0 +1,114 @@
+"""
+Convert an Open-Meteo forecast response into a ``wire`` record.
+
+Reads the JSON the device used to fetch (``main.WEATHER_API_URL``), digests it
+with ``model.digest`` and writes the binary record the proxy serves. With
+``--compare`` it also prints payload sizes and the decode time and heap of
+JSON + digest against ``wire.decode``::
+
+    python -m host.wire_convert forecast.json -o forecast.bin --compare
+
+``--check`` round-trips sample models, including city names that do not fit
+their fields and are cut in the middle of a multi-byte character, through
+``wire`` and ``rtcstate`` and exits non-zero if one does not survive::
+
+    python -m host.wire_convert --check
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+from host import hostenv
+
+hostenv.install()
+import model  # noqa: E402
+import rtcstate  # noqa: E402
+import wire  # noqa: E402
+
+# Cities for --check; the last three overflow the 24-byte field
+CHECK_CITIES = ('London', 'Zürich', 'a' + '\u00e9' * 12, '\u6771\u4eac' * 5, 'S\u00e3o Paulo do Sul de Minas')
+
+
+def convert(data, city='Unknown', epoch=0):
+    digest = model.digest(data, {'city': city})
+    digest.update(lat=data.get('latitude', 0), lon=data.get('longitude', 0))
+    return wire.encode(digest, epoch, data.get('utc_offset_seconds', 0))
+
+
+def _prefix(cut, full):
+    return full.startswith(cut) and len(cut.encode()) <= 24
+
+
+def check():
+    """Round-trip CHECK_CITIES through wire and rtcstate; returns the failures"""
+    failures = []
+    for city in CHECK_CITIES:
+        sample = {'temp': 21.5, 'code': 3, 'humidity': 40, 'time': '2025-01-01T12:00',
+                  'city': city, 'lat': 47.37, 'lon': 8.54,
+                  'hourly_temp': [20.5, 21.0], 'hourly_hum': [40, 41]}
+        decoded = wire.decode(wire.encode(sample, 1735732800))
+        if not decoded or not _prefix(decoded['city'], city) or decoded['hourly_hum'] != [40, 41]:
+            failures.append(('wire', city, decoded and decoded['city']))
+
+        state = rtcstate.State()
+        state.geo = {'lat': 47.37, 'lon': 8.54, 'city': city, 'timezone': 'Europe/Zurich'}
+        state.model = sample
+        rtcstate.save(state)
+        loaded = rtcstate.load()
+        if not loaded or not _prefix(loaded.geo['city'], city) or loaded.model['temp'] != 21.5:
+            failures.append(('rtcstate', city, loaded and loaded.geo['city']))
+    return failures
+
+
+def _cost(fn, arg, rounds=2000):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn(arg)
+    per_call = (time.perf_counter() - start) / rounds
+    tracemalloc.start()
+    fn(arg)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return per_call * 1e6, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('input', nargs='?', help='Open-Meteo JSON file, or - for stdin')
+    parser.add_argument('-o', '--output', help='record file to write')
+    parser.add_argument('--city', default='Unknown')
+    parser.add_argument('--compare', action='store_true', help='print size and decode cost against JSON')
+    parser.add_argument('--check', action='store_true', help='round-trip sample records and exit')
+    args = parser.parse_args()
+
+    if args.check:
+        failures = check()
+        for codec, city, got in failures:
+            print("%s: %r came back as %r" % (codec, city, got))
+        broken = len({city for _, city, _ in failures})
+        print("%d of %d cities round-trip" % (len(CHECK_CITIES) - broken, len(CHECK_CITIES)))
+        sys.exit(1 if failures else 0)
+    if not args.input:
+        parser.error('an input file is required')
+
+    raw = (sys.stdin.buffer if args.input == '-' else open(args.input, 'rb')).read()
+    record = convert(json.loads(raw), args.city, int(time.time()))
+    if args.output:
+        with open(args.output, 'wb') as f:
+            f.write(record)
+
+    if args.compare:
+        json_us, json_heap = _cost(lambda b: model.digest(json.loads(b), {'city': args.city}), raw)
+        wire_us, wire_heap = _cost(wire.decode, memoryview(record))
+        print(f"{'':8}{'bytes':>8}{'decode us':>12}{'peak heap':>12}")
+        print(f"{'json':8}{len(raw):>8}{json_us:>12.1f}{json_heap:>12}")
+        print(f"{'wire':8}{len(record):>8}{wire_us:>12.1f}{wire_heap:>12}")
+    elif not args.output:
+        print(record.hex())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""
+`httpclient`
+================================================================================
+
+Small HTTP/1.1 client with persistent keep-alive connections.
+
+One socket is kept open per (host, port, scheme) and reused for every request
+to that host, so a refresh skips the DNS lookup (see ``dnscache``), the TCP
+handshake and (for HTTPS) the TLS handshake. Responses are read into one preallocated receive buffer;
+chunked bodies are decoded in place, and the body is exposed as a
+``memoryview`` into that buffer so parsing it is the only allocation. If the
+server has closed an idle connection the request is retried once on a fresh
+socket; that shows as a reset, a broken pipe or end of stream before the first
+byte of the response. Any other error (a timeout, an oversized body) is raised
+without a retry.
+
+Conditional GETs keep the validators of the last response per URL and send
+them back (``If-None-Match``/``If-Modified-Since``). A body is only reported
+as unchanged on a ``304``: a server without validators may still repeat
+itself in substance, but Open-Meteo bodies carry a ``generationtime_ms`` that
+differs on every request, so comparing them byte for byte never matches
+(``main`` compares the parsed models instead). The validators of a new body
+are only kept once the caller calls ``commit()`` after parsing it, so a body
+that failed to parse is not reported as unchanged next time.
+"""
+
+import errno
+import socket
+import json
+import dnscache
+import metrics
+
+try:
+    import ssl
+except ImportError:
+    import ussl as ssl
+
+RECV_SIZE = 8192
+
+# How writing to or reading from a socket the server closed while idle fails
+# (MicroPython's errno has no EPIPE; lwIP uses the usual 32)
+_STALE = (errno.ECONNRESET, errno.ECONNABORTED, errno.ENOTCONN, getattr(errno, 'EPIPE', 32))
+
+
+class ConnectionClosed(OSError):
+    """The server closed the connection before the response was complete."""
+
+
+class Response:
+    """Reused response; body is only valid until the next request"""
+
+    def __init__(self):
+        self.status_code = 0
+        self.body = None
+        self.etag = None
+        self.last_modified = None
+        self.unchanged = False
+
+    def json(self):
+        try:
+            return json.loads(self.body)
+        except TypeError:
+            # CPython's json does not take a memoryview
+            return json.loads(bytes(self.body))
+
+
+def _split_url(url):
+    scheme, _, rest = url.partition('://')
+    host, slash, path = rest.partition('/')
+    port = 443 if scheme == 'https' else 80
+    if ':' in host:
+        host, port = host.split(':', 1)
+        port = int(port)
+    return scheme == 'https', host, port, slash + path
+
+
+def _lower_eq(buf, start, end, name):
+    """Case-insensitive compare of buf[start:end] with lower-case bytes name"""
+    if end - start != len(name):
+        return False
+    for i in range(len(name)):
+        if buf[start + i] | 0x20 != name[i]:
+            return False
+    return True
+
+
+def _stale(error):
+    """True if error is how a socket closed by the server while idle fails"""
+    return isinstance(error, ConnectionClosed) or bool(error.args) and error.args[0] in _STALE
+
+
+class _Connection:
+    def __init__(self, host, port, tls, timeout):
+        addr = dnscache.resolve(host, port)
+        sock = socket.socket()
+        sock.settimeout(timeout)
+        try:
+            try:
+                sock.connect(addr)
+            except OSError:
+                # The cached address may be stale; look it up again next time
+                dnscache.invalidate(host, port)
+                raise
+            if tls:
+                if hasattr(ssl, 'create_default_context'):
+                    sock = ssl.create_default_context().wrap_socket(sock, server_hostname=host)
+                else:
+                    sock = ssl.wrap_socket(sock, server_hostname=host)
+        except:
+            sock.close()
+            raise
+        self.sock = sock
+        # CPython sockets have sendall/recv_into, MicroPython streams write/readinto
+        self.write = getattr(sock, 'sendall', None) or sock.write
+        self.readinto = getattr(sock, 'recv_into', None) or sock.readinto
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class HTTPClient:
+    """Keep-alive HTTP/1.1 client reading into one preallocated buffer."""
+
+    def __init__(self, bufsize=RECV_SIZE, timeout=10):
+        self.buf = bytearray(bufsize)
+        self.mv = memoryview(self.buf)
+        self.timeout = timeout
+        self.connections = {}
+        self.response = Response()
+        self.validators = {}  # url -> (etag, last_modified)
+        self._pending = None  # (url, validators) of the last new body
+        self._n = 0
+
+    def get(self, url, headers=None, conditional=False):
+        """GET url; with conditional, response.unchanged flags a 304 to our validators"""
+        self._pending = None
+        if not conditional:
+            return self.request('GET', url, headers)
+        validators = self.validators.get(url)
+        if validators:
+            headers = dict(headers) if headers else {}
+            if validators[0]:
+                headers['If-None-Match'] = validators[0]
+            if validators[1]:
+                headers['If-Modified-Since'] = validators[1]
+        resp = self.request('GET', url, headers)
+        if resp.status_code == 304:
+            resp.unchanged = validators is not None
+            metrics.incr("http_not_modified")
+        elif resp.status_code == 200 and (resp.etag or resp.last_modified):
+            self._pending = (url, (resp.etag, resp.last_modified))
+        return resp
+
+    def commit(self):
+        """Keep the validators of the last conditional GET; call once its body parsed"""
+        if self._pending:
+            url, validators = self._pending
+            self.validators[url] = validators
+            self._pending = None
+
+    def request(self, method, url, headers=None):
+        tls, host, port, path = _split_url(url)
+        key = (host, port, tls)
+        for attempt in range(2):
+            conn = self.connections.get(key)
+            reused = conn is not None
+            if not reused:
+                conn = _Connection(host, port, tls, self.timeout)
+                self.connections[key] = conn
+                metrics.incr("http_connects")
+            else:
+                metrics.incr("http_reuses")
+            self._n = 0
+            try:
+                self._send(conn, method, host, path, headers)
+                keep = self._read(conn, method)
+            except OSError as e:
+                self._drop(key)
+                # A reused socket the server closed while idle fails before
+                # any of the response arrives; only that is worth a retry
+                if reused and attempt == 0 and self._n == 0 and _stale(e):
+                    continue
+                raise
+            if not keep:
+                self._drop(key)
+            metrics.incr("http_requests")
+            return self.response
+
+    def close(self):
+        for key in list(self.connections):
+            self._drop(key)
+
+    def _drop(self, key):
+        conn = self.connections.pop(key, None)
+        if conn:
+            conn.close()
+
+    def _send(self, conn, method, host, path, headers):
+        request = f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n"
+        if headers:
+            for name in headers:
+                request += f"{name}: {headers[name]}\r\n"
+        conn.write((request + "\r\n").encode())
+
+    def _fill(self, conn):
+        """Read more bytes into the buffer, failing on EOF"""
+        if self._n >= len(self.buf):
+            raise OSError("response too large")
+        got = conn.readinto(self.mv[self._n:])
+        if not got:
+            raise ConnectionClosed("connection closed")
+        self._n += got
+        metrics.incr("http_rx_bytes", got)
+
+    def _line_end(self, conn, start):
+        """Offset of the CRLF ending the line at start, reading as needed"""
+        buf = self.buf
+        i = start
+        while True:
+            while i + 1 < self._n:
+                if buf[i] == 13 and buf[i + 1] == 10:
+                    return i
+                i += 1
+            self._fill(conn)
+
+    def _parse_int(self, start, end, base=10):
+        value = 0
+        for i in range(start, end):
+            c = self.buf[i] | 0x20
+            if 48 <= c <= 57:
+                digit = c - 48
+            elif base == 16 and 97 <= c <= 102:
+                digit = c - 87
+            else:
+                break
+            value = value * base + digit
+        return value
+
+    def _read(self, conn, method):
+        """Read one response; returns True if the connection can be reused"""
+        buf = self.buf
+        resp = self.response
+        resp.etag = resp.last_modified = None
+        resp.unchanged = False
+        self._n = 0
+
+        # Status line: HTTP/1.1 200 OK
+        end = self._line_end(conn, 0)
+        resp.status_code = self._parse_int(9, 12)
+        keep = buf[7] == 49  # HTTP/1.1 defaults to keep-alive
+
+        # Headers
+        length = -1
+        chunked = False
+        pos = end + 2
+        while True:
+            end = self._line_end(conn, pos)
+            if end == pos:
+                break
+            colon = pos
+            while colon < end and buf[colon] != 58:
+                colon += 1
+            value = colon + 1
+            while value < end and buf[value] == 32:
+                value += 1
+            if _lower_eq(buf, pos, colon, b'content-length'):
+                length = self._parse_int(value, end)
+            elif _lower_eq(buf, pos, colon, b'transfer-encoding'):
+                chunked = _lower_eq(buf, value, end, b'chunked')
+            elif _lower_eq(buf, pos, colon, b'connection'):
+                if _lower_eq(buf, value, end, b'close'):
+                    keep = False
+                elif _lower_eq(buf, value, end, b'keep-alive'):
+                    keep = True
+            elif _lower_eq(buf, pos, colon, b'etag'):
+                resp.etag = bytes(self.mv[value:end]).decode()
+            elif _lower_eq(buf, pos, colon, b'last-modified'):
+                resp.last_modified = bytes(self.mv[value:end]).decode()
+            pos = end + 2
+        pos += 2
+
+        if method == 'HEAD' or resp.status_code in (204, 304) or 100 <= resp.status_code < 200:
+            resp.body = self.mv[pos:pos]
+        elif chunked:
+            resp.body = self.mv[:self._dechunk(conn, pos)]
+        elif length >= 0:
+            if pos + length > len(buf):
+                raise OSError("response too large")
+            while self._n < pos + length:
+                self._fill(conn)
+            resp.body = self.mv[pos:pos + length]
+        else:
+            # No framing: the body runs until the server closes the socket
+            try:
+                while True:
+                    self._fill(conn)
+            except OSError:
+                if self._n >= len(buf):
+                    raise
+            resp.body = self.mv[pos:self._n]
+            keep = False
+        return keep
+
+    def _dechunk(self, conn, pos):
+        """Decode a chunked body in place at the start of the buffer"""
+        mv = self.mv
+        out = 0
+        while True:
+            end = self._line_end(conn, pos)
+            size = self._parse_int(pos, end, 16)
+            pos = end + 2
+            if size == 0:
+                # Skip trailers up to the final empty line
+                while True:
+                    end = self._line_end(conn, pos)
+                    if end == pos:
+                        return out
+                    pos = end + 2
+            if pos + size + 2 > len(self.buf):
+                raise OSError("response too large")
+            while self._n < pos + size + 2:
+                self._fill(conn)
+            # Move the chunk down over the framing; copy in steps no longer
+            # than the gap so source and destination never overlap
+            left = size
+            while left:
+                step = min(left, pos - out)
+                mv[out:out + step] = mv[pos:pos + step]
+                out += step
+                pos += step
+                left -= step
+            pos += 2
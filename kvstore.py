@@ -0,0 +1,279 @@
+"""
+`kvstore`
+================================================================================
+
+Log-structured key-value store on flash for the app's persistent caches.
+
+Rewriting a small file on every refresh is slow on LittleFS and wears the
+flash. Instead every update is appended to one log file as a record::
+
+    flags u8, key length u8, value length u16, crc32 u32, key, value
+
+The CRC covers everything but itself. Boot reads the log in one sequential
+scan and builds a RAM index of where each key's newest value is. Records
+written together by one ``flush()`` form a batch: every record but the last
+has the ``MORE`` flag, so a batch cut short by a reset is dropped as a whole.
+A torn or corrupt tail ends the scan and is dropped by rewriting the log.
+Each batch starts with a ``STAMP`` record holding the ``time.time()`` it was
+written at, so the write interval holds across deep sleep, which restarts
+``ticks_ms()`` and clears RAM.
+
+``put()`` only updates RAM. ``flush()`` appends whatever changed since the
+last write, at most once per ``min_interval`` seconds unless forced. Several
+updates of one key between flushes cost one record, and so does none at all
+if the value ends up unchanged. A write that fails may leave part of a batch
+behind, so the log is then rewritten from the index before anything else is
+appended. Once the log holds more than ``COMPACT_RATIO``
+times the live data, the live records are written to a new file that then
+replaces the log with an atomic rename.
+
+The module-level functions work on one shared store in ``STORE_FILE``.
+"""
+
+import os
+import struct
+import time
+from binascii import crc32
+
+STORE_FILE = "kv.log"
+
+MAGIC = b'WKV1'
+_HEADER = '<BBHI'
+HEADER_SIZE = struct.calcsize(_HEADER)
+
+# Record flags
+DELETE = 0x01
+MORE = 0x02  # another record of the same batch follows
+STAMP = 0x04  # value is the batch's write time, u32 seconds; not a key
+
+MIN_INTERVAL = 300  # default seconds between writes
+COMPACT_RATIO = 2
+COMPACT_MIN = 8192  # never compact a log smaller than this
+
+
+def _record(key, value, flags):
+    head = struct.pack('<BBH', flags, len(key), len(value))
+    crc = crc32(value, crc32(key, crc32(head)))
+    return struct.pack(_HEADER, flags, len(key), len(value), crc) + key + value
+
+
+class Store:
+    """Append-only log of key-value records with a RAM index."""
+
+    def __init__(self, path=STORE_FILE, min_interval=MIN_INTERVAL):
+        self.path = path
+        self.min_interval = min_interval
+        self.index = {}  # key -> (value offset, value length)
+        self.pending = {}  # key -> value (None deletes) waiting for flush()
+        self.size = 0
+        self.live = 0  # bytes of records that are still current
+        self.writes = 0
+        self.written = None  # time.time() of the last write
+        self.torn = False  # a failed write may have left part of a batch
+        self._scan()
+
+    def _scan(self):
+        """Build the index from the log; drop a torn or corrupt tail"""
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            data = b''
+        if data[:4] != MAGIC:
+            self.index = {}
+            self._rewrite({})
+            return
+        view = memoryview(data)
+        pos = good = len(MAGIC)
+        batch = []
+        written = None
+        while pos + HEADER_SIZE <= len(data):
+            flags, klen, vlen, crc = struct.unpack_from(_HEADER, data, pos)
+            end = pos + HEADER_SIZE + klen + vlen
+            if end > len(data):
+                break
+            body = view[pos + HEADER_SIZE:end]
+            if crc32(body, crc32(view[pos:pos + 4])) != crc:
+                break
+            pos = end
+            if flags & STAMP:
+                written = struct.unpack_from('<I', body, klen)[0] if vlen == 4 else None
+            else:
+                key = bytes(body[:klen]).decode()
+                batch.append((key, None if flags & DELETE else (pos - vlen, vlen)))
+            if not flags & MORE:
+                for key, where in batch:
+                    self._index(key, where)
+                batch = []
+                good = pos
+                if written is not None:
+                    self.written = written
+        self.size = good
+        if good != len(data):
+            print("kvstore: dropping %d bytes of torn log" % (len(data) - good))
+            values = {key: self._read(view, where) for key, where in self.index.items()}
+            self._rewrite(values)
+
+    def _index(self, key, where):
+        old = self.index.pop(key, None)
+        if old:
+            self.live -= HEADER_SIZE + len(key) + old[1]
+        if where:
+            self.index[key] = where
+            self.live += HEADER_SIZE + len(key) + where[1]
+
+    @staticmethod
+    def _read(data, where):
+        offset, length = where
+        return bytes(data[offset:offset + length])
+
+    def get(self, key, default=None):
+        if key in self.pending:
+            value = self.pending[key]
+            return default if value is None else value
+        value = self.get_stored(key)
+        return default if value is None else value
+
+    def put(self, key, value):
+        """Set key to value (bytes) on the next flush()"""
+        self.pending[key] = bytes(value)
+
+    def delete(self, key):
+        self.pending[key] = None
+
+    def keys(self):
+        keys = set(self.index)
+        for key, value in self.pending.items():
+            if value is None:
+                keys.discard(key)
+            else:
+                keys.add(key)
+        return keys
+
+    def due(self):
+        """True if pending changes may be written now"""
+        if self.written is None:
+            return True
+        # A clock set back (a power cycle before time sync) also allows it
+        return not 0 <= time.time() - self.written < self.min_interval
+
+    def flush(self, force=False):
+        """Append pending changes as one batch; returns True if it wrote"""
+        if not self.pending or not (force or self.due()):
+            return False
+        if self.torn:
+            # Appending after a partial batch would hide the new one from the
+            # next scan, which stops at the first bad record
+            self.compact()
+            if self.torn:
+                return False
+        # Swapped out first, so puts from other threads land in the next batch
+        pending, self.pending = self.pending, {}
+        changes = []
+        for key, value in pending.items():
+            where = self.index.get(key)
+            if value is None and where is None:
+                continue
+            if value is not None and where and where[1] == len(value) \
+                    and self.get_stored(key) == value:
+                continue  # unchanged
+            changes.append((key, value))
+        if not changes:
+            return False
+
+        now = int(time.time())
+        out = bytearray(_record(b'', struct.pack('<I', now), STAMP | MORE))
+        offsets = []
+        for i, (key, value) in enumerate(changes):
+            flags = (DELETE if value is None else 0) | (MORE if i < len(changes) - 1 else 0)
+            raw = key.encode()
+            offsets.append(self.size + len(out) + HEADER_SIZE + len(raw))
+            out += _record(raw, value or b'', flags)
+        try:
+            with open(self.path, 'ab') as f:
+                f.write(out)
+        except OSError as e:
+            print("kvstore write error:", e)
+            for key, value in pending.items():
+                self.pending.setdefault(key, value)  # retried on the next flush
+            # Part of the batch may be on flash past self.size; rewriting the
+            # log from the index drops it (or flush() retries that first)
+            self.torn = True
+            self.compact()
+            return False
+        for (key, value), offset in zip(changes, offsets):
+            self._index(key, None if value is None else (offset, len(value)))
+        self.size += len(out)
+        self.writes += 1
+        self.written = now
+        if self.size > COMPACT_MIN and self.size > COMPACT_RATIO * (self.live + len(MAGIC)):
+            self.compact()
+        return True
+
+    def get_stored(self, key):
+        """The flushed value of key, ignoring pending changes"""
+        where = self.index.get(key)
+        if where is None:
+            return None
+        with open(self.path, 'rb') as f:
+            f.seek(where[0])
+            return f.read(where[1])
+
+    def compact(self):
+        """Rewrite the log with only the current records"""
+        values = {key: self.get_stored(key) for key in self.index}
+        self._rewrite(values)
+
+    def _rewrite(self, values):
+        # Written to a new file first; the rename replaces the log atomically
+        tmp = self.path + ".tmp"
+        out = bytearray(MAGIC)
+        index = {}
+        keys = list(values)
+        if self.written is not None and keys:
+            out += _record(b'', struct.pack('<I', self.written), STAMP | MORE)
+        for i, key in enumerate(keys):
+            raw = key.encode()
+            value = values[key]
+            index[key] = (len(out) + HEADER_SIZE + len(raw), len(value))
+            out += _record(raw, value, MORE if i < len(keys) - 1 else 0)
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(out)
+            os.rename(tmp, self.path)
+        except OSError as e:
+            print("kvstore compaction error:", e)
+            return
+        self.index = index
+        self.size = self.live = len(out)
+        self.live -= len(MAGIC)
+        self.torn = False
+        if self.written is not None and keys:
+            self.live -= HEADER_SIZE + 4
+
+
+_store = None
+
+
+def store():
+    """The shared store, opened (one scan of the log) on first use"""
+    global _store
+    if _store is None:
+        _store = Store(STORE_FILE)
+    return _store
+
+
+def get(key, default=None):
+    return store().get(key, default)
+
+
+def put(key, value):
+    store().put(key, value)
+
+
+def delete(key):
+    store().delete(key)
+
+
+def flush(force=False):
+    return store().flush(force)
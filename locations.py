@@ -0,0 +1,99 @@
+"""
+`locations`
+================================================================================
+
+Rotation through a list of configured locations.
+
+Every location keeps its own cached weather model and refresh deadline, so
+switching (on a timer or by swipe) renders straight from the cache. Locations
+that are due are refreshed together: Open-Meteo accepts comma-separated
+latitude and longitude lists and answers with one result per coordinate, so
+N locations cost one request instead of N, as long as the answer fits the
+HTTP client's receive buffer; ``batches()`` splits longer lists.
+"""
+
+# Bytes of an Open-Meteo answer per location, and of the response head
+RESULT_SIZE = 1800
+HEAD_SIZE = 512
+
+
+class Location:
+    """One place on the rotation with its cached model."""
+
+    def __init__(self, name, lat, lon, tz=''):
+        self.name = name
+        self.lat = lat
+        self.lon = lon
+        self.tz = tz
+        self.model = None  # see model.digest()
+        self.deadline = 0  # time.time() when the model is next refreshed
+        self.fetched = 0  # time.time() of the last successful refresh
+
+
+class Rotation:
+    """Current location, timed rotation and batched refresh bookkeeping."""
+
+    def __init__(self, places, interval=0, now=0):
+        self.locations = [Location(*place) for place in places]
+        self.interval = interval  # seconds per location, 0 to switch by swipe only
+        self.index = 0
+        self.switched = now
+
+    def current(self):
+        return self.locations[self.index]
+
+    def step(self, delta, now):
+        """Move delta places, skipping locations with nothing cached yet"""
+        self.switched = now
+        count = len(self.locations)
+        index = self.index
+        for _ in range(count - 1):
+            index = (index + delta) % count
+            if self.locations[index].model:
+                break
+        else:
+            return None
+        self.index = index
+        return self.locations[index]
+
+    def rotate_at(self):
+        """time.time() of the next timed switch, or None"""
+        if self.interval and len(self.locations) > 1:
+            return self.switched + self.interval
+        return None
+
+    def due(self, now):
+        return [loc for loc in self.locations if now >= loc.deadline]
+
+    def next_deadline(self):
+        return min(loc.deadline for loc in self.locations)
+
+    def rebase(self, shift):
+        """Move every time stamp by shift seconds, after the clock was set"""
+        self.switched += shift
+        for loc in self.locations:
+            loc.deadline += shift
+            if loc.fetched:
+                loc.fetched += shift
+
+
+def batch_coords(locations):
+    """Comma-separated latitude and longitude lists for one request"""
+    lats = ",".join(str(loc.lat) for loc in locations)
+    lons = ",".join(str(loc.lon) for loc in locations)
+    return lats, lons
+
+
+def batches(locations, bufsize):
+    """Split locations into groups whose batched answer fits bufsize bytes"""
+    size = max(1, (bufsize - HEAD_SIZE) // RESULT_SIZE)
+    return [locations[i:i + size] for i in range(0, len(locations), size)]
+
+
+def split_batch(data, count):
+    """Per-location results of a batched response, in request order"""
+    # A single coordinate comes back as an object, several as a list
+    results = data if isinstance(data, list) else [data]
+    if len(results) != count:
+        raise ValueError("expected %d results, got %d" % (count, len(results)))
+    return results
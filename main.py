@@ -1,48 +1,109 @@
 import time
-from machine import Pin, SPI, RTC
+import metrics
+import machine
+from machine import Pin, SPI, I2C, RTC
 import gc9a01
-from bitmap import vga1_bold_16x32 as font
-import network
-import urequests
 import gc
 import cst816
+import sparkline
+import roundclip
+import power
+import model
+import kvstore
+import rtcstate
+import locations
+import config
+import tasks
+import netguard
+import worker
+import governor
+import assets
+import calibrate
+import wmo
 
-# Initialize touch
-touch = cst816.CST816()
+# The font comes from the asset bundle when there is one; icons stay files,
+# since the display driver's jpg() only takes a file name
+bundle = assets.load()
+if bundle:
+    font = bundle.font("bitmap/vga1_bold_16x32")
+else:
+    from bitmap import vga1_bold_16x32 as font
 
-# Wi-Fi credentials
-WIFI_SSID = "Your WIFI SSID"
-WIFI_PASSWORD = "WIFI Password"
+# The networking stack is imported by load_network() on first use, after
+# the first frame is on screen
+network = httpclient = wire = None
 
-# API URLs
-GEOLOCATION_API_URL = "http://ip-api.com/json/"
-WORLD_TIME_API_URL = "https://worldtimeapi.org/api/timezone/{timezone}"
-WEATHER_API_URL = "http://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&current_weather=true&hourly=relativehumidity_2m"
+metrics.mark("imports")
+
+# Settings from config.txt (see config.DEFAULTS)
+cfg = config.load()
+
+# Touch controller, created in main() so its reset overlaps display init
+touch = None
+
+# Returned by the fetchers when the server reports the data has not changed
+NOT_MODIFIED = "not modified"
+
+# What digesting a response of the wrong shape raises (a null where a list
+# or object belongs, a missing key, a short list)
+DIGEST_ERRORS = (ValueError, KeyError, TypeError, AttributeError, IndexError)
+
+# Seconds between the Unix epoch and this port's time epoch
+EPOCH_OFFSET = 946684800 if time.gmtime(0)[0] == 2000 else 0
+
+# Keep-alive HTTP client shared by all API calls, created by load_network()
+http = None
+
+# Network worker (see network_job) and its own copy of the locations; the UI
+# thread's rotation only receives models through the worker's mailbox
+net_worker = None
+net_rotation = None
+net_pending = None  # places for a new net_rotation after a config change
+time_synced = 0
+TIME_RESYNC = 24 * 3600  # seconds between clock syncs after boot
+WIFI_TIMEOUT = 15  # seconds wait_wifi() waits for an association
 
 # Global variables
 temperature_unit = "C"  # Default to Celsius
 last_touch_time = None  # For touch message handling
 
-def truncate_to_hour(time_str):
-    """Truncate time string to hourly format (YYYY-MM-DDTHH:00)"""
-    try:
-        date_part, time_part = time_str.split('T', 1)
-        time_part = time_part.split('+')[0].split('-')[0]
-        hour = time_part.split(':')[0]
-        return f"{date_part}T{hour}:00"
-    except:
-        return time_str
-
-def connect_wifi():
+# Hourly temperature (yellow) and humidity (cyan) chart above the readings
+CHART_X, CHART_Y = 70, 12
+chart = sparkline.Sparkline(100, 28, (gc9a01.YELLOW, gc9a01.CYAN))
+charted = None  # model the chart was last scaled for
+
+def load_network():
+    """Import the networking stack and create the HTTP client once"""
+    global httpclient, wire, http
+    if http is None:
+        import httpclient
+        import wire
+        http = httpclient.HTTPClient(cfg.http_bufsize, cfg.http_timeout)
+        metrics.mark("net_import")
+
+def start_wifi(lease=None):
+    """Start associating without waiting for it; returns the interface"""
+    global network
+    import network
     wlan = network.WLAN(network.STA_IF)
     wlan.active(True)
     if not wlan.isconnected():
         print("Connecting to Wi-Fi...")
-        wlan.connect(WIFI_SSID, WIFI_PASSWORD)
-        for _ in range(15):  # 15-second timeout
-            if wlan.isconnected():
-                break
-            time.sleep(1)
+        if lease:
+            # Static configuration from a previous DHCP lease skips DHCP
+            wlan.ifconfig(lease)
+        wlan.connect(cfg.wifi_ssid, cfg.wifi_password)
+    return wlan
+
+def connect_wifi(lease=None):
+    return wait_wifi(start_wifi(lease))
+
+def wait_wifi(wlan, timeout=WIFI_TIMEOUT):
+    load_network()
+    for _ in range(timeout * 10):
+        if wlan.isconnected():
+            break
+        time.sleep_ms(100)
     if wlan.isconnected():
         print("Connected to Wi-Fi")
         print("IP:", wlan.ifconfig()[0])
@@ -50,210 +111,858 @@ def connect_wifi():
     print("Wi-Fi connection failed")
     return False
 
-def fetch_geolocation():
+def fetch_geolocation(client=None):
+    if not netguard.allow('geo'):
+        return None
     try:
         print("Fetching geolocation...")
-        response = urequests.get(GEOLOCATION_API_URL, timeout=10)
-        return response.json() if response.status_code == 200 else None
+        with metrics.timer("fetch_geo"):
+            response = (client or http).get(cfg.geolocation_url)
+        if response.status_code == 200:
+            geo_data = response.json()
+            netguard.success('geo')
+            return geo_data
+        netguard.failure('geo')
+        return None
     except Exception as e:
         print("Geolocation error:", e)
+        netguard.failure('geo')
         return None
     finally:
         gc.collect()
 
-def sync_time(timezone):
+def sync_time(timezone=None, client=None):
+    """Set the RTC from worldtimeapi; without a timezone the caller's IP decides"""
+    if not netguard.allow('time'):
+        return
     try:
-        print(f"Syncing time for: {timezone}")
-        encoded_tz = timezone.replace(" ", "_")
-        response = urequests.get(WORLD_TIME_API_URL.format(timezone=encoded_tz), timeout=10)
+        print(f"Syncing time for: {timezone or 'IP location'}")
+        if timezone:
+            url = cfg.world_time_url.format(timezone=timezone.replace(" ", "_"))
+        else:
+            url = cfg.world_time_ip_url
+        with metrics.timer("fetch_time"):
+            response = (client or http).get(url)
         if response.status_code == 200:
             time_data = response.json()
             dt_str = time_data['datetime'].split('.')[0]
             year, month, day = map(int, dt_str[:10].split('-'))
             hour, minute, second = map(int, dt_str[11:19].split(':'))
             RTC().datetime((year, month, day, 0, hour, minute, second, 0))
+            netguard.success('time')
             print("Time synced successfully")
         else:
+            netguard.failure('time')
             print("Time sync failed:", response.status_code)
     except Exception as e:
+        netguard.failure('time')
         print("Time sync error:", e)
     finally:
         gc.collect()
 
 def fetch_weather_data(lat, lon):
+    if not netguard.allow('weather'):
+        return None
     try:
         print(f"Fetching weather for {lat},{lon}")
-        response = urequests.get(WEATHER_API_URL.format(lat=lat, lon=lon), timeout=10)
-        return response.json() if response.status_code == 200 else None
+        with metrics.timer("fetch_weather"):
+            response = http.get(cfg.weather_url.format(lat=lat, lon=lon), conditional=True)
+        if response.unchanged:
+            netguard.success('weather')
+            return NOT_MODIFIED
+        if response.status_code == 200:
+            with governor.burst("parse"):
+                weather_data = response.json()
+            netguard.success('weather')
+            return weather_data
+        netguard.failure('weather')
+        return None
     except Exception as e:
         print("Weather fetch error:", e)
+        netguard.failure('weather')
         return None
     finally:
         gc.collect()
 
-def get_weather_condition(code):
-    conditions = {
-        0: "Clear sky", 1: "Mainly clear", 2: "Partly cloudy", 3: "Overcast",
-        45: "Fog", 48: "Rime fog", 51: "Light drizzle", 53: "Moderate drizzle",
-        55: "Dense drizzle", 56: "Freezing drizzle", 57: "Dense freezing drizzle",
-        61: "Slight rain", 63: "Moderate rain", 65: "Heavy rain",
-        66: "Freezing rain", 67: "Heavy freezing rain", 71: "Slight snow",
-        73: "Moderate snow", 75: "Heavy snow", 77: "Snow grains",
-        80: "Slight showers", 81: "Moderate showers", 82: "Violent showers",
-        85: "Snow showers", 86: "Heavy snow showers", 95: "Thunderstorm",
-        96: "Thunderstorm w/hail", 99: "Severe thunderstorm"
-    }
-    return conditions.get(code, "Unknown")
-
-def get_weather_image(code):
-    images = {
-        0: "jpg/clear_sky.jpg", 1: "jpg/mainly_clear.jpg", 
-        2: "jpg/partly_cloudy.jpg", 3: "jpg/overcast.jpg",
-        45: "jpg/fog.jpg", 48: "jpg/fog.jpg", 51: "jpg/drizzle.jpg",
-        53: "jpg/drizzle.jpg", 55: "jpg/drizzle.jpg", 56: "jpg/freezing.jpg",
-        57: "jpg/freezing.jpg", 61: "jpg/rain.jpg", 63: "jpg/rain.jpg",
-        65: "jpg/rain.jpg", 66: "jpg/freezing.jpg", 67: "jpg/freezing.jpg",
-        71: "jpg/snow.jpg", 73: "jpg/snow.jpg", 75: "jpg/snow.jpg",
-        77: "jpg/snow.jpg", 80: "jpg/showers.jpg", 81: "jpg/showers.jpg",
-        82: "jpg/showers.jpg", 85: "jpg/snow.jpg", 86: "jpg/snow.jpg",
-        95: "jpg/thunder.jpg", 96: "jpg/thunder.jpg", 99: "jpg/thunder.jpg"
-    }
-    return images.get(code, "jpg/unknown.jpg")
+def set_clock(epoch, utc_offset=0):
+    """Set the RTC to local time from a Unix timestamp"""
+    t = time.gmtime(epoch + utc_offset - EPOCH_OFFSET)
+    RTC().datetime((t[0], t[1], t[2], 0, t[3], t[4], t[5], 0))
 
-def display_weather_data(tft, weather_data, geo_data):
-    global temperature_unit
+def fetch_proxy(lat=None, lon=None):
+    """Fetch a pre-digested model from the proxy and take the time from it"""
+    if not netguard.allow('proxy'):
+        return None
     try:
-        tft.fill(gc9a01.BLACK)
-        if not weather_data or 'current_weather' not in weather_data:
-            return
-
-        current = weather_data['current_weather']
-        temp = current['temperature']
-        code = current['weathercode']
-        current_time = current['time']
-
-        # Process humidity data
-        hourly = weather_data.get('hourly', {})
-        times = [truncate_to_hour(t) for t in hourly.get('time', [])]
-        humidities = hourly.get('relativehumidity_2m', [])
-        
-        try:
-            idx = times.index(truncate_to_hour(current_time))
-            humidity = humidities[idx]
-        except (ValueError, IndexError):
-            humidity = humidities[0] if humidities else "N/A"
-
-        # Temperature conversion and unit
-        display_temp = (temp * 9/5) + 32 if temperature_unit == "F" else temp
-        unit_char = "F" if temperature_unit == "F" else "C"
-
-        # Display layout calculations
-        def center(text):
-            return (tft.width() - len(text) * font.WIDTH) // 2
-
-        # Humidity & Temperature display
-        hum_text = f"{humidity}%/"
-        temp_text = f"{display_temp:.1f}{unit_char}"
-        combined_text = hum_text + temp_text
-        x_pos = center(combined_text)
-        
-        tft.text(font, hum_text, x_pos, 45, gc9a01.WHITE)
-        temp_x = x_pos + len(hum_text) * font.WIDTH
-        tft.text(font, temp_text, temp_x, 45, gc9a01.WHITE)
-
-        # City & Condition
-        city = geo_data.get('city', 'Unknown')[:15]
-        tft.text(font, city, center(city), 85, gc9a01.WHITE)
-        condition = get_weather_condition(code)
-        tft.text(font, condition, center(condition), 125, gc9a01.WHITE)
-
-        # Weather image
-        tft.jpg(get_weather_image(code), 80, 160, 75)
-
+        print("Fetching weather from proxy")
+        url = cfg.proxy_url + "/v1/weather.bin"
+        if lat is not None:
+            url += f"?lat={lat}&lon={lon}"
+        with metrics.timer("fetch_proxy"):
+            response = http.get(url, conditional=True)
+        if response.unchanged:
+            netguard.success('proxy')
+            return NOT_MODIFIED
+        weather = wire.decode(response.body) if response.status_code == 200 else None
+        if not weather:
+            netguard.failure('proxy')
+            return None
+        netguard.success('proxy')
+        http.commit()
+        set_clock(weather['epoch'], weather.get('utc_offset', 0))
+        return weather
     except Exception as e:
-        print("Display error:", e)
+        print("Proxy fetch error:", e)
+        netguard.failure('proxy')
+        return None
     finally:
         gc.collect()
 
+def refresh_weather(lat, lon, geo_data):
+    """Fetch the current weather as a model, through the proxy if configured
+
+    Returns None on failure and NOT_MODIFIED when the data is unchanged.
+    """
+    if cfg.proxy_url:
+        return fetch_proxy(lat, lon)
+    weather_data = fetch_weather_data(lat, lon)
+    if weather_data is NOT_MODIFIED:
+        return NOT_MODIFIED
+    if not weather_data:
+        return None
+    try:
+        with governor.burst("digest"):
+            weather = model.digest(weather_data, geo_data)
+    except DIGEST_ERRORS as e:
+        print("Weather digest error:", e)
+        return None
+    # Only a body that digested counts as seen for the next conditional GET
+    http.commit()
+    return weather
+
+def fetch_batch(group):
+    """Models for a group of locations from one batched request"""
+    weather_data = fetch_weather_data(*locations.batch_coords(group))
+    if not weather_data or weather_data is NOT_MODIFIED:
+        return [weather_data] * len(group)
+    try:
+        with governor.burst("digest"):
+            batch = locations.split_batch(weather_data, len(group))
+            results = [model.digest(data, {'city': loc.name}) for data, loc in zip(batch, group)]
+    except DIGEST_ERRORS as e:
+        print("Weather batch error:", e)
+        return [None] * len(group)
+    http.commit()
+    return results
+
+def refresh_locations(due, now):
+    """Refresh the due locations in batched requests; returns those updated"""
+    if cfg.proxy_url:
+        # The proxy caches per location, so each is a cheap local request
+        results = [fetch_proxy(loc.lat, loc.lon) for loc in due]
+    else:
+        # As few requests as the receive buffer allows
+        results = []
+        for group in locations.batches(due, cfg.http_bufsize):
+            results += fetch_batch(group)
+
+    updated = []
+    endpoint = 'proxy' if cfg.proxy_url else 'weather'
+    for loc, weather in zip(due, results):
+        if weather and weather is not NOT_MODIFIED and loc.name:
+            weather['city'] = loc.name
+        # Open-Meteo sends no validators, so a repeat forecast arrives as a
+        # new body; the digest leaves out its volatile fields and compares
+        if weather is NOT_MODIFIED or weather and weather == loc.model:
+            metrics.incr("refresh_unchanged")
+            loc.deadline = now + cfg.refresh_interval
+            loc.fetched = now
+        elif weather:
+            metrics.incr("refresh_updated")
+            loc.model = weather
+            loc.deadline = now + cfg.refresh_interval
+            loc.fetched = now
+            updated.append(loc)
+        else:
+            # Back off with the endpoint's breaker instead of retrying every pass
+            metrics.incr("refresh_failed")
+            print("Weather update failed for", loc.name)
+            loc.deadline = max(now + cfg.retry_interval, netguard.retry_at(endpoint))
+    return updated
+
+def age_label(fetched, now):
+    """Short age of data fetched at `fetched` once it is overdue, else empty"""
+    age = now - fetched
+    if not fetched or age < 2 * cfg.refresh_interval:
+        return ""
+    if age < 3600:
+        return f"{int(age // 60)}m"
+    if age < 100 * 3600:
+        return f"{int(age // 3600)}h"
+    return "old"
+
+def get_weather_condition(code):
+    return wmo.CONDITIONS[wmo.CONDITION[code] if 0 <= code < wmo.CODES else 0]
+
+def get_weather_icon(code):
+    """Index into wmo.ICONS for a weather code, or wmo.NO_ICON"""
+    return wmo.ICON[code] if 0 <= code < wmo.CODES else wmo.NO_ICON
+
+def center(tft, text):
+    return (tft.width() - len(text) * font.WIDTH) // 2
+
+def draw_reading(tft, weather):
+    # Temperature conversion and unit
+    temp = weather['temp']
+    display_temp = (temp * 9/5) + 32 if weather['unit'] == "F" else temp
+    unit_char = "F" if weather['unit'] == "F" else "C"
+    humidity = weather['humidity']
+
+    # Humidity & Temperature display
+    hum_text = f"{'N/A' if humidity is None else humidity}%/"
+    temp_text = f"{display_temp:.1f}{unit_char}"
+    x_pos = center(tft, hum_text + temp_text)
+    roundclip.text(tft, font, hum_text, x_pos, 45, gc9a01.WHITE)
+    temp_x = x_pos + len(hum_text) * font.WIDTH
+    roundclip.text(tft, font, temp_text, temp_x, 45, gc9a01.WHITE)
+
+def draw_city(tft, weather):
+    city = weather['city'][:15]
+    roundclip.text(tft, font, city, center(tft, city), 85, gc9a01.WHITE)
+
+def draw_condition(tft, weather):
+    condition = get_weather_condition(weather['code'])
+    roundclip.text(tft, font, condition, center(tft, condition), 125, gc9a01.WHITE)
+
+def draw_icon(tft, weather):
+    icon = get_weather_icon(weather['code'])
+    if icon == wmo.NO_ICON:
+        return
+    roundclip.jpg(tft, wmo.ICONS[icon], 80, 160, 75)
+
+def draw_chart(tft, weather):
+    # Re-blitted from cache; update_charts() rescales once per fetch
+    chart.draw(tft, CHART_X, CHART_Y)
+
+def draw_badge(tft, weather):
+    # Age of the data on screen while refreshes are failing
+    label = weather.get('age')
+    if label:
+        color = gc9a01.YELLOW if label[-1] == 'm' else gc9a01.RED
+        roundclip.text(tft, font, label, 158, 165, color)
+
+# Screen regions: model keys they depend on, box (x, y, width, height) and renderer
+REGIONS = (
+    (('hourly_temp', 'hourly_hum'), 0, CHART_Y, 240, chart.height, draw_chart),
+    (('humidity', 'temp', 'unit'), 0, 45, 240, font.HEIGHT, draw_reading),
+    (('city',), 0, 85, 240, font.HEIGHT, draw_city),
+    (('code',), 0, 125, 240, font.HEIGHT, draw_condition),
+    (('code',), 80, 160, 75, 75, draw_icon),
+    (('age',), 158, 165, 54, font.HEIGHT, draw_badge),
+)
+
+def display_weather_data(tft, weather, previous=None):
+    """Render a model.digest() result; with `previous`, redraw only what changed"""
+    # Decoding and drawing run at the burst clock
+    with governor.burst("render"):
+        try:
+            if previous is None:
+                roundclip.fill(tft, gc9a01.BLACK)
+            if not weather:
+                return
+            weather['unit'] = temperature_unit
+
+            for keys, x, y, width, height, draw in REGIONS:
+                if previous is not None:
+                    if all(weather.get(key) == previous.get(key) for key in keys):
+                        continue
+                    roundclip.fill_rect(tft, x, y, width, height, gc9a01.BLACK)
+                draw(tft, weather)
+                metrics.incr("region_draws")
+
+        except Exception as e:
+            print("Display error:", e)
+        finally:
+            gc.collect()
+
+def update_charts(weather):
+    """Scale the next hours of temperature and humidity once per fetch"""
+    chart.update(0, weather['hourly_temp'])
+    chart.update(1, weather['hourly_hum'])
+
+def save_frame(state, loc):
+    """Keep the model on screen in RTC memory for the next boot's first frame"""
+    state.model = loc.model
+    state.unit = temperature_unit
+    state.fetched = loc.fetched
+    if loc.lat is not None:
+        state.geo = {'lat': loc.lat, 'lon': loc.lon, 'city': loc.name or loc.model['city'], 'timezone': loc.tz}
+    rtcstate.save(state)
+
+def show_location(tft, loc, shown):
+    """Render a location from its cached model; returns the model on screen"""
+    global charted
+    if charted is not loc.model:
+        update_charts(loc.model)
+        charted = loc.model
+    weather = dict(loc.model, age=age_label(loc.fetched, time.time()))
+    display_weather_data(tft, weather, shown)
+    return weather
+
 def handle_touch(tft):
+    """Toggle the unit on a tap; returns 1 or -1 for a left or right swipe"""
     global temperature_unit, last_touch_time
-    if touch.get_touch():
+    if touch.mode == cst816.ALL_MODE:
+        # Gestures are reported on release: swipes switch location, taps toggle
+        gesture = touch.get_gesture()
+        if gesture == cst816.GESTURE_LEFT:
+            return 1
+        if gesture == cst816.GESTURE_RIGHT:
+            return -1
+        tapped = gesture == cst816.GESTURE_CLICK
+    else:
+        tapped = touch.get_touch()
+    if tapped:
         temperature_unit = "F" if temperature_unit == "C" else "C"
-        tft.fill(gc9a01.BLACK)
+        roundclip.fill(tft, gc9a01.BLACK)
         tft.text(font, "Changing to", 30, 90, gc9a01.WHITE)
         tft.text(font, f"{temperature_unit} on refresh", 20, 125, gc9a01.WHITE)
         last_touch_time = time.time()
         print(f"Changed unit to {temperature_unit}")
+    return 0
 
-def main():
-    global last_touch_time
+def apply_config(pm, rotation):
+    """Push reloaded settings into the running objects; returns the rotation"""
+    pm.dim_after = cfg.dim_after
+    pm.night_start, pm.night_end = cfg.night_hours
+    governor.start(cfg.cpu_idle_freq, cfg.cpu_burst_freq)
+    http.timeout = cfg.http_timeout
+    rotation.interval = cfg.rotate_interval
+    places = places_of(rotation)
+    if cfg.locations and cfg.locations != places:
+        rotation = locations.Rotation(cfg.locations, cfg.rotate_interval, time.time())
+        touch.set_mode(cst816.ALL_MODE if len(cfg.locations) > 1 else cst816.POINT_MODE)
+        configure_worker(rotation)
+    print("Config reloaded; pins, SPI and buffer sizes apply after a reset")
+    return rotation
+
+def places_of(rotation):
+    return [(loc.name, loc.lat, loc.lon, loc.tz) for loc in rotation.locations]
 
-    # Display initialization
-    spi = SPI(2, baudrate=80000000, polarity=0, sck=Pin(10), mosi=Pin(11))
-    tft = gc9a01.GC9A01(
+def configure_worker(rotation):
+    """Have the worker refresh the places of a (new) UI rotation"""
+    global net_pending
+    net_pending = places_of(rotation)
+    net_worker.kick()
+
+def start_worker(rotation, pm):
+    """Hand the network over to a worker thread once boot is done"""
+    global net_worker, net_rotation, time_synced
+    net_rotation = locations.Rotation(places_of(rotation))
+    for mine, theirs in zip(net_rotation.locations, rotation.locations):
+        mine.model, mine.deadline, mine.fetched = theirs.model, theirs.deadline, theirs.fetched
+    time_synced = time.time()
+    net_worker = worker.Worker("net", network_job, pm.wake)
+    net_worker.start()
+
+def start_exporter(pm, state):
+    """Serve /metrics and /state between the wait slices of the UI thread"""
+    import exporter
+    server = exporter.Server(cfg.metrics_port, state)
+    server.add("i2c_transactions_total", lambda: touch.transactions, 'counter')
+    server.add("i2c_errors_total", lambda: touch.bus_errors, 'counter')
+    server.add("wifi_rssi_dbm", wifi_rssi)
+    server.add("cpu_freq_hz", machine.freq)
+    try:
+        server.start()
+    except OSError as e:
+        print("Metrics server error:", e)
+        return None
+    pm.idle = server.poll
+    return server
+
+def wifi_rssi():
+    wlan = network.WLAN(network.STA_IF)
+    return wlan.status('rssi') if wlan.isconnected() else None
+
+def ui_state(rotation):
+    """The cached weather of every location, for /state"""
+    return {
+        'unit': temperature_unit,
+        'current': rotation.index,
+        'locations': [{'name': loc.name, 'fetched': loc.fetched, 'weather': loc.model}
+                      for loc in rotation.locations],
+    }
+
+def network_job(now):
+    """Worker job: keep Wi-Fi up, refresh due locations, publish the models.
+
+    Returns the time.time() of the next run.
+    """
+    global net_rotation, net_pending, time_synced
+    if net_pending is not None:
+        net_rotation = locations.Rotation(net_pending)
+        net_pending = None
+
+    # Wi-Fi watchdog: reconnect after a drop or light sleep (which Wi-Fi
+    # does not survive), backing off while it keeps failing
+    if not network.WLAN(network.STA_IF).isconnected():
+        if not netguard.allow('wifi', now):
+            return netguard.retry_at('wifi')
+        if not connect_wifi():
+            netguard.failure('wifi', now)
+            return netguard.retry_at('wifi')
+        netguard.success('wifi')
+
+    due = net_rotation.due(now)
+    if due:
+        refresh_locations(due, now)
+        net_worker.publish((places_of(net_rotation),
+                            [(loc.model, loc.fetched) for loc in net_rotation.locations]))
+
+    tz = net_rotation.locations[0].tz
+    if not cfg.proxy_url and tz and now >= time_synced + TIME_RESYNC:
+        # On a client of its own: a day-long keep-alive to the time API would
+        # hold a TLS socket and its buffers until the next sync
+        with_small_client(sync_time, tz)
+        time_synced = now
+    return min(net_rotation.next_deadline(), time_synced + TIME_RESYNC)
+
+def apply_updates(rotation, update):
+    """Take a worker publish into the UI rotation; True if the current model changed"""
+    places, entries = update
+    if places != places_of(rotation):
+        return False  # published before a config change
+    changed = False
+    for loc, (model, fetched) in zip(rotation.locations, entries):
+        if model is not loc.model:
+            loc.model = model
+            changed = changed or loc is rotation.current()
+        loc.fetched = fetched
+    return changed
+
+def init_touch():
+    """Start the CST816 reset; call touch.ready() at least 50 ms later"""
+    i2c = I2C(0, scl=Pin(cfg.touch_scl), sda=Pin(cfg.touch_sda), freq=cfg.touch_freq)
+    return cst816.CST816(i2c, cfg.touch_rst, wait=False)
+
+def draw_splash(tft):
+    """First frame, shown while the network comes up"""
+    roundclip.fill(tft, gc9a01.BLACK)
+    roundclip.text(tft, font, "Weather", center(tft, "Weather"), 90, gc9a01.WHITE)
+    roundclip.text(tft, font, "Connecting", center(tft, "Connecting"), 125, gc9a01.CYAN)
+
+def show_error(tft, message):
+    roundclip.fill(tft, gc9a01.BLACK)
+    roundclip.text(tft, font, message, center(tft, message), 100, gc9a01.RED)
+
+def make_display(spi, buffer_size):
+    return gc9a01.GC9A01(
         spi,
         240,
         240,
-        reset=Pin(14, Pin.OUT),
-        cs=Pin(9, Pin.OUT),
-        dc=Pin(8, Pin.OUT),
-        backlight=Pin(2, Pin.OUT),
+        reset=Pin(cfg.lcd_rst, Pin.OUT, value=1, hold=False),
+        cs=Pin(cfg.lcd_cs, Pin.OUT, value=1, hold=False),
+        dc=Pin(cfg.lcd_dc, Pin.OUT),
         rotation=0,
-        buffer_size=32*32*2
+        buffer_size=buffer_size
     )
-    tft.init()
-    tft.fill(gc9a01.BLACK)
 
-    # Network connection
-    if not connect_wifi():
-        tft.text(font, "Wi-Fi Failed", 40, 100, gc9a01.RED)
-        return
+def init_display(reset_panel=True):
+    """Create the display driver; skip the panel reset to keep its GRAM.
 
-    # Get location data
-    geo_data = fetch_geolocation()
-    if not geo_data:
-        tft.text(font, "Geo Failed", 40, 100, gc9a01.RED)
-        return
+    With spi_autotune the SPI clock and buffer size come from the saved
+    calibration; a cold start without one calibrates first.
+    """
+    pins = (cfg.spi_sck, cfg.spi_mosi, cfg.lcd_cs, cfg.lcd_dc)
+    tuned = calibrate.load(pins) if cfg.spi_autotune else None
+    baud, size = tuned or (cfg.spi_baud, cfg.lcd_buffer_size)
+    spi = SPI(2, baudrate=baud, polarity=0, sck=Pin(cfg.spi_sck), mosi=Pin(cfg.spi_mosi))
+    tft = make_display(spi, size)
+    if reset_panel:
+        tft.init()
+        if cfg.spi_autotune and not tuned:
+            tuned = calibrate.run(spi, lambda size: make_display(spi, size), pins)
+            baud, size = tuned or (cfg.spi_baud, cfg.lcd_buffer_size)
+            spi.init(baudrate=baud)
+            tft = make_display(spi, size)
+    return tft
+
+def battery_cycle():
+    """One battery wake cycle: show cached state, refresh if due, deep sleep.
+
+    Runs once per boot. State lives in RTC memory between cycles, the panel
+    keeps its GRAM in display sleep so only changed regions are redrawn, and
+    the time from boot to deep sleep is bounded by the battery_awake_budget setting.
+    """
+    global temperature_unit
+    import esp32
+    metrics.reset_phases()
+    budget_ms = cfg.battery_awake_budget * 1000
+    # Safety net: a hung network call resets the board instead of draining
+    # it. The budget is only checked between steps, so the watchdog is fed
+    # before each one and outlasts the slowest: the Wi-Fi wait, or a request
+    # that times out connecting and again receiving
+    step_ms = max(WIFI_TIMEOUT, 2 * cfg.http_timeout) * 1000 + 5000
+    wdt = machine.WDT(timeout=max(step_ms, budget_ms + 5000))
+
+    # Each wake fetches new weather; the flash copy only needs to be recent
+    # enough to start from after a power cycle
+    kvstore.store().min_interval = cfg.battery_save_interval
+
+    state = None
+    if machine.reset_cause() == machine.DEEPSLEEP_RESET:
+        state = rtcstate.load()
+    warm = state is not None
+    # After a power cycle the flash copy still has the location and unit
+    state = state or rtcstate.restore() or rtcstate.State()
+    temperature_unit = state.unit
+    touched = not warm or machine.wake_reason() == machine.EXT0_WAKE
+
+    # The panel sat in display sleep with reset and CS held high
+    tft = init_display(reset_panel=not warm)
+    tft.sleep_mode(False)
+    backlight = Pin(cfg.backlight_pin, Pin.OUT, value=1 if touched else 0, hold=False)
+    metrics.mark("display")
+
+    shown = None
+    if state.model:
+        if not warm:
+            update_charts(state.model)
+            display_weather_data(tft, state.model)
+        shown = dict(state.model, unit=state.unit)
+    metrics.mark("cached")
+
+    now = time.time()
+    if not state.model or now - state.fetched >= cfg.battery_refresh - 30:
+        lease = state.lease if now - state.lease_time < cfg.lease_max_age else None
+        wdt.feed()
+        if connect_wifi(lease):
+            metrics.mark("wifi")
+            if not lease:
+                state.lease = network.WLAN(network.STA_IF).ifconfig()
+                state.lease_time = now
+            if not cfg.proxy_url and not state.geo and metrics.elapsed_ms() < budget_ms:
+                wdt.feed()
+                geo_data = fetch_geolocation()
+                if geo_data:
+                    state.geo = {
+                        'lat': geo_data.get('lat'), 'lon': geo_data.get('lon'),
+                        'city': geo_data.get('city', 'Unknown'),
+                        'timezone': geo_data.get('timezone', ''),
+                    }
+                    metrics.mark("geo")
+            if not cfg.proxy_url and state.geo and RTC().datetime()[0] < 2024 and metrics.elapsed_ms() < budget_ms:
+                wdt.feed()
+                sync_time(state.geo['timezone'])
+                metrics.mark("time")
+            if (cfg.proxy_url or state.geo) and metrics.elapsed_ms() < budget_ms:
+                geo = state.geo or {}
+                wdt.feed()
+                weather = refresh_weather(geo.get('lat'), geo.get('lon'), geo)
+                metrics.mark("fetch")
+                if weather is NOT_MODIFIED or weather and weather == state.model:
+                    state.fetched = time.time()
+                elif weather:
+                    if cfg.proxy_url:
+                        # Keep the proxy's location so the city survives deep sleep
+                        state.geo = {k: weather[k] for k in ('lat', 'lon', 'city', 'timezone')}
+                    update_charts(weather)
+                    display_weather_data(tft, weather, shown)
+                    state.model = weather
+                    state.fetched = time.time()
+                    shown = dict(weather)
+                    metrics.mark("render")
+                else:
+                    # The cached address may be stale, fall back to DHCP next time
+                    state.lease = None
+        else:
+            state.lease = None
+    wdt.feed()
+
+    # After a touch wake keep the screen lit briefly; taps toggle the unit
+    touch.ready()
+    if touched and shown:
+        show_until = metrics.elapsed_ms() + cfg.battery_show * 1000
+        while metrics.elapsed_ms() < min(show_until, budget_ms):
+            if touch.get_touch():
+                previous = dict(shown)
+                temperature_unit = "F" if temperature_unit == "C" else "C"
+                display_weather_data(tft, shown, previous)
+                time.sleep_ms(300)
+            time.sleep_ms(50)
 
-    # Extract coordinates
-    lat = geo_data.get('lat') or geo_data.get('latitude')
-    lon = geo_data.get('lon') or geo_data.get('longitude')
-    tz = geo_data.get('timezone')
-    if None in (lat, lon, tz):
-        tft.text(font, "Invalid Data", 40, 100, gc9a01.RED)
+    # Bookkeeping for the awake-time report
+    awake_ms = metrics.mark("save")
+    day = time.time() // 86400
+    if state.day != day:
+        state.day = day
+        state.awake_today_ms = 0
+    state.awake_today_ms += awake_ms
+    state.last_awake_ms = awake_ms
+    state.cycles += 1
+    state.unit = temperature_unit
+    rtcstate.save(state)
+
+    next_fetch = state.fetched + cfg.battery_refresh - time.time()
+    sleep_s = int(min(max(next_fetch, 60), cfg.battery_refresh))
+    metrics.report()
+    print(f"Awake {awake_ms} ms, {state.awake_today_ms // 1000} s today; sleeping {sleep_s} s")
+
+    # Keep the panel image and its control lines through deep sleep; a touch
+    # pulls the CST816 IRQ line low and wakes the board, which the controller
+    # still detects in its low-power scan
+    touch.set_profile(cst816.LOW_POWER)
+    tft.sleep_mode(True)
+    backlight(0)
+    Pin(cfg.lcd_rst, Pin.OUT, value=1, hold=True)
+    Pin(cfg.lcd_cs, Pin.OUT, value=1, hold=True)
+    Pin(cfg.backlight_pin, Pin.OUT, value=0, hold=True)
+    esp32.wake_on_ext0(pin=Pin(cfg.touch_irq_pin, Pin.IN, Pin.PULL_UP), level=esp32.WAKEUP_ALL_LOW)
+    kvstore.flush()
+    machine.deepsleep(int(sleep_s * 1000))
+
+def with_small_client(fn, *args):
+    """Run fn(*args, client=...) on a small client of its own, closed after"""
+    client = httpclient.HTTPClient(2048, cfg.http_timeout)
+    try:
+        return fn(*args, client=client)
+    finally:
+        # Frees the keep-alive socket (and its TLS buffers) right away rather
+        # than at the next collection, while the weather fetch needs the heap
+        client.close()
+
+def boot_network(state):
+    """Geolocation, time sync and first fetch, overlapped on threads.
+
+    Returns the rotation, or None with an error message.
+    """
+    # Geolocation and time get small clients of their own; the weather
+    # fetch uses the shared client so its connection stays open afterwards
+    geo_task = time_task = None
+    geo = state.geo
+    if cfg.locations:
+        # Configured places need no geolocation; the clock follows the first
+        places = cfg.locations
+        if not cfg.proxy_url:
+            time_task = tasks.Task("time", with_small_client, sync_time, cfg.locations[0][3])
+    elif cfg.proxy_url:
+        # The proxy geolocates and keeps time for the whole fleet
+        places = [(None, None, None)]
+    else:
+        if not geo:
+            geo_task = tasks.Task("geo", with_small_client, fetch_geolocation)
+        # Without a cached timezone worldtimeapi goes by the caller's IP, so
+        # time sync need not wait for the geolocation
+        time_task = tasks.Task("time", with_small_client, sync_time, geo and geo['timezone'])
+        if geo_task:
+            geo = geo_task.join()
+            metrics.mark("geo")
+            if not geo:
+                return None, "Geo Failed"
+        lat = geo.get('lat') or geo.get('latitude')
+        lon = geo.get('lon') or geo.get('longitude')
+        tz = geo.get('timezone')
+        if None in (lat, lon, tz):
+            return None, "Invalid Data"
+        places = [(geo.get('city', 'Unknown'), lat, lon, tz)]
+
+    now, ticks = time.time(), time.ticks_ms()
+    rotation = locations.Rotation(places, cfg.rotate_interval, now)
+    refresh_locations(rotation.locations, now)
+    metrics.mark("weather")
+    if time_task:
+        time_task.join()
+        metrics.mark("time")
+        # On a cold boot the stamps above came from the unset clock if the
+        # sync finished last; move them by however far it stepped the clock
+        shift = time.time() - now - time.ticks_diff(time.ticks_ms(), ticks) // 1000
+        if abs(shift) > 2:
+            rotation.rebase(shift)
+    return rotation, None
+
+def main():
+    global last_touch_time, touch, temperature_unit
+
+    # Idle at the lowest clock; parsing and drawing raise it for their burst
+    governor.start(cfg.cpu_idle_freq, cfg.cpu_burst_freq)
+
+    # Start the touch reset and Wi-Fi association; both run while the panel
+    # initializes and the cached frame is drawn
+    touch = init_touch()
+
+    if cfg.battery_mode:
+        battery_cycle()
         return
 
-    # Time synchronization
-    sync_time(tz)
+    wlan = start_wifi()
+    metrics.mark("wifi_start")
+    tft = init_display()
+    metrics.mark("display")
+
+    # After a reset RTC memory still holds the last frame, after a power
+    # cycle flash does; else a splash
+    state = rtcstate.load() or rtcstate.restore() or rtcstate.State()
+    temperature_unit = state.unit
+    shown = None  # model currently on screen, for partial redraws
+    if state.model:
+        update_charts(state.model)
+        shown = dict(state.model, age=age_label(state.fetched, time.time()))
+        display_weather_data(tft, shown)
+        metrics.mark("cached")
+    else:
+        draw_splash(tft)
+        metrics.mark("splash")
+    touch.ready()
+
+    # Backlight PWM, dimming and overnight sleep; touches raise the IRQ line
+    pm = power.PowerManager(
+        tft,
+        Pin(cfg.backlight_pin, Pin.OUT),
+        Pin(cfg.touch_irq_pin, Pin.IN, Pin.PULL_UP),
+        dim_after=cfg.dim_after,
+        night=cfg.night_hours,
+        touch=touch
+    )
+    touch.set_mode(cst816.POINT_MODE)
+    metrics.mark("touch")
+
+    # Network connection; retried with backoff rather than given up, and a
+    # cached frame stays on screen (with its age) meanwhile
+    rotation = None
+    attempt = 0
+    while rotation is None:
+        if wait_wifi(wlan):
+            metrics.mark("wifi")
+            rotation, error = boot_network(state)
+        else:
+            error = "Wi-Fi Failed"
+        if rotation is None:
+            attempt += 1
+            delay = netguard.backoff(attempt, cfg.retry_interval)
+            print(f"{error}, retrying in {delay}s")
+            if state.model:
+                weather = dict(state.model, age=age_label(state.fetched, time.time()))
+                display_weather_data(tft, weather, shown)
+                shown = weather
+            else:
+                show_error(tft, error)
+            pm.poll_touch()
+            pm.update()
+            pm.wait(delay * 1000)
+            if not wlan.isconnected():
+                wlan = start_wifi()
+
+    # The dim timeout runs from the live frame; the clock may have been set
+    # since the power manager took its first stamp
+    pm.last_activity = time.time()
+
+    loc = rotation.current()
+    if not loc.model and state.model and (len(rotation.locations) == 1 or loc.name == state.model['city']):
+        # First fetch failed: keep serving the cached frame until one works
+        loc.model = state.model
+        loc.fetched = state.fetched
+    if len(rotation.locations) > 1:
+        # Swipes switch location, taps toggle the unit
+        touch.set_mode(cst816.ALL_MODE)
+    if rotation.current().model:
+        shown = show_location(tft, rotation.current(), shown)
+        save_frame(state, rotation.current())
+        metrics.mark("live_frame")
+    # Boot-phase timing: the live frame should take about as long as the
+    # slowest network step, not their sum
+    metrics.report()
+
+    # From here on the network belongs to the worker thread; this thread only
+    # renders and handles touch, and answers metrics scrapes while it waits
+    start_worker(rotation, pm)
+    if cfg.metrics_port:
+        start_exporter(pm, lambda: ui_state(rotation))
+    seen = 0  # mailbox sequence last applied
 
     # Main loop
-    last_update = 0
+    errors = 0  # consecutive loop exceptions, for the backoff
     while True:
         try:
             now = time.time()
             
             # Clear touch message after 2 seconds
             if last_touch_time and (now - last_touch_time > 2):
-                tft.fill(gc9a01.BLACK)
+                roundclip.fill(tft, gc9a01.BLACK)
                 last_touch_time = None
+                shown = None
                 
-            # Handle user input
-            handle_touch(tft)
-            
-            # Update weather every 60 seconds
-            if now - last_update >= 60:
-                if weather := fetch_weather_data(lat, lon):
-                    display_weather_data(tft, weather, geo_data)
-                    last_update = now
-                else:
-                    print("Weather update failed")
-                
-            time.sleep(0.1)
+            # Handle user input; a touch that only wakes the screen is not a toggle
+            if pm.poll_touch() and not pm.activity():
+                step = handle_touch(tft)
+                if step and rotation.step(step, now):
+                    shown = show_location(tft, rotation.current(), shown)
+                elif last_touch_time:
+                    shown = None  # the unit message replaced the readings
+                    state.unit = temperature_unit
+                    rtcstate.save(state)
+
+            # Pick up edits to config.txt without a reboot
+            if config.reload(cfg):
+                rotation = apply_config(pm, rotation)
+                shown = None
+
+            asleep = pm.update() == power.SLEEP
+
+            # No refreshes while the display sleeps: light sleep stops both
+            # cores, so let the worker finish its request first
+            if asleep and not net_worker.paused:
+                if not net_worker.pause():
+                    print("Worker still busy, light sleep postponed")
+            elif not asleep and net_worker.paused:
+                net_worker.resume()
+            # Light sleep would stop a request that outlived pause() midway
+            pm.hold = asleep and net_worker.busy
+
+            # Take whatever the worker fetched since the last pass
+            seq, update = net_worker.mailbox.read()
+            if seq != seen:
+                seen = seq
+                if apply_updates(rotation, update):
+                    save_frame(state, rotation.current())
+                    shown = None if asleep else show_location(tft, rotation.current(), shown)
+
+            if not asleep:
+                # Timed rotation renders the next location from its cache
+                rotate_at = rotation.rotate_at()
+                if rotate_at and now >= rotate_at and not last_touch_time:
+                    if rotation.step(1, now):
+                        shown = show_location(tft, rotation.current(), shown)
+
+                # Redraw from the cache once the screen has been cleared, and
+                # the age badge when it changes
+                current = rotation.current()
+                if not last_touch_time and current.model:
+                    if shown is None or shown.get('age') != age_label(current.fetched, now):
+                        shown = show_location(tft, current, shown)
+
+            # Sleep until the next rotation, message expiry or dimming; a
+            # worker publish ends the wait early
+            deadline = now + cfg.refresh_interval
+            if not asleep and rotation.rotate_at():
+                deadline = min(deadline, rotation.rotate_at())
+            if not asleep and shown and shown.get('age'):
+                deadline = min(deadline, now + 60)
+            if last_touch_time:
+                deadline = min(deadline, last_touch_time + 3)
+            if pm.state == power.ACTIVE:
+                deadline = min(deadline, pm.last_activity + cfg.dim_after)
+            pm.wait(int(max(deadline - time.time(), 0.1) * 1000))
+            # Cached state reaches flash at most every kvstore.MIN_INTERVAL
+            kvstore.flush()
             gc.collect()
+            errors = 0
             
         except Exception as e:
+            # A persistent fault must not turn into a tight exception loop
+            errors += 1
             print("Main loop error:", e)
-            time.sleep(5)
+            time.sleep(netguard.backoff(errors, 5, 300))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,106 @@
+"""
+`metrics`
+================================================================================
+
+Lightweight instrumentation shared by the app modules.
+
+* ``incr`` bumps a named counter.
+* ``observe`` records a duration in a fixed-bucket histogram, ``timer`` is the
+  context manager form.
+* ``mark`` records a named phase with the milliseconds since boot, used for
+  boot and wake-cycle timing reports.
+* ``event`` appends to a small ring of recent transitions.
+
+Everything lives in module-level dicts so any module can record without
+passing objects around, and ``report`` prints a summary to the serial console.
+"""
+
+import time
+
+# Histogram bucket upper bounds in milliseconds
+BUCKETS = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Number of recent events kept
+EVENT_RING = 32
+
+counters = {}
+histograms = {}  # name -> [count, total_ms, max_ms, bucket counts..., overflow]
+phases = []  # (name, ms since start)
+events = []  # (ticks_ms, name, value)
+
+_start = time.ticks_ms()
+
+
+def reset_phases():
+    """Start a new phase timeline (boot or wake cycle) from now"""
+    global _start
+    _start = time.ticks_ms()
+    phases.clear()
+
+
+def elapsed_ms():
+    """Milliseconds since the current phase timeline started"""
+    return time.ticks_diff(time.ticks_ms(), _start)
+
+
+def mark(name):
+    """Record that the phase `name` finished now"""
+    ms = elapsed_ms()
+    phases.append((name, ms))
+    return ms
+
+
+def incr(name, n=1):
+    counters[name] = counters.get(name, 0) + n
+
+
+def observe(name, ms):
+    hist = histograms.get(name)
+    if hist is None:
+        hist = histograms[name] = [0, 0, 0] + [0] * (len(BUCKETS) + 1)
+    hist[0] += 1
+    hist[1] += ms
+    if ms > hist[2]:
+        hist[2] = ms
+    for i, bound in enumerate(BUCKETS):
+        if ms <= bound:
+            hist[3 + i] += 1
+            return
+    hist[-1] += 1
+
+
+def event(name, value=None):
+    if len(events) >= EVENT_RING:
+        events.pop(0)
+    events.append((time.ticks_ms(), name, value))
+
+
+class timer:
+    """Context manager that observes the duration of its block"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.ticks_ms()
+        return self
+
+    def __exit__(self, *exc):
+        self.ms = time.ticks_diff(time.ticks_ms(), self.start)
+        observe(self.name, self.ms)
+        return False
+
+
+def report():
+    """Print phases, counters and histogram summaries"""
+    if phases:
+        last = 0
+        print("Phases (ms):")
+        for name, ms in phases:
+            print("  %-14s %6d  +%d" % (name, ms, ms - last))
+            last = ms
+    for name in sorted(counters):
+        print("  %-22s %d" % (name, counters[name]))
+    for name in sorted(histograms):
+        hist = histograms[name]
+        print("  %-22s n=%d avg=%dms max=%dms" % (name, hist[0], hist[1] // max(hist[0], 1), hist[2]))
@@ -0,0 +1,57 @@
+"""
+`model`
+================================================================================
+
+Compact weather model.
+
+``digest`` turns the Open-Meteo and ip-api responses into the small dict the
+display code renders from. The same dict is what gets cached across deep sleep,
+so the screen can be redrawn without keeping the raw JSON around.
+"""
+
+# Hours of forecast kept for the chart
+HOURS = 24
+
+
+def truncate_to_hour(time_str):
+    """Truncate time string to hourly format (YYYY-MM-DDTHH:00)"""
+    try:
+        date_part, time_part = time_str.split('T', 1)
+        time_part = time_part.split('+')[0].split('-')[0]
+        hour = time_part.split(':')[0]
+        return f"{date_part}T{hour}:00"
+    except:
+        return time_str
+
+
+def current_hour_index(hourly, current_time):
+    """Index of the hourly entry matching current_time, or None"""
+    hour = truncate_to_hour(current_time)
+    for i, t in enumerate(hourly.get('time', [])):
+        if truncate_to_hour(t) == hour:
+            return i
+    return None
+
+
+def digest(weather_data, geo_data):
+    """Reduce the API responses to the fields the display needs"""
+    current = weather_data['current_weather']
+    hourly = weather_data.get('hourly', {})
+    humidities = hourly.get('relativehumidity_2m', [])
+    idx = current_hour_index(hourly, current['time'])
+
+    try:
+        humidity = humidities[idx]
+    except (TypeError, IndexError):
+        humidity = humidities[0] if humidities else None
+
+    start = idx or 0
+    return {
+        'temp': current['temperature'],
+        'code': current['weathercode'],
+        'humidity': humidity,
+        'time': current['time'],
+        'city': geo_data.get('city', 'Unknown'),
+        'hourly_temp': hourly.get('temperature_2m', [])[start:start + HOURS],
+        'hourly_hum': humidities[start:start + HOURS],
+    }
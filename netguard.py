@@ -0,0 +1,101 @@
+"""
+`netguard`
+================================================================================
+
+Circuit breakers and backoff for the network calls.
+
+Each endpoint (``geo``, ``time``, ``weather``, ``proxy``, ``wifi``) has a
+breaker. The first few failures are retried after the base interval; once
+``threshold`` failures in a row have been seen the breaker opens and calls
+are refused without touching the network until a retry time that doubles
+with every further failure, up to ``cap``. The first call after that time is
+a trial: success closes the breaker, failure opens it again for longer.
+
+Breakers live in a module-level dict like the ``metrics`` counters, so the
+fetchers only need the endpoint name.
+"""
+
+import time
+import metrics
+
+THRESHOLD = 3  # failures in a row before the breaker opens
+BASE = 10  # seconds before retrying while closed, and the first open interval
+CAP = 600  # longest open interval, seconds
+
+
+def backoff(attempt, base=BASE, cap=CAP):
+    """Bounded exponential delay in seconds for the 1-based attempt number"""
+    return min(cap, base << min(max(attempt - 1, 0), 16))
+
+
+class Breaker:
+    """Failure count and retry time for one endpoint."""
+
+    def __init__(self, name, threshold=THRESHOLD, base=BASE, cap=CAP):
+        self.name = name
+        self.threshold = threshold
+        self.base = base
+        self.cap = cap
+        self.failures = 0
+        self.retry_at = 0
+
+    def is_open(self):
+        return self.failures >= self.threshold
+
+    def allow(self, now):
+        """True if a call may go out now (closed, or open with the retry due)"""
+        return now >= self.retry_at
+
+    def success(self):
+        if self.is_open():
+            metrics.event("breaker_close", self.name)
+        self.failures = 0
+        self.retry_at = 0
+
+    def failure(self, now):
+        self.failures += 1
+        if self.failures < self.threshold:
+            self.retry_at = now + self.base
+            return
+        if self.failures == self.threshold:
+            metrics.event("breaker_open", self.name)
+            metrics.incr("breaker_opens")
+        self.retry_at = now + backoff(self.failures - self.threshold + 1, self.base, self.cap)
+
+
+_breakers = {}
+
+
+def breaker(name):
+    b = _breakers.get(name)
+    if b is None:
+        b = _breakers[name] = Breaker(name)
+    return b
+
+
+def allow(name, now=None):
+    """True if endpoint `name` may be called now; counts refused calls"""
+    if breaker(name).allow(time.time() if now is None else now):
+        return True
+    metrics.incr("breaker_refused")
+    return False
+
+
+def success(name):
+    breaker(name).success()
+
+
+def failure(name, now=None):
+    breaker(name).failure(time.time() if now is None else now)
+
+
+def retry_at(name):
+    """time.time() from which `name` may be called again (0 if now)"""
+    return breaker(name).retry_at
+
+
+def report():
+    for name in sorted(_breakers):
+        b = _breakers[name]
+        state = "open" if b.is_open() else "closed"
+        print("  %-8s %-6s failures=%d retry_at=%d" % (name, state, b.failures, b.retry_at))
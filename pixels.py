@@ -0,0 +1,355 @@
+"""
+`pixels`
+================================================================================
+
+Per-pixel loops for rendering done in Python rather than the display driver.
+
+* ``expand_glyph`` turns a 1-bit MSB-first bitmap (a ``bitmap/`` font glyph)
+  into big-endian RGB565 pixels.
+* ``expand_palette`` maps 8-bit palette indices to RGB565 pixels.
+* ``rle_decode`` expands ``(count, high, low)`` runs into RGB565 pixels.
+* ``fill`` sets every pixel of a buffer to one colour.
+* ``line`` draws a Bresenham line into an RGB565 tile; ``sparkline`` uses it
+  and ``fill`` to rasterize the chart.
+
+Every routine has three variants with the same arguments and results: a
+``@micropython.viper`` one working on raw pointers, a ``@micropython.native``
+one and plain Python. The best one that compiled is exported under the plain
+name; ``VARIANTS`` maps each routine to all of them for ``host/bench_pixels.py``.
+Viper functions take at most four arguments, so the two colours of a glyph
+travel packed as ``fg << 16 | bg`` and the end points of a line as one byte
+per coordinate (see ``ends``), so lines stay within 256 x 256. ``ends`` also
+clamps them to the tile, since ``line`` itself does no bounds checks. Under
+CPython only the Python and (no-op) native variants exist.
+"""
+
+import micropython
+
+
+def _expand_glyph_py(src, dst, n, colors):
+    """Expand n bits of src (MSB first) into n RGB565 pixels in dst"""
+    fh = (colors >> 24) & 0xFF
+    fl = (colors >> 16) & 0xFF
+    bh = (colors >> 8) & 0xFF
+    bl = colors & 0xFF
+    j = 0
+    for i in range(n):
+        if src[i >> 3] & (0x80 >> (i & 7)):
+            dst[j] = fh
+            dst[j + 1] = fl
+        else:
+            dst[j] = bh
+            dst[j + 1] = bl
+        j += 2
+
+
+@micropython.native
+def _expand_glyph_native(src, dst, n, colors):
+    fh = (colors >> 24) & 0xFF
+    fl = (colors >> 16) & 0xFF
+    bh = (colors >> 8) & 0xFF
+    bl = colors & 0xFF
+    j = 0
+    for i in range(n):
+        if src[i >> 3] & (0x80 >> (i & 7)):
+            dst[j] = fh
+            dst[j + 1] = fl
+        else:
+            dst[j] = bh
+            dst[j + 1] = bl
+        j += 2
+
+
+def _expand_palette_py(src, dst, n, palette):
+    """Map n 8-bit indices in src through the RGB565 palette bytes into dst"""
+    j = 0
+    for i in range(n):
+        k = src[i] << 1
+        dst[j] = palette[k]
+        dst[j + 1] = palette[k + 1]
+        j += 2
+
+
+@micropython.native
+def _expand_palette_native(src, dst, n, palette):
+    j = 0
+    for i in range(n):
+        k = src[i] << 1
+        dst[j] = palette[k]
+        dst[j + 1] = palette[k + 1]
+        j += 2
+
+
+def _rle_decode_py(src, dst, n, limit):
+    """Expand the runs in src[:n] into at most limit bytes of dst; returns pixels"""
+    j = 0
+    for i in range(0, n - 2, 3):
+        hi = src[i + 1]
+        lo = src[i + 2]
+        for _ in range(src[i]):
+            if j >= limit:
+                return j >> 1
+            dst[j] = hi
+            dst[j + 1] = lo
+            j += 2
+    return j >> 1
+
+
+@micropython.native
+def _rle_decode_native(src, dst, n, limit):
+    j = 0
+    for i in range(0, n - 2, 3):
+        hi = src[i + 1]
+        lo = src[i + 2]
+        for _ in range(src[i]):
+            if j >= limit:
+                return j >> 1
+            dst[j] = hi
+            dst[j + 1] = lo
+            j += 2
+    return j >> 1
+
+
+def _fill_py(dst, n, color):
+    """Set n RGB565 pixels of dst to color"""
+    hi = (color >> 8) & 0xFF
+    lo = color & 0xFF
+    j = 0
+    for _ in range(n):
+        dst[j] = hi
+        dst[j + 1] = lo
+        j += 2
+
+
+@micropython.native
+def _fill_native(dst, n, color):
+    hi = (color >> 8) & 0xFF
+    lo = color & 0xFF
+    j = 0
+    for _ in range(n):
+        dst[j] = hi
+        dst[j + 1] = lo
+        j += 2
+
+
+def _line_py(dst, width, ends, color):
+    """Bresenham line between the packed end points in a tile width pixels wide"""
+    x0 = (ends >> 24) & 0xFF
+    y0 = (ends >> 16) & 0xFF
+    x1 = (ends >> 8) & 0xFF
+    y1 = ends & 0xFF
+    hi = (color >> 8) & 0xFF
+    lo = color & 0xFF
+    dx = x1 - x0 if x1 > x0 else x0 - x1
+    dy = y0 - y1 if y1 > y0 else y1 - y0
+    sx = 1 if x0 < x1 else -1
+    sy = 1 if y0 < y1 else -1
+    err = dx + dy
+    while True:
+        j = (y0 * width + x0) * 2
+        dst[j] = hi
+        dst[j + 1] = lo
+        if x0 == x1 and y0 == y1:
+            return
+        e2 = 2 * err
+        if e2 >= dy:
+            err += dy
+            x0 += sx
+        if e2 <= dx:
+            err += dx
+            y0 += sy
+
+
+@micropython.native
+def _line_native(dst, width, ends, color):
+    x0 = (ends >> 24) & 0xFF
+    y0 = (ends >> 16) & 0xFF
+    x1 = (ends >> 8) & 0xFF
+    y1 = ends & 0xFF
+    hi = (color >> 8) & 0xFF
+    lo = color & 0xFF
+    dx = x1 - x0 if x1 > x0 else x0 - x1
+    dy = y0 - y1 if y1 > y0 else y1 - y0
+    sx = 1 if x0 < x1 else -1
+    sy = 1 if y0 < y1 else -1
+    err = dx + dy
+    while True:
+        j = (y0 * width + x0) * 2
+        dst[j] = hi
+        dst[j + 1] = lo
+        if x0 == x1 and y0 == y1:
+            return
+        e2 = 2 * err
+        if e2 >= dy:
+            err += dy
+            x0 += sx
+        if e2 <= dx:
+            err += dx
+            y0 += sy
+
+
+try:
+    @micropython.viper
+    def _expand_glyph_viper(src: ptr8, dst: ptr8, n: int, colors: uint):
+        fh = int(colors >> 24) & 0xFF
+        fl = int(colors >> 16) & 0xFF
+        bh = int(colors >> 8) & 0xFF
+        bl = int(colors) & 0xFF
+        i = 0
+        j = 0
+        while i < n:
+            if src[i >> 3] & (0x80 >> (i & 7)):
+                dst[j] = fh
+                dst[j + 1] = fl
+            else:
+                dst[j] = bh
+                dst[j + 1] = bl
+            i += 1
+            j += 2
+
+    @micropython.viper
+    def _expand_palette_viper(src: ptr8, dst: ptr8, n: int, palette: ptr8):
+        i = 0
+        j = 0
+        while i < n:
+            k = src[i] << 1
+            dst[j] = palette[k]
+            dst[j + 1] = palette[k + 1]
+            i += 1
+            j += 2
+
+    @micropython.viper
+    def _rle_decode_viper(src: ptr8, dst: ptr8, n: int, limit: int) -> int:
+        i = 0
+        j = 0
+        while i + 2 < n:
+            count = src[i]
+            hi = src[i + 1]
+            lo = src[i + 2]
+            while count > 0 and j < limit:
+                dst[j] = hi
+                dst[j + 1] = lo
+                j += 2
+                count -= 1
+            if j >= limit:
+                break
+            i += 3
+        return j >> 1
+
+    @micropython.viper
+    def _fill_viper(dst: ptr8, n: int, color: int):
+        hi = (color >> 8) & 0xFF
+        lo = color & 0xFF
+        j = 0
+        end = n * 2
+        while j < end:
+            dst[j] = hi
+            dst[j + 1] = lo
+            j += 2
+
+    @micropython.viper
+    def _line_viper(dst: ptr8, width: int, ends: uint, color: int):
+        x0 = int(ends >> 24) & 0xFF
+        y0 = int(ends >> 16) & 0xFF
+        x1 = int(ends >> 8) & 0xFF
+        y1 = int(ends) & 0xFF
+        hi = (color >> 8) & 0xFF
+        lo = color & 0xFF
+        dx = x1 - x0
+        if dx < 0:
+            dx = -dx
+        dy = y1 - y0
+        if dy > 0:
+            dy = -dy
+        sx = 1
+        if x1 < x0:
+            sx = -1
+        sy = 1
+        if y1 < y0:
+            sy = -1
+        err = dx + dy
+        while True:
+            j = (y0 * width + x0) * 2
+            dst[j] = hi
+            dst[j + 1] = lo
+            if x0 == x1 and y0 == y1:
+                break
+            e2 = 2 * err
+            if e2 >= dy:
+                err += dy
+                x0 += sx
+            if e2 <= dx:
+                err += dx
+                y0 += sy
+
+    VIPER = True
+except NameError:
+    # CPython evaluates the ptr8/uint annotations and has no viper
+    VIPER = False
+
+VARIANTS = {
+    'expand_glyph': {'python': _expand_glyph_py, 'native': _expand_glyph_native},
+    'expand_palette': {'python': _expand_palette_py, 'native': _expand_palette_native},
+    'rle_decode': {'python': _rle_decode_py, 'native': _rle_decode_native},
+    'fill': {'python': _fill_py, 'native': _fill_native},
+    'line': {'python': _line_py, 'native': _line_native},
+}
+if VIPER:
+    VARIANTS['expand_glyph']['viper'] = _expand_glyph_viper
+    VARIANTS['expand_palette']['viper'] = _expand_palette_viper
+    VARIANTS['rle_decode']['viper'] = _rle_decode_viper
+    VARIANTS['fill']['viper'] = _fill_viper
+    VARIANTS['line']['viper'] = _line_viper
+
+# The fastest variant that compiled, under the plain names
+_best = 'viper' if VIPER else 'native'
+expand_glyph = VARIANTS['expand_glyph'][_best]
+expand_palette = VARIANTS['expand_palette'][_best]
+rle_decode = VARIANTS['rle_decode'][_best]
+fill = VARIANTS['fill'][_best]
+line = VARIANTS['line'][_best]
+
+
+def colors(fg, bg=0):
+    """Pack two RGB565 colours for expand_glyph"""
+    return (fg << 16) | bg
+
+
+def ends(x0, y0, x1, y1, width, height):
+    """Pack the end points of a line for line, clamped to a width x height tile.
+
+    The viper variant writes through a raw pointer, so a point outside the
+    tile would land in whatever memory follows it instead of raising.
+    """
+    if not 0 < width <= 256 or not 0 < height <= 256:
+        raise ValueError("tile must be 1-256 pixels on a side")
+    right = width - 1
+    bottom = height - 1
+    x0 = 0 if x0 < 0 else right if x0 > right else x0
+    x1 = 0 if x1 < 0 else right if x1 > right else x1
+    y0 = 0 if y0 < 0 else bottom if y0 > bottom else y0
+    y1 = 0 if y1 < 0 else bottom if y1 > bottom else y1
+    return (x0 << 24) | (y0 << 16) | (x1 << 8) | y1
+
+
+class GlyphBuffer:
+    """Reusable RGB565 buffer for expanding one glyph of a font at a time.
+
+    Font widths are multiples of 8, so glyph rows carry no padding bits.
+    """
+
+    def __init__(self, font):
+        self.font = font
+        self.stride = (font.WIDTH + 7) // 8 * font.HEIGHT  # bytes per glyph
+        self.pixels = font.WIDTH * font.HEIGHT
+        self.buf = bytearray(self.pixels * 2)
+        self._src = memoryview(font.FONT)
+
+    def render(self, char, colors):
+        """Expand `char` into the buffer; False if the font lacks it"""
+        index = ord(char) - self.font.FIRST
+        if index < 0 or ord(char) > self.font.LAST:
+            return False
+        offset = index * self.stride
+        expand_glyph(self._src[offset:offset + self.stride], self.buf, self.pixels, colors)
+        return True
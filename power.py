@@ -0,0 +1,151 @@
+"""
+`power`
+================================================================================
+
+Backlight and panel power management.
+
+The backlight is driven by PWM and dimmed after a period without touches.
+Overnight (by the RTC synced in ``sync_time``) the GC9A01 is put into display
+sleep, the backlight is switched off and the CPU waits in
+``machine.lightsleep`` until the next scheduled wake-up or a CST816 touch IRQ.
+The touch controller follows along: it scans at the full rate while the
+screen is active and drops to a low-power scan profile while it is dimmed
+or asleep, where a tap still raises the IRQ.
+"""
+
+import time
+from micropython import const
+from machine import Pin, PWM, RTC
+import machine
+import cst816
+
+ACTIVE = const(0)
+DIM = const(1)
+SLEEP = const(2)
+
+STATE_NAMES = ("active", "dim", "sleep")
+
+# CST816 scan profile for each state
+TOUCH_PROFILES = (cst816.RESPONSIVE, cst816.BALANCED, cst816.LOW_POWER)
+
+FULL_DUTY = const(65535)
+
+# Slice used while waiting with the backlight on; bounds touch latency
+_WAIT_SLICE_MS = const(100)
+
+
+class PowerManager:
+    """Idle dimming, overnight display sleep and touch wake-up."""
+
+    def __init__(self, tft, backlight, touch_irq, dim_after=30, dim_duty=6000,
+                 night=(23, 7), pwm_freq=1000, touch=None):
+        self.tft = tft
+        self.touch = touch
+        self.pwm = PWM(backlight, freq=pwm_freq, duty_u16=FULL_DUTY)
+        self.dim_after = dim_after
+        self.dim_duty = dim_duty
+        self.night_start, self.night_end = night
+        self.state = ACTIVE
+        self.touched = False
+        self.woken = False
+        self.idle = None  # called between wait slices, must not block
+        self.hold = False  # postpones light sleep while True
+        self.last_activity = time.time()
+        self.residency = [0, 0, 0]  # ms spent in each state
+        self._since = time.ticks_ms()
+
+        self.irq_pin = touch_irq
+        touch_irq.irq(trigger=Pin.IRQ_FALLING, handler=self._on_touch)
+        try:
+            import esp32
+            esp32.wake_on_ext0(pin=touch_irq, level=esp32.WAKEUP_ALL_LOW)
+        except (ImportError, ValueError) as e:
+            print("Touch wake unavailable:", e)
+
+    def _on_touch(self, pin):
+        self.touched = True
+
+    def poll_touch(self):
+        """Return True once for every touch IRQ since the last call"""
+        if self.touched:
+            self.touched = False
+            return True
+        return False
+
+    def activity(self):
+        """Register user activity; returns True if the screen had to wake up"""
+        self.last_activity = time.time()
+        if self.state == ACTIVE:
+            return False
+        self._enter(ACTIVE)
+        return True
+
+    def is_night(self):
+        """True during the overnight window, once the RTC has been synced"""
+        year, _, _, _, hour = RTC().datetime()[:5]
+        if year < 2024:
+            return False
+        if self.night_start > self.night_end:
+            return hour >= self.night_start or hour < self.night_end
+        return self.night_start <= hour < self.night_end
+
+    def update(self):
+        """Pick the state for the current time and idle period"""
+        idle = time.time() - self.last_activity
+        if idle < self.dim_after:
+            state = ACTIVE
+        elif self.is_night():
+            state = SLEEP
+        else:
+            state = DIM
+        if state != self.state:
+            self._enter(state)
+        return self.state
+
+    def _enter(self, state):
+        now = time.ticks_ms()
+        self.residency[self.state] += time.ticks_diff(now, self._since)
+        self._since = now
+        if self.state == SLEEP:
+            self.tft.sleep_mode(False)
+        if state == ACTIVE:
+            self.pwm.duty_u16(FULL_DUTY)
+        elif state == DIM:
+            self.pwm.duty_u16(self.dim_duty)
+        else:
+            self.pwm.duty_u16(0)
+            self.tft.sleep_mode(True)
+        if self.touch:
+            self.touch.set_profile(TOUCH_PROFILES[state])
+        print("Power state:", STATE_NAMES[state])
+        self.state = state
+
+    def wake(self):
+        """End the current (non-sleep) wait early; safe from another thread"""
+        self.woken = True
+
+    def wait(self, ms):
+        """Wait up to ms milliseconds, returning early on a touch or wake()"""
+        if self.state == SLEEP and not self.hold:
+            # PWM and Wi-Fi do not survive light sleep, which is fine while
+            # the backlight is off; the touch IRQ pin wakes the CPU (ext0)
+            machine.lightsleep(ms)
+            if machine.wake_reason() == machine.EXT0_WAKE:
+                self.touched = True
+            return
+        start = time.ticks_ms()
+        while not self.touched and not self.woken:
+            left = ms - time.ticks_diff(time.ticks_ms(), start)
+            if left <= 0:
+                break
+            if self.idle:
+                self.idle()
+            time.sleep_ms(min(left, _WAIT_SLICE_MS))
+        self.woken = False
+
+    def report(self):
+        """Milliseconds spent in each state so far"""
+        now = time.ticks_ms()
+        residency = list(self.residency)
+        residency[self.state] += time.ticks_diff(now, self._since)
+        return dict(zip(STATE_NAMES, residency))
@@ -0,0 +1,147 @@
+"""
+`roundclip`
+================================================================================
+
+Clipping helpers for the round 240x240 GC9A01 panel.
+
+Only the inscribed circle of the panel is visible, so roughly a fifth of a
+full-screen fill is spent on corner pixels nobody can see. A per-scanline span
+table for the visible circle is precomputed at import, and the fill, blit,
+JPG and text helpers here only push pixels that land inside those spans.
+The RGB565 bytes they push are counted in the ``spi_bytes`` metric (a JPG
+the driver decodes and draws itself is not).
+"""
+
+from array import array
+from math import sqrt
+import metrics
+
+SIZE = 240
+
+# First visible column and visible width for every scanline
+SPAN_X = array('B', [0] * SIZE)
+SPAN_W = array('B', [0] * SIZE)
+
+
+def _build_spans():
+    radius = SIZE / 2
+    for y in range(SIZE):
+        dy = y + 0.5 - radius
+        half = sqrt(max(radius * radius - dy * dy, 0))
+        x0 = int(radius - half + 0.5)
+        SPAN_X[y] = x0
+        SPAN_W[y] = SIZE - 2 * x0
+
+
+_build_spans()
+
+VISIBLE_PIXELS = sum(SPAN_W)
+
+
+def clip_row(y, x, w):
+    """Clip the row segment [x, x + w) on scanline y, return (x, w)"""
+    if y < 0 or y >= SIZE:
+        return x, 0
+    x0 = SPAN_X[y]
+    x1 = x0 + SPAN_W[y]
+    left = x if x > x0 else x0
+    right = x + w if x + w < x1 else x1
+    return left, (right - left if right > left else 0)
+
+
+def inside(x, y, w, h):
+    """True if the whole rectangle lies inside the visible circle"""
+    if y < 0 or y + h > SIZE:
+        return False
+    for row in (y, y + h - 1):
+        x0 = SPAN_X[row]
+        if x < x0 or x + w > x0 + SPAN_W[row]:
+            return False
+    # Span widths grow towards the centre, so the narrowest scanline of the
+    # rectangle is always its top or bottom edge
+    return True
+
+
+def visible(x, y, w, h):
+    """True if any part of the rectangle lies inside the visible circle"""
+    top = max(y, 0)
+    bottom = min(y + h, SIZE)
+    if top >= bottom:
+        return False
+    # The widest scanline in the range is the one closest to the centre
+    centre = SIZE // 2
+    row = top if top > centre else (bottom - 1 if bottom - 1 < centre else centre)
+    return clip_row(row, x, w)[1] > 0
+
+
+def fill(tft, color):
+    """Fill only the visible circle of the screen"""
+    metrics.incr("spi_bytes", VISIBLE_PIXELS * 2)
+    for y in range(SIZE):
+        tft.hline(SPAN_X[y], y, SPAN_W[y], color)
+
+
+def fill_rect(tft, x, y, w, h, color):
+    """Fill the visible part of a rectangle"""
+    if inside(x, y, w, h):
+        metrics.incr("spi_bytes", w * h * 2)
+        tft.fill_rect(x, y, w, h, color)
+        return
+    pixels = 0
+    for row in range(max(y, 0), min(y + h, SIZE)):
+        cx, cw = clip_row(row, x, w)
+        if cw:
+            tft.hline(cx, row, cw, color)
+            pixels += cw
+    metrics.incr("spi_bytes", pixels * 2)
+
+
+def blit(tft, buf, x, y, w, h):
+    """Blit an RGB565 buffer, sending only the rows and spans that are visible"""
+    if inside(x, y, w, h):
+        metrics.incr("spi_bytes", w * h * 2)
+        tft.blit_buffer(buf, x, y, w, h)
+        return
+
+    sent = 0
+    mv = memoryview(buf)
+    stride = w * 2
+    run = -1  # first row of a pending run of fully visible rows
+    for row in range(y, y + h + 1):
+        cx, cw = clip_row(row, x, w) if row < y + h else (x, 0)
+        if cw == w:
+            if run < 0:
+                run = row
+            continue
+        if run >= 0:
+            # Flush consecutive fully visible rows as one window
+            tft.blit_buffer(mv[(run - y) * stride:(row - y) * stride], x, run, w, row - run)
+            sent += (row - run) * stride
+            run = -1
+        if cw:
+            offset = (row - y) * stride + (cx - x) * 2
+            tft.blit_buffer(mv[offset:offset + cw * 2], cx, row, cw, 1)
+            sent += cw * 2
+    metrics.incr("spi_bytes", sent)
+
+
+def jpg(tft, filename, x, y, method):
+    """Draw a JPG file, clipped to the circle when the driver decodes to RAM"""
+    if hasattr(tft, 'jpg_decode'):
+        buf, w, h = tft.jpg_decode(filename)
+        blit(tft, buf, x, y, w, h)
+    else:
+        tft.jpg(filename, x, y, method)
+
+
+def text(tft, font, string, x, y, fg, bg=0):
+    """Draw text, skipping leading and trailing characters that are not visible"""
+    first = 0
+    last = len(string)
+    while first < last and not visible(x + first * font.WIDTH, y, font.WIDTH, font.HEIGHT):
+        first += 1
+    while last > first and not visible(x + (last - 1) * font.WIDTH, y, font.WIDTH, font.HEIGHT):
+        last -= 1
+    if first < last:
+        metrics.incr("spi_bytes", (last - first) * font.WIDTH * font.HEIGHT * 2)
+        tft.text(font, string[first:last], x + first * font.WIDTH, y, fg, bg)
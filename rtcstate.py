@@ -0,0 +1,186 @@
+"""
+`rtcstate`
+================================================================================
+
+App state kept in RTC memory across deep sleep.
+
+RTC slow memory survives deep sleep but not a power cycle, which makes it the
+cheapest place to keep the geolocation, the last weather model, the Wi-Fi
+lease and the unit preference between battery wake cycles. The state is
+packed into one fixed-layout record with a CRC so a cold boot (or a layout
+change) is detected and ignored.
+
+A copy of the record is also put in ``kvstore``, which writes it to flash at
+most every few minutes. It leaves out the Wi-Fi lease, the fetch time and the
+awake counters, which mean nothing after a power cycle and change on every
+wake, so a wake that fetched nothing new writes nothing. After a power cycle
+``restore()`` brings back the location, the last weather and the unit.
+"""
+
+import struct
+from binascii import crc32
+from machine import RTC
+import kvstore
+
+MAGIC = b'WX'
+VERSION = 1
+
+HOURS = 24
+
+KEY = "state"
+
+_GEO = 0x01
+_WEATHER = 0x02
+_LEASE = 0x04
+
+# magic, version, flags, unit
+# lat, lon, city, timezone
+# temp, code, humidity, time, hours, hourly temps (x10), hourly humidity
+# lease ip, netmask, gateway, dns, lease time
+# last fetch, last awake ms, awake ms today, day, cycles
+_FORMAT = '<2sBBc' 'ff24s32s' 'fBB16sB%dh%dB' '4s4s4s4sI' 'IIIII' % (HOURS, HOURS)
+_SIZE = struct.calcsize(_FORMAT)
+_buf = bytearray(_SIZE + 4)
+_flash = bytearray(_SIZE + 4)
+
+
+class State:
+    """Everything a battery wake cycle needs to start without the network."""
+
+    def __init__(self):
+        self.unit = "C"
+        self.geo = None  # {'lat', 'lon', 'city', 'timezone'}
+        self.model = None  # see model.digest()
+        self.lease = None  # (ip, netmask, gateway, dns)
+        self.lease_time = 0
+        self.fetched = 0
+        self.last_awake_ms = 0
+        self.awake_today_ms = 0
+        self.day = 0
+        self.cycles = 0
+
+
+def _ip_bytes(ip):
+    return bytes(int(part) for part in ip.split('.'))
+
+
+def _ip_str(raw):
+    return '.'.join(str(b) for b in raw)
+
+
+def _text(raw):
+    return raw.split(b'\x00', 1)[0].decode()
+
+
+def _clip(text, size):
+    # Cut at a character boundary, so _text() can decode it again
+    raw = text.encode()
+    if len(raw) <= size:
+        return raw
+    while size and raw[size] & 0xC0 == 0x80:
+        size -= 1
+    return raw[:size]
+
+
+def _pad(values, fill):
+    values = list(values[:HOURS])
+    return values + [fill] * (HOURS - len(values))
+
+
+def save(state):
+    """Pack state into RTC memory and its lasting part into kvstore"""
+    _pack(_buf, state, True)
+    RTC().memory(_buf)
+    _pack(_flash, state, False)
+    kvstore.put(KEY, _flash)
+
+
+def _pack(buf, state, volatile):
+    flags = 0
+    geo = state.geo or {}
+    model = state.model or {}
+    lease = volatile and state.lease or ('0.0.0.0',) * 4
+    if state.geo:
+        flags |= _GEO
+    if state.model:
+        flags |= _WEATHER
+    if volatile and state.lease:
+        flags |= _LEASE
+
+    humidity = model.get('humidity')
+    temps = [int(round(t * 10)) for t in model.get('hourly_temp', [])]
+    values = [
+        MAGIC, VERSION, flags, state.unit.encode(),
+        geo.get('lat', 0), geo.get('lon', 0),
+        _clip(geo.get('city', ''), 24), _clip(geo.get('timezone', ''), 32),
+        model.get('temp', 0), model.get('code', 0),
+        255 if humidity is None else int(humidity),
+        _clip(model.get('time', ''), 16), min(len(temps), HOURS),
+    ]
+    values += _pad(temps, 0)
+    values += _pad([int(h) for h in model.get('hourly_hum', [])], 0)
+    values += [_ip_bytes(ip) for ip in lease]
+    if volatile:
+        values += [int(v) for v in (state.lease_time, state.fetched, state.last_awake_ms,
+                                    state.awake_today_ms, state.day, state.cycles)]
+    else:
+        values += [0] * 6
+    struct.pack_into(_FORMAT, buf, 0, *values)
+    struct.pack_into('<I', buf, _SIZE, crc32(memoryview(buf)[:_SIZE]))
+
+
+def load():
+    """Unpack state from RTC memory, or None after a cold boot"""
+    return _unpack(RTC().memory())
+
+
+def restore():
+    """Unpack the copy on flash, or None if there is none.
+
+    It has no lease, fetch time or awake counters: the RTC restarted with the
+    power, so times measured against it would be wrong anyway.
+    """
+    return _unpack(kvstore.get(KEY, b''))
+
+
+def _unpack(raw):
+    if len(raw) != _SIZE + 4 or raw[:2] != MAGIC:
+        return None
+    if struct.unpack_from('<I', raw, _SIZE)[0] != crc32(memoryview(raw)[:_SIZE]):
+        return None
+    fields = struct.unpack_from(_FORMAT, raw, 0)
+    if fields[1] != VERSION:
+        return None
+
+    state = State()
+    flags = fields[2]
+    lat, lon, city, tz = fields[4:8]
+    try:
+        # Older firmware could cut a name in the middle of a character
+        state.unit = fields[3].decode()
+        city, tz, when = _text(city), _text(tz), _text(fields[11])
+    except UnicodeError:
+        return None
+    if flags & _GEO:
+        state.geo = {'lat': round(lat, 4), 'lon': round(lon, 4), 'city': city, 'timezone': tz}
+
+    temp, code, humidity, _, hours = fields[8:13]
+    temps = fields[13:13 + HOURS]
+    hums = fields[13 + HOURS:13 + 2 * HOURS]
+    if flags & _WEATHER:
+        state.model = {
+            'temp': round(temp, 1),
+            'code': code,
+            'humidity': None if humidity == 255 else humidity,
+            'time': when,
+            'city': state.geo['city'] if state.geo else 'Unknown',
+            'hourly_temp': [t / 10 for t in temps[:hours]],
+            'hourly_hum': list(hums[:hours]),
+        }
+
+    rest = fields[13 + 2 * HOURS:]
+    if flags & _LEASE:
+        state.lease = tuple(_ip_str(raw_ip) for raw_ip in rest[:4])
+    (state.lease_time, state.fetched, state.last_awake_ms,
+     state.awake_today_ms, state.day, state.cycles) = rest[4:]
+    return state
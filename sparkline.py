@@ -0,0 +1,103 @@
+"""
+`sparkline`
+================================================================================
+
+Hourly sparkline widget for the GC9A01 display.
+
+Each series is downsampled and scaled once per fetch into preallocated
+``array('h')`` pixel coordinates. The polylines are rasterized with Bresenham
+lines into an RGB565 tile buffer the first time the chart is drawn after an
+update, and every later redraw just re-blits the cached tile. The tile fill
+and the lines run on the compiled routines in ``pixels``, so a tile is at
+most 256 pixels on a side.
+"""
+
+from array import array
+import metrics
+import pixels
+
+# Hours shown by default (one point per hour)
+POINTS = 24
+
+
+class Sparkline:
+    """Cached RGB565 tile holding one or more scaled hourly series."""
+
+    def __init__(self, width, height, colors, points=POINTS, background=0):
+        self.width = width
+        self.height = height
+        self.points = points
+        self.colors = colors
+        self.background = background
+        self.buf = bytearray(width * height * 2)
+        self.xs = [array('h', [0] * points) for _ in colors]
+        self.ys = [array('h', [0] * points) for _ in colors]
+        self.counts = [0] * len(colors)
+        self.rendered = False
+
+    def clear(self):
+        """Drop all series so the next draw shows an empty chart"""
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        self.rendered = False
+
+    def update(self, index, values, start=0):
+        """Downsample and scale `values[start:]` into series `index`"""
+        n = len(values) - start
+        xs = self.xs[index]
+        ys = self.ys[index]
+        if n < 2:
+            self.counts[index] = 0
+            self.rendered = False
+            return
+
+        # Bucket-average down to at most `points` samples
+        count = min(n, self.points)
+        for i in range(count):
+            first = start + i * n // count
+            last = start + (i + 1) * n // count
+            total = 0
+            for j in range(first, last):
+                total += values[j]
+            ys[i] = int(total / (last - first) * 16)
+
+        # Scale to the tile, leaving a one pixel margin top and bottom. The
+        # range comes from the same truncated sixteenths as the points, so
+        # every y lands inside; the clamp keeps line() in the tile regardless
+        lo16 = hi16 = ys[0]
+        for i in range(1, count):
+            if ys[i] < lo16:
+                lo16 = ys[i]
+            elif ys[i] > hi16:
+                hi16 = ys[i]
+        span = (hi16 - lo16) or 1
+        usable = self.height - 3
+        bottom = self.height - 1
+        for i in range(count):
+            y = self.height - 2 - (ys[i] - lo16) * usable // span
+            ys[i] = 0 if y < 0 else bottom if y > bottom else y
+            xs[i] = i * (self.width - 1) // (count - 1)
+
+        self.counts[index] = count
+        self.rendered = False
+
+    def render(self):
+        """Rasterize every series into the tile buffer"""
+        buf = self.buf
+        width = self.width
+        height = self.height
+        pixels.fill(buf, width * height, self.background)
+        for index, color in enumerate(self.colors):
+            xs = self.xs[index]
+            ys = self.ys[index]
+            for i in range(1, self.counts[index]):
+                ends = pixels.ends(xs[i - 1], ys[i - 1], xs[i], ys[i], width, height)
+                pixels.line(buf, width, ends, color)
+        self.rendered = True
+
+    def draw(self, tft, x, y):
+        """Blit the chart, rasterizing only if a series changed"""
+        if not self.rendered:
+            self.render()
+        metrics.incr("spi_bytes", len(self.buf))
+        tft.blit_buffer(self.buf, x, y, self.width, self.height)
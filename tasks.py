@@ -0,0 +1,61 @@
+"""
+`tasks`
+================================================================================
+
+Run blocking calls on their own threads and join their results.
+
+The boot network steps (geolocation, time sync, weather fetch) spend nearly
+all their time waiting on sockets, and the ESP32 port releases the GIL while
+a socket blocks, so running them on ``_thread`` threads overlaps the waits
+and boot takes about as long as the slowest step instead of the sum. Each
+task must use its own ``HTTPClient``, since a client has one receive buffer.
+"""
+
+import time
+import _thread
+import metrics
+
+# mbedTLS handshakes need a deeper stack than the default thread stack
+STACK_SIZE = 16 * 1024
+
+try:
+    _thread.stack_size(STACK_SIZE)
+except ValueError:
+    pass  # CPython (host runs) refuses stacks below 32 KiB
+
+
+class Task:
+    """Runs fn(*args) on a new thread; join() waits and returns its result."""
+
+    def __init__(self, name, fn, *args):
+        self.name = name
+        self.result = None
+        self.error = None
+        self.ms = 0
+        self._lock = _thread.allocate_lock()
+        self._lock.acquire()
+        _thread.start_new_thread(self._run, (fn, args))
+
+    def _run(self, fn, args):
+        start = time.ticks_ms()
+        try:
+            self.result = fn(*args)
+        except Exception as e:
+            self.error = e
+        self.ms = time.ticks_diff(time.ticks_ms(), start)
+        metrics.observe("task_" + self.name, self.ms)
+        self._lock.release()
+
+    def done(self):
+        if self._lock.acquire(0):
+            self._lock.release()
+            return True
+        return False
+
+    def join(self):
+        """Wait for the task; re-raises its exception"""
+        self._lock.acquire()
+        self._lock.release()
+        if self.error is not None:
+            raise self.error
+        return self.result
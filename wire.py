@@ -0,0 +1,86 @@
+"""
+`wire`
+================================================================================
+
+Compact binary weather record shared by the proxy and the device.
+
+A fixed little-endian header carries the current conditions, the location and
+the proxy's clock; the hourly chart series follow as an optional trailer.
+Decoding is a couple of ``struct.unpack_from`` calls straight on the receive
+buffer, so there is no text parsing or float conversion on the device and a
+full record is 137 bytes instead of several kilobytes of JSON.
+"""
+
+import struct
+
+MAGIC = b'WB'
+VERSION = 1
+
+HOURS = 24
+
+# magic, version, flags
+# temp (x10), code, humidity (255 = unknown), observation time
+# lat, lon, city
+# clock epoch (Unix), UTC offset seconds, hours in the trailer
+_HEADER = '<2sBB' 'hBB16s' 'ff24s' 'IiB'
+HEADER_SIZE = struct.calcsize(_HEADER)
+
+
+def _text(raw):
+    return bytes(raw).split(b'\x00', 1)[0].decode()
+
+
+def _clip(text, size):
+    """UTF-8 bytes of text cut to at most size without splitting a character"""
+    raw = text.encode()
+    if len(raw) <= size:
+        return raw
+    while size and raw[size] & 0xC0 == 0x80:
+        size -= 1
+    return raw[:size]
+
+
+def encode(model, epoch=0, utc_offset=0):
+    """Pack a model.digest() dict (plus lat/lon) into a record"""
+    humidity = model.get('humidity')
+    temps = [int(round(t * 10)) for t in model.get('hourly_temp', [])[:HOURS]]
+    hums = [int(h) for h in model.get('hourly_hum', [])[:HOURS]]
+    hours = min(len(temps), len(hums))
+    record = struct.pack(
+        _HEADER, MAGIC, VERSION, 0,
+        int(round(model['temp'] * 10)), model['code'],
+        255 if humidity is None else int(humidity),
+        _clip(model.get('time', ''), 16),
+        model.get('lat') or 0, model.get('lon') or 0,
+        _clip(model.get('city', 'Unknown'), 24),
+        int(epoch), int(utc_offset), hours)
+    return record + struct.pack('<%dh%dB' % (hours, hours), *(temps[:hours] + hums[:hours]))
+
+
+def decode(buf):
+    """Unpack a record into a model dict, or None if it is not one"""
+    if len(buf) < HEADER_SIZE or bytes(buf[:2]) != MAGIC:
+        return None
+    (_, version, _, temp, code, humidity, when,
+     lat, lon, city, epoch, utc_offset, hours) = struct.unpack_from(_HEADER, buf, 0)
+    if version != VERSION or len(buf) < HEADER_SIZE + hours * 3:
+        return None
+    series = struct.unpack_from('<%dh%dB' % (hours, hours), buf, HEADER_SIZE)
+    try:
+        when, city = _text(when), _text(city)
+    except UnicodeError:
+        return None
+    return {
+        'temp': temp / 10,
+        'code': code,
+        'humidity': None if humidity == 255 else humidity,
+        'time': when,
+        'city': city,
+        'hourly_temp': [t / 10 for t in series[:hours]],
+        'hourly_hum': list(series[hours:]),
+        'lat': round(lat, 4),
+        'lon': round(lon, 4),
+        'timezone': '',
+        'epoch': epoch,
+        'utc_offset': utc_offset,
+    }
@@ -0,0 +1,71 @@
+"""
+`wmo`
+================================================================================
+
+WMO weather code tables, generated by ``host/build_wmo.py``; edit the
+registry there, not this file.
+
+``CONDITION[code]`` indexes ``CONDITIONS`` and ``ICON[code]`` indexes
+``ICONS`` (``NO_ICON`` if the code has none), for codes below ``CODES``.
+Lookups index constant ``bytes`` and tuples, so they allocate nothing.
+"""
+
+CODES = 100
+NO_ICON = 255
+
+CONDITIONS = (
+    'Unknown',
+    'Clear sky',
+    'Mainly clear',
+    'Partly cloudy',
+    'Overcast',
+    'Fog',
+    'Rime fog',
+    'Light drizzle',
+    'Moderate drizzle',
+    'Dense drizzle',
+    'Freezing drizzle',
+    'Dense freezing drizzle',
+    'Slight rain',
+    'Moderate rain',
+    'Heavy rain',
+    'Freezing rain',
+    'Heavy freezing rain',
+    'Slight snow',
+    'Moderate snow',
+    'Heavy snow',
+    'Snow grains',
+    'Slight showers',
+    'Moderate showers',
+    'Violent showers',
+    'Snow showers',
+    'Heavy snow showers',
+    'Thunderstorm',
+    'Thunderstorm w/hail',
+    'Severe thunderstorm',
+)
+
+ICONS = (
+    'jpg/clear_sky.jpg',
+    'jpg/mainly_clear.jpg',
+    'jpg/partly_cloudy.jpg',
+    'jpg/overcast.jpg',
+    'jpg/fog.jpg',
+    'jpg/light_drizzle.jpg',
+    'jpg/moderate_drizzle.jpg',
+    'jpg/dense_drizzle.jpg',
+    'jpg/freezing_drizzle.jpg',
+    'jpg/light_rain.jpg',
+    'jpg/freezing_rain.jpg',
+    'jpg/light_snow.jpg',
+    'jpg/moderate_snow.jpg',
+    'jpg/heavy_snow.jpg',
+    'jpg/snow_grains.jpg',
+    'jpg/thunderstorm.jpg',
+    'jpg/thunderstorm_hail.jpg',
+    'jpg/thunderstorm_heavyhail.jpg',
+)
+
+CONDITION = b'\x01\x02\x03\x04\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x05\x00\x00\x06\x00\x00\x07\x00\x08\x00\t\n\x0b\x00\x00\x00\x0c\x00\r\x00\x0e\x0f\x10\x00\x00\x00\x11\x00\x12\x00\x13\x00\x14\x00\x00\x15\x16\x17\x00\x00\x18\x19\x00\x00\x00\x00\x00\x00\x00\x00\x1a\x1b\x00\x00\x1c'
+
+ICON = b'\x00\x01\x02\x03\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\xff\x04\xff\xff\x04\xff\xff\x05\xff\x06\xff\x07\x08\x08\xff\xff\xff\t\xff\t\xff\t\n\n\xff\xff\xff\x0b\xff\x0c\xff\r\xff\x0e\xff\xff\t\t\t\xff\xff\x0b\r\xff\xff\xff\xff\xff\xff\xff\xff\x0f\x10\xff\xff\x11'
@@ -0,0 +1,120 @@
+"""
+`worker`
+================================================================================
+
+Network worker thread and the mailbox it publishes through.
+
+The UI thread renders and polls touch; everything that waits on the network
+(Wi-Fi association, TLS, HTTP, parsing) runs in a job on a ``_thread``
+worker. Blocking socket calls release the interpreter lock, so the UI keeps
+running while a request is in flight. The job publishes its results to a
+``Mailbox``. The UI picks up the newest value between frames, so neither
+side ever waits for the other.
+
+The worker pauses while the display sleeps, since ``machine.lightsleep``
+stops both cores and drops Wi-Fi anyway; ``pause()`` waits for the current
+job to finish so the CPU never sleeps in the middle of a request.
+"""
+
+import time
+import _thread
+import netguard
+
+# Longest uninterrupted sleep of the worker, so stop() and kick() are prompt
+_SLICE_MS = 200
+
+
+class Mailbox:
+    """Double-buffered latest value, handed from one writer to readers.
+
+    The writer fills the back slot without holding the lock and only swaps
+    the slots under it, so a reader never waits for a value being built.
+    """
+
+    def __init__(self):
+        self._slots = [None, None]
+        self._front = 0
+        self._lock = _thread.allocate_lock()
+        self.seq = 0  # bumped on every publish
+
+    def publish(self, value):
+        back = self._front ^ 1
+        self._slots[back] = value
+        with self._lock:
+            self._front = back
+            self.seq += 1
+
+    def read(self):
+        """(seq, value) of the newest publish; seq is 0 before the first one"""
+        with self._lock:
+            return self.seq, self._slots[self._front]
+
+
+class Worker:
+    """Runs job(now) on its own thread; job returns when to run next."""
+
+    def __init__(self, name, job, on_publish=None):
+        self.name = name
+        self.job = job
+        self.mailbox = Mailbox()
+        self.on_publish = on_publish  # called on the worker thread
+        self.busy = False
+        self.paused = False
+        self.errors = 0
+        self._lock = _thread.allocate_lock()  # orders paused against busy
+        self._kicked = False
+        self._stop = False
+
+    def start(self):
+        _thread.start_new_thread(self._run, ())
+
+    def publish(self, value):
+        self.mailbox.publish(value)
+        if self.on_publish:
+            self.on_publish()
+
+    def kick(self):
+        """Run the job now instead of at its next time"""
+        self._kicked = True
+
+    def pause(self, timeout_ms=30000):
+        """Stop after the current job; returns False if it did not finish in time"""
+        with self._lock:
+            # No job can start after this, so busy only goes from True to False
+            self.paused = True
+        start = time.ticks_ms()
+        while self.busy:
+            if time.ticks_diff(time.ticks_ms(), start) > timeout_ms:
+                return False
+            time.sleep_ms(20)
+        return True
+
+    def resume(self):
+        self.paused = False
+
+    def stop(self):
+        self._stop = True
+
+    def _run(self):
+        wake_at = 0
+        while not self._stop:
+            now = time.time()
+            with self._lock:
+                run = not self.paused and (self._kicked or now >= wake_at)
+                if run:
+                    self.busy = True
+            if run:
+                self._kicked = False
+                try:
+                    wake_at = self.job(now)
+                    self.errors = 0
+                except Exception as e:
+                    # A failing job must not spin; back off like the main loop
+                    self.errors += 1
+                    print("Worker error:", e)
+                    wake_at = now + netguard.backoff(self.errors, 5, 300)
+                finally:
+                    self.busy = False
+                continue
+            time.sleep_ms(_SLICE_MS if self.paused else
+                          max(min(int((wake_at - now) * 1000), _SLICE_MS), 1))